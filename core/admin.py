@@ -7,7 +7,9 @@ from .models import (
     Categoria,
     Lancamento,
     Orcamento,
-    RegraCategoria
+    RegraCategoria,
+    RegraRecorrencia,
+    TarefaImportacao
 )
 
 @admin.register(ContaBancaria)
@@ -81,4 +83,24 @@ class RegraCategoriaAdmin(admin.ModelAdmin):
     list_filter = ('usuario', 'categoria')
     search_fields = ('texto_regra', 'usuario__username', 'categoria__nome')
     list_per_page = 20
-    list_select_related = ('usuario', 'categoria')
\ No newline at end of file
+    list_select_related = ('usuario', 'categoria')
+
+@admin.register(RegraRecorrencia)
+class RegraRecorrenciaAdmin(admin.ModelAdmin):
+    """Admin para as séries de lançamentos recorrentes."""
+    list_display = ('descricao', 'valor', 'periodicidade', 'quantidade', 'ocorrencias_geradas', 'proxima_competencia', 'usuario')
+    list_filter = ('usuario', 'periodicidade')
+    search_fields = ('descricao', 'usuario__username')
+    readonly_fields = ('ocorrencias_geradas', 'proxima_competencia', 'proxima_caixa')
+    list_per_page = 20
+    list_select_related = ('usuario',)
+
+@admin.register(TarefaImportacao)
+class TarefaImportacaoAdmin(admin.ModelAdmin):
+    """Admin para acompanhar a fila de importações."""
+    list_display = ('nome_arquivo', 'tipo_arquivo', 'status', 'itens_processados', 'conta_bancaria', 'usuario', 'criado_em')
+    list_filter = ('status', 'tipo_arquivo')
+    search_fields = ('nome_arquivo', 'usuario__username')
+    readonly_fields = ('resultado', 'criado_em', 'iniciado_em', 'concluido_em')
+    list_per_page = 20
+    list_select_related = ('usuario', 'conta_bancaria')
@@ -8,3 +8,4 @@ class CoreConfig(AppConfig):
     def ready(self):
         # Importa os sinais para que eles sejam registrados pelo Django
         import core.signals
+        import core.checks
@@ -0,0 +1,25 @@
+# core/checks.py
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends cujo conteúdo fica restrito a um processo.
+CACHES_LOCAIS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def verificar_cache_compartilhado(app_configs, **kwargs):
+    """
+    Os tokens de versão (cache_service) invalidam o autômato de regras, os recorrentes e
+    o painel em todos os processos: em produção o cache padrão precisa ser compartilhado.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in CACHES_LOCAIS:
+        return [Error(
+            f"O cache padrão ({backend}) não é compartilhado entre os processos.",
+            hint="Configure um backend compartilhado, como o DatabaseCache, em CACHES['default'].",
+            id='core.E001',
+        )]
+    return []
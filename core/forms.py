@@ -3,7 +3,9 @@
 import os
 from datetime import date
 from django import forms
+from django.core.exceptions import ValidationError
 from django.db.models import Q
+from django.forms.models import ModelChoiceIterator
 from django.urls import reverse
 from django.utils.html import format_html
 
@@ -21,17 +23,63 @@ class TailwindFormMixin:
                 field.widget.attrs['class'] = tailwind_classes
 
 
+class _OpcoesEmMemoriaIterator(ModelChoiceIterator):
+    """Gera as opções a partir de objetos já carregados, sem consultar o queryset do campo."""
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.objetos_em_memoria:
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.objetos_em_memoria) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.objetos_em_memoria)
+
+
+class OpcoesCarregadasModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField cujas opções podem vir de objetos já carregados (ex: de
+    request.financeiro): a renderização e a validação usam essa lista em vez de
+    consultar o banco. Sem ela, funciona como um ModelChoiceField comum.
+    """
+    objetos_em_memoria = None
+
+    @property
+    def iterator(self):
+        return ModelChoiceIterator if self.objetos_em_memoria is None else _OpcoesEmMemoriaIterator
+
+    def definir_opcoes(self, queryset, objetos=None):
+        """Define o queryset do campo e, opcionalmente, os mesmos registros já carregados."""
+        # Os objetos precisam estar definidos antes do queryset, que já monta as opções do widget.
+        self.objetos_em_memoria = list(objetos) if objetos is not None else None
+        self.queryset = queryset
+
+    def to_python(self, value):
+        if self.objetos_em_memoria is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        chave = str(getattr(value, 'pk', value))
+        for obj in self.objetos_em_memoria:
+            if str(obj.pk) == chave:
+                return obj
+        raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
 class RegraCategoriaForm(TailwindFormMixin, forms.ModelForm):
     class Meta:
         model = RegraCategoria
         fields = ['texto_regra', 'categoria']
+        field_classes = {'categoria': OpcoesCarregadasModelChoiceField}
 
-    def __init__(self, *args, user=None, **kwargs):
+    def __init__(self, *args, user=None, financeiro=None, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['categoria'].queryset = Categoria.objects.filter(
+            self.fields['categoria'].definir_opcoes(Categoria.objects.filter(
                 Q(usuario=user) | Q(usuario__isnull=True)
-            ).order_by('nome')
+            ).order_by('nome'), financeiro.categorias if financeiro else None)
 
 
 class RegraCategoriaModalForm(RegraCategoriaForm):
@@ -48,10 +96,11 @@ class RegraCategoriaModalForm(RegraCategoriaForm):
 class ContaBancariaForm(TailwindFormMixin, forms.ModelForm):
     class Meta:
         model = ContaBancaria
-        fields = ['nome_banco', 'agencia', 'numero_conta', 'saldo_inicial', 'data_saldo_inicial']
+        fields = ['nome_banco', 'codigo_banco', 'agencia', 'numero_conta', 'saldo_inicial', 'data_saldo_inicial']
         # Você pode personalizar os labels aqui se quiser
         labels = {
             'nome_banco': 'Nome do Banco',
+            'codigo_banco': 'Código do Banco',
             'numero_conta': 'Número da Conta',
             'saldo_inicial': 'Saldo Inicial (R$)',
             'data_saldo_inicial': 'Data Saldo Inicial',
@@ -63,6 +112,8 @@ class ContaBancariaForm(TailwindFormMixin, forms.ModelForm):
         # Itera sobre todos os campos do formulário e adiciona as classes
         for field_name, field in self.fields.items():
             # Adiciona placeholders para uma melhor UX
+            if field_name == 'codigo_banco':
+                field.widget.attrs['placeholder'] = '341 (Opcional)'
             if field_name == 'agencia':
                 field.widget.attrs['placeholder'] = '0001 (Opcional)'
             if field_name == 'numero_conta':
@@ -83,11 +134,13 @@ class CartaoCreditoForm(TailwindFormMixin, forms.ModelForm):
             'dia_vencimento': 'Dia do Vencimento da Fatura',
             'conta_pagamento': 'Conta para Pagamento da Fatura',
         }
+        field_classes = {'conta_pagamento': OpcoesCarregadasModelChoiceField}
 
-    def __init__(self, *args, user=None, **kwargs):
+    def __init__(self, *args, user=None, financeiro=None, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['conta_pagamento'].queryset = ContaBancaria.objects.filter(usuario=user)
+            self.fields['conta_pagamento'].definir_opcoes(ContaBancaria.objects.filter(usuario=user),
+                                                          financeiro.contas if financeiro else None)
             self.fields['conta_pagamento'].empty_label = "--- Selecione uma conta ---"
 
 class CategoriaForm(TailwindFormMixin, forms.ModelForm):
@@ -101,7 +154,7 @@ class CategoriaForm(TailwindFormMixin, forms.ModelForm):
         self.fields['nome'].widget.attrs['placeholder'] = 'Ex: Alimentação, Moradia, Lazer...'
 
 
-class CategoriaModelChoiceField(forms.ModelChoiceField):
+class CategoriaModelChoiceField(OpcoesCarregadasModelChoiceField):
     """Campo customizado para exibir apenas o nome da categoria no dropdown."""
     def label_from_instance(self, obj):
         return obj.nome
@@ -150,7 +203,7 @@ class LancamentoForm(TailwindFormMixin, forms.ModelForm):
     )
     quantidade_repeticoes = forms.IntegerField(
         required=False, label="Quantidade de Repetições", min_value=2, initial=2,
-        help_text="Número total de parcelas, incluindo a atual."
+        help_text="Número total de parcelas, incluindo a atual. Deixe em branco para repetir sem data de término."
     )
 
     # Campo para seleção de fatura
@@ -175,8 +228,12 @@ class LancamentoForm(TailwindFormMixin, forms.ModelForm):
             'descricao': forms.TextInput(attrs={'placeholder': 'Ex: Compra no supermercado'}),
             'valor': forms.NumberInput(attrs={'placeholder': '150,75'}),
         }
+        field_classes = {
+            'conta_bancaria': OpcoesCarregadasModelChoiceField,
+            'cartao_credito': OpcoesCarregadasModelChoiceField,
+        }
 
-    def __init__(self, *args, user=None, conta=None, cartao=None, **kwargs):
+    def __init__(self, *args, user=None, conta=None, cartao=None, financeiro=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.user = user # Armazena o usuário para uso em outras partes do form, como o clean().
         
@@ -233,13 +290,16 @@ class LancamentoForm(TailwindFormMixin, forms.ModelForm):
         
         if user:
             # Filtra os querysets dos campos ForeignKey
-            self.fields['categoria'].queryset = Categoria.objects.filter(
+            # Com request.financeiro, as opções vêm das listas já carregadas na requisição.
+            self.fields['categoria'].definir_opcoes(Categoria.objects.filter(
                 Q(usuario=user) | Q(usuario__isnull=True)
-            ).order_by('nome')
+            ).order_by('nome'), financeiro.categorias if financeiro else None)
             if 'conta_bancaria' in self.fields:
-                self.fields['conta_bancaria'].queryset = ContaBancaria.objects.filter(usuario=user)
+                self.fields['conta_bancaria'].definir_opcoes(ContaBancaria.objects.filter(usuario=user),
+                                                             financeiro.contas if financeiro else None)
             if 'cartao_credito' in self.fields:
-                self.fields['cartao_credito'].queryset = CartaoCredito.objects.filter(usuario=user)
+                self.fields['cartao_credito'].definir_opcoes(CartaoCredito.objects.filter(usuario=user),
+                                                             financeiro.cartoes if financeiro else None)
             
     def clean(self):
         """
@@ -311,11 +371,8 @@ class LancamentoForm(TailwindFormMixin, forms.ModelForm):
         repeticao = cleaned_data.get('repeticao')
         if repeticao == 'RECORRENTE':
             periodicidade = cleaned_data.get('periodicidade')
-            quantidade = cleaned_data.get('quantidade_repeticoes')
             if not periodicidade:
                 self.add_error('periodicidade', 'Este campo é obrigatório para lançamentos recorrentes.')
-            if not quantidade:
-                self.add_error('quantidade_repeticoes', 'Este campo é obrigatório para lançamentos recorrentes.')
 
         return cleaned_data
 
@@ -329,7 +386,7 @@ class UnifiedImportForm(TailwindFormMixin, forms.Form):
         choices=IMPORT_CHOICES,
         label="Tipo de Importação"
     )
-    conta_bancaria = forms.ModelChoiceField(
+    conta_bancaria = OpcoesCarregadasModelChoiceField(
         queryset=ContaBancaria.objects.none(),
         label="Importar para a Conta",
         empty_label="--- Selecione a Conta ---"
@@ -338,10 +395,11 @@ class UnifiedImportForm(TailwindFormMixin, forms.Form):
         label="Selecione o Arquivo"
     )
 
-    def __init__(self, *args, user=None, **kwargs):
+    def __init__(self, *args, user=None, financeiro=None, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['conta_bancaria'].queryset = ContaBancaria.objects.filter(usuario=user)
+            self.fields['conta_bancaria'].definir_opcoes(ContaBancaria.objects.filter(usuario=user),
+                                                         financeiro.contas if financeiro else None)
         # O mixin aplica uma classe padrão, mas podemos sobrescrevê-la para campos específicos.
         self.fields['import_file'].widget.attrs['class'] = 'mt-1 block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100'
 
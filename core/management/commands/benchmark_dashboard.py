@@ -0,0 +1,66 @@
+# core/management/commands/benchmark_dashboard.py
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from core.models import ContaBancaria
+from core.services.dashboard_service import _calculos_dashboard, _executar_em_paralelo
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a latência do cálculo dos gráficos do painel em sequência e em paralelo "
+        "(sem o cache), para um usuário e mês existentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', required=True, help="Username cujo painel será calculado.")
+        parser.add_argument('--ano', type=int, required=True)
+        parser.add_argument('--mes', type=int, required=True)
+        parser.add_argument('--repeticoes', type=int, default=10)
+        parser.add_argument(
+            '--latencia-ms', type=float, default=0,
+            help="Atraso simulado por consulta, para reproduzir a ida e volta até um banco remoto (ex: Cloud SQL)."
+        )
+
+    def _medir(self, nome, funcao, repeticoes):
+        funcao()  # aquecimento: cria checkpoints e resumos que ainda não existam
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+        self.stdout.write(
+            f"{nome:<11} mediana {statistics.median(tempos) * 1000:8.1f} ms  mínimo {min(tempos) * 1000:8.1f} ms"
+        )
+        return statistics.median(tempos)
+
+    def handle(self, *args, **options):
+        usuario = User.objects.filter(username=options['usuario']).first()
+        if usuario is None:
+            raise CommandError(f"Usuário '{options['usuario']}' não encontrado.")
+        contas_ids = list(ContaBancaria.objects.filter(usuario=usuario).values_list('pk', flat=True))
+
+        latencia = options['latencia_ms'] / 1000
+        if latencia:
+            def atrasar(execute, sql, params, many, context):
+                time.sleep(latencia)
+                return execute(sql, params, many, context)
+
+            # Vale para as conexões desta thread e para as abertas depois pelas threads do pool.
+            def instalar_atraso(sender, connection, **kwargs):
+                connection.execute_wrappers.append(atrasar)
+
+            connection_created.connect(instalar_atraso, weak=False)
+            for conexao in connections.all():
+                conexao.execute_wrappers.append(atrasar)
+
+        calculos = _calculos_dashboard(usuario, options['ano'], options['mes'], contas_ids)
+        sequencial = self._medir('sequencial', lambda: [funcao() for funcao in calculos], options['repeticoes'])
+        paralelo = self._medir('paralelo', lambda: async_to_sync(_executar_em_paralelo)(calculos), options['repeticoes'])
+        self.stdout.write(self.style.SUCCESS(f"Redução da latência: {(1 - paralelo / sequencial) * 100:.0f}%"))
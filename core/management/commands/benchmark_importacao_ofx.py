@@ -0,0 +1,76 @@
+# core/management/commands/benchmark_importacao_ofx.py
+import io
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.services.ofx_import_service import _registros_ofx
+
+
+def gerar_ofx(transacoes, formato):
+    """Monta em memória um extrato OFX sintético com o número de transações pedido."""
+    fecha = (lambda tag: f'</{tag}>') if formato == 'xml' else (lambda tag: '')
+    inicio = date(2024, 1, 1)
+    linhas = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n<?OFX OFXHEADER="200" VERSION="200"?>' if formato == 'xml'
+        else 'OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nENCODING:USASCII\nCHARSET:1252\n',
+        '<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>BRL' + fecha('CURDEF'),
+        '<BANKACCTFROM><BANKID>001' + fecha('BANKID') + '<ACCTID>12345' + fecha('ACCTID')
+        + '<ACCTTYPE>CHECKING' + fecha('ACCTTYPE') + '</BANKACCTFROM>',
+        '<BANKTRANLIST><DTSTART>20240101' + fecha('DTSTART') + '<DTEND>20241231' + fecha('DTEND'),
+    ]
+    for i in range(transacoes):
+        dia = (inicio + timedelta(days=i % 365)).strftime('%Y%m%d')
+        linhas.append(
+            '<STMTTRN>'
+            f'<TRNTYPE>DEBIT{fecha("TRNTYPE")}'
+            f'<DTPOSTED>{dia}120000[-3:BRT]{fecha("DTPOSTED")}'
+            f'<TRNAMT>-{i % 500 + 1}.{i % 100:02d}{fecha("TRNAMT")}'
+            f'<FITID>{i:08d}{fecha("FITID")}'
+            f'<CHECKNUM>{i}{fecha("CHECKNUM")}'
+            f'<MEMO>COMPRA CARTAO LOJA {i % 97}{fecha("MEMO")}'
+            '</STMTTRN>'
+        )
+    linhas.append('</BANKTRANLIST><LEDGERBAL><BALAMT>0.00' + fecha('BALAMT') + '<DTASOF>20241231'
+                  + fecha('DTASOF') + '</LEDGERBAL></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>')
+    return '\n'.join(linhas).encode('utf-8')
+
+
+class Command(BaseCommand):
+    help = "Compara o tempo e a memória do leitor OFX nativo com o ofxparse em um arquivo sintético."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transacoes', type=int, default=10000, help="Número de transações do arquivo gerado.")
+        parser.add_argument('--formato', choices=['sgml', 'xml'], default='sgml', help="OFX 1.x (SGML) ou 2.x (XML).")
+
+    def _medir(self, nome, funcao):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        quantidade = funcao()
+        duracao = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"{nome:<10} {quantidade:>8} transações  {duracao:8.3f} s  pico {pico / 1024 / 1024:8.1f} MiB")
+
+    def handle(self, *args, **options):
+        conteudo = gerar_ofx(options['transacoes'], options['formato'])
+        self.stdout.write(
+            f"Arquivo {options['formato'].upper()} com {options['transacoes']} transações "
+            f"({len(conteudo) / 1024 / 1024:.1f} MiB)."
+        )
+
+        self._medir('nativo', lambda: sum(
+            1 for tipo, _ in _registros_ofx(io.BytesIO(conteudo)) if tipo == 'transacao'
+        ))
+
+        try:
+            from ofxparse import OfxParser
+        except ImportError:
+            self.stdout.write(self.style.WARNING("ofxparse não está instalado; comparação ignorada."))
+            return
+
+        self._medir('ofxparse', lambda: sum(
+            len(conta.statement.transactions) for conta in OfxParser.parse(io.BytesIO(conteudo)).accounts
+        ))
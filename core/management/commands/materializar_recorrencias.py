@@ -0,0 +1,28 @@
+# core/management/commands/materializar_recorrencias.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import services
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava como lançamentos as ocorrências das séries recorrentes cuja data chegou, para que "
+        "entrem no saldo das contas. Deve rodar diariamente, antes de verificar_saldos (agendado no "
+        "Cloud Scheduler). As ocorrências futuras não são gravadas: extrato, gráficos e relatórios "
+        "as montam a partir das regras."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ate', help="Grava as ocorrências até esta data (AAAA-MM-DD). Padrão: hoje.")
+        parser.add_argument('--usuario', type=int, help="Processa apenas as séries do usuário com este ID.")
+
+    def handle(self, *args, **options):
+        try:
+            ate = date.fromisoformat(options['ate']) if options['ate'] else date.today()
+        except ValueError:
+            raise CommandError(f"Data inválida: {options['ate']}")
+
+        criadas = services.materializar_recorrencias(options['usuario'], ate)
+        self.stdout.write(self.style.SUCCESS(f"{criadas} ocorrência(s) recorrente(s) gravada(s) até {ate:%d/%m/%Y}."))
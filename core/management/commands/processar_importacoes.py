@@ -0,0 +1,56 @@
+# core/management/commands/processar_importacoes.py
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import services
+
+
+class Command(BaseCommand):
+    help = "Processa em segundo plano os arquivos de importação enfileirados (CSV/OFX)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help="Segundos de espera entre consultas quando a fila está vazia."
+        )
+        parser.add_argument(
+            '--tempo-limite', type=int, default=30,
+            help="Minutos após os quais uma tarefa em processamento é considerada travada e volta para a fila."
+        )
+        parser.add_argument(
+            '--reter-dias', type=int, default=7,
+            help="Dias que uma tarefa finalizada (e sua pré-conciliação) é mantida antes de ser apagada."
+        )
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help="Processa as tarefas pendentes e encerra, em vez de continuar consultando a fila."
+        )
+
+    def handle(self, *args, **options):
+        limite = timedelta(minutes=options['tempo_limite'])
+        self.stdout.write("Worker de importação iniciado.")
+
+        removidas = services.remover_tarefas_antigas(timedelta(days=options['reter_dias']))
+        if removidas:
+            self.stdout.write(f"{removidas} registro(s) de importações antigas removido(s).")
+
+        while True:
+            # Conexões encerradas pelo banco durante a espera são reabertas aqui.
+            close_old_connections()
+
+            liberadas = services.liberar_tarefas_travadas(limite)
+            if liberadas:
+                self.stdout.write(self.style.WARNING(f"{liberadas} tarefa(s) travada(s) devolvida(s) para a fila."))
+
+            tarefa = services.reservar_proxima_tarefa()
+            if tarefa is not None:
+                tarefa = services.executar_tarefa_importacao(tarefa)
+                self.stdout.write(f"Tarefa {tarefa.pk} ({tarefa.nome_arquivo}): {tarefa.get_status_display()}.")
+                continue
+
+            if options['uma_vez']:
+                return
+            time.sleep(options['intervalo'])
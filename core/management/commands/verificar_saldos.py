@@ -0,0 +1,56 @@
+# core/management/commands/verificar_saldos.py
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.models import ContaBancaria
+from core import services
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o saldo armazenado de cada conta com o saldo recalculado a partir dos lançamentos "
+        "e, com --corrigir, grava o valor correto. Deve rodar diariamente para incorporar os "
+        "lançamentos agendados cuja data de caixa chegou (agendado no Cloud Scheduler). Com --corrigir, "
+        "os resumos mensais e o cache do painel dos donos das contas corrigidas também são descartados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corrigir', action='store_true', help="Grava o saldo recalculado nas contas divergentes.")
+        parser.add_argument('--conta', type=int, action='append', dest='contas', help="Verifica apenas a conta com este ID (pode repetir).")
+
+    def handle(self, *args, **options):
+        contas = ContaBancaria.objects.order_by('pk')
+        if options['contas']:
+            contas = contas.filter(pk__in=options['contas'])
+
+        hoje = date.today()
+        divergentes = 0
+        usuarios_corrigidos = set()
+        for conta in contas.iterator():
+            esperado = services.calcular_saldo_conta(conta)
+            divergente = esperado != conta.saldo_calculado
+
+            if divergente:
+                divergentes += 1
+                self.stdout.write(self.style.WARNING(
+                    f"{conta}: armazenado {conta.saldo_calculado}, recalculado {esperado} "
+                    f"(diferença {esperado - conta.saldo_calculado})."
+                ))
+            if options['corrigir'] and (divergente or conta.saldo_atualizado_em != hoje):
+                # Marcar o saldo como do dia permite que as próximas alterações usem só a variação.
+                ContaBancaria.objects.filter(pk=conta.pk).update(saldo_calculado=esperado, saldo_atualizado_em=hoje)
+                if divergente:
+                    usuarios_corrigidos.add(conta.usuario_id)
+
+        if usuarios_corrigidos:
+            # Uma divergência indica escritas que não passaram pelos signals: os resumos
+            # desses usuários também podem estar defasados. Os demais ficam intactos.
+            services.registrar_recalculos(usuarios=usuarios_corrigidos)
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS("Todos os saldos conferem."))
+        elif options['corrigir']:
+            self.stdout.write(self.style.SUCCESS(f"{divergentes} conta(s) corrigida(s)."))
+        else:
+            self.stdout.write(f"{divergentes} conta(s) divergente(s). Use --corrigir para gravar os saldos recalculados.")
@@ -0,0 +1,63 @@
+# core/middleware.py
+from functools import cached_property
+
+from django.db.models import Q
+
+from .models import ContaBancaria, CartaoCredito, Categoria
+
+
+class ContextoFinanceiro:
+    """
+    Dados de referência do usuário logado (contas, cartões e categorias) usados por
+    menus, formulários e filtros. Cada conjunto é carregado na primeira vez que é
+    pedido e reaproveitado pelo resto da requisição.
+    """
+
+    def __init__(self, request):
+        self._request = request
+
+    @property
+    def usuario(self):
+        return self._request.user
+
+    @cached_property
+    def contas(self):
+        return list(ContaBancaria.objects.filter(usuario=self.usuario).order_by('nome_banco', 'pk'))
+
+    @cached_property
+    def cartoes(self):
+        return list(CartaoCredito.objects.filter(usuario=self.usuario).order_by('nome_cartao', 'pk'))
+
+    @cached_property
+    def categorias(self):
+        """Categorias do usuário e as do sistema (compartilhadas), por nome."""
+        return list(Categoria.objects.filter(
+            Q(usuario=self.usuario) | Q(usuario__isnull=True)
+        ).order_by('nome'))
+
+    @property
+    def conta_maior_saldo(self):
+        return max(self.contas, key=lambda conta: conta.saldo_calculado, default=None)
+
+    @property
+    def primeiro_cartao(self):
+        return self.cartoes[0] if self.cartoes else None
+
+    def dados_cartoes(self):
+        """Dia de fechamento e de vencimento de cada cartão, usados pelo JS dos formulários."""
+        return {c.id: {'fechamento': c.dia_fechamento, 'vencimento': c.dia_vencimento} for c in self.cartoes}
+
+
+class ContextoFinanceiroMiddleware:
+    """
+    Anexa `request.financeiro` (um ContextoFinanceiro) a cada requisição.
+    Deve vir depois do AuthenticationMiddleware. Nada é consultado até que
+    algum dado seja de fato usado.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.financeiro = ContextoFinanceiro(request)
+        return self.get_response(request)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_tarefaimportacao'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarefaimportacao',
+            name='resultado',
+            field=models.JSONField(blank=True, help_text='Avisos e lançamentos antigos gerados pelo processamento. Os lançamentos para revisão ficam em LancamentoImportacao.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='tarefaimportacao',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('CONCLUIDA', 'Concluída'), ('IMPORTADA', 'Importada'), ('ERRO', 'Erro')], default='PENDENTE', max_length=12),
+        ),
+        migrations.CreateModel(
+            name='LancamentoImportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveIntegerField(help_text='Ordem do lançamento no arquivo.')),
+                ('descricao', models.CharField(max_length=255)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('tipo', models.CharField(choices=[('D', 'Débito'), ('C', 'Crédito')], max_length=1)),
+                ('data_competencia', models.DateField()),
+                ('data_caixa', models.DateField()),
+                ('numero_documento', models.CharField(blank=True, max_length=100, null=True)),
+                ('import_hash', models.CharField(max_length=32)),
+                ('ja_importado', models.BooleanField(default=False, help_text='O hash já existia quando o arquivo foi processado.')),
+                ('excluido', models.BooleanField(default=False, help_text='Marcado pelo usuário para não ser importado.')),
+                ('periodicidade', models.CharField(blank=True, max_length=10, null=True)),
+                ('quantidade_repeticoes', models.PositiveIntegerField(blank=True, null=True)),
+                ('recorrencia_id', models.UUIDField(blank=True, editable=False, null=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.categoria')),
+                ('conta_bancaria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.contabancaria')),
+                ('tarefa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='core.tarefaimportacao')),
+            ],
+            options={
+                'verbose_name': 'Lançamento em Importação',
+                'verbose_name_plural': 'Lançamentos em Importação',
+                'ordering': ['posicao'],
+                'unique_together': {('tarefa', 'posicao')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_lancamentoimportacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contabancaria',
+            name='saldo_atualizado_em',
+            field=models.DateField(blank=True, editable=False, help_text='Dia em que o saldo foi recalculado por completo; as variações só são aplicadas sobre um saldo do dia.', null=True),
+        ),
+    ]
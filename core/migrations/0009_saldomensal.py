@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_contabancaria_saldo_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês.')),
+                ('saldo_abertura', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('conta_bancaria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_mensais', to='core.contabancaria')),
+            ],
+            options={
+                'verbose_name': 'Saldo Mensal',
+                'verbose_name_plural': 'Saldos Mensais',
+                'unique_together': {('conta_bancaria', 'mes')},
+            },
+        ),
+    ]
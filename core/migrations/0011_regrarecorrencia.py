@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:45
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_resumomensal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegraRecorrencia',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('descricao', models.CharField(max_length=255)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('tipo', models.CharField(choices=[('D', 'Débito'), ('C', 'Crédito')], max_length=1)),
+                ('periodicidade', models.CharField(choices=[('MENSAL', 'Mensal'), ('DIARIA', 'Diária'), ('SEMANAL', 'Semanal'), ('SEMESTRAL', 'Semestral'), ('ANUAL', 'Anual')], default='MENSAL', max_length=10)),
+                ('quantidade', models.PositiveIntegerField(blank=True, help_text='Total de ocorrências, incluindo a primeira. Vazio: sem término.', null=True)),
+                ('data_fim', models.DateField(blank=True, help_text='Última data de competência da série, se houver.', null=True)),
+                ('ocorrencias_geradas', models.PositiveIntegerField(default=1)),
+                ('proxima_competencia', models.DateField(blank=True, help_text='Data de competência da próxima ocorrência a gravar. Vazio: série concluída.', null=True)),
+                ('proxima_caixa', models.DateField(blank=True, null=True)),
+                ('cartao_credito', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.cartaocredito')),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.categoria')),
+                ('conta_bancaria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.contabancaria')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regras_recorrencia', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Regra de Recorrência',
+                'verbose_name_plural': 'Regras de Recorrência',
+                'indexes': [models.Index(fields=['usuario', 'proxima_competencia'], name='core_regrar_usuario_af881b_idx')],
+            },
+        ),
+    ]
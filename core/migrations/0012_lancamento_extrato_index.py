@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_regrarecorrencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lancamento',
+            index=models.Index(fields=['conta_bancaria', 'data_caixa', 'id'], name='core_lancam_conta_b_b39e70_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:03
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_lancamento_extrato_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarefaimportacao',
+            name='arquivo',
+            field=models.FileField(blank=True, storage=core.models.storage_importacoes, upload_to='importacoes/%Y/%m/'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class SomenteNoBanco:
+    """Executa a operação no banco apenas para o `vendor` informado; o estado dos modelos segue igual."""
+
+    def __init__(self, *args, vendor, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def deconstruct(self):
+        nome, args, kwargs = super().deconstruct()
+        return nome, args, {**kwargs, 'vendor': self.vendor}
+
+
+class AddIndexNoBanco(SomenteNoBanco, migrations.AddIndex):
+    pass
+
+
+class RunSQLNoBanco(SomenteNoBanco, migrations.RunSQL):
+    pass
+
+
+TABELA_BUSCA = 'core_lancamento_busca'
+
+# SQLite (settings_local): tabela FTS5 de "conteúdo externo" com o tokenizador de trigramas,
+# mantida em sincronia com core_lancamento por triggers. Os triggers valem também para
+# bulk_create, UPDATEs em lote e o INSERT ... SELECT da importação, que não disparam signals.
+# O SQLite descarta os triggers quando uma migração reconstrói core_lancamento: uma migração
+# assim precisa repetir SQL_SQLITE.
+SQL_SQLITE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_BUSCA} USING fts5(
+        descricao, content='core_lancamento', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_BUSCA}_ai AFTER INSERT ON core_lancamento BEGIN
+        INSERT INTO {TABELA_BUSCA}(rowid, descricao) VALUES (new.id, new.descricao);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_BUSCA}_ad AFTER DELETE ON core_lancamento BEGIN
+        INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}, rowid, descricao) VALUES ('delete', old.id, old.descricao);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_BUSCA}_au AFTER UPDATE OF descricao ON core_lancamento BEGIN
+        INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}, rowid, descricao) VALUES ('delete', old.id, old.descricao);
+        INSERT INTO {TABELA_BUSCA}(rowid, descricao) VALUES (new.id, new.descricao);
+    END""",
+    # Indexa os lançamentos gravados antes dos triggers.
+    f"INSERT INTO {TABELA_BUSCA}({TABELA_BUSCA}) VALUES ('rebuild')",
+]
+
+SQL_SQLITE_REVERSO = [
+    f"DROP TRIGGER IF EXISTS {TABELA_BUSCA}_{sufixo}" for sufixo in ('ai', 'ad', 'au')
+] + [f"DROP TABLE IF EXISTS {TABELA_BUSCA}"]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_tarefaimportacao_storage_compartilhado'),
+    ]
+
+    operations = [
+        # PostgreSQL (produção): índice GIN de trigramas sobre UPPER(descricao), a expressão
+        # que o Django gera para `descricao__icontains`; o próprio filtro passa a usar o índice.
+        # TrigramExtension não faz nada fora do PostgreSQL.
+        TrigramExtension(),
+        AddIndexNoBanco(
+            model_name='lancamento',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('descricao'), name='gin_trgm_ops'
+                ),
+                name='core_lancamento_descricao_trgm',
+            ),
+            vendor='postgresql',
+        ),
+        RunSQLNoBanco(SQL_SQLITE, SQL_SQLITE_REVERSO, vendor='sqlite'),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_indice_busca_descricao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contabancaria',
+            name='codigo_banco',
+            field=models.CharField(blank=True, help_text='Código do banco (ex: 341). Identifica a conta nos arquivos OFX junto com o número.', max_length=10, null=True),
+        ),
+    ]
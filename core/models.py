@@ -1,30 +1,95 @@
 # core/models.py
 
 import uuid
-from django.db import models
+from django.db import models, transaction, DatabaseError
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.files.storage import storages
 from django.db.models import Sum, Q, Window, F, Case, When, DecimalField, Max
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.urls import reverse
 from decimal import Decimal
 
-def get_default_other_category():
+# Categorias de sistema (sem usuário) das quais o próprio código depende.
+CATEGORIA_OUTROS = 'Outros'
+CATEGORIA_PAGAMENTO_FATURA = 'Pagamento de Fatura'
+
+# {nome: (versao, pk)} das categorias de sistema já resolvidas neste processo. A versão
+# vem do cache do Django: quando outro processo altera ou apaga uma categoria de sistema,
+# a PK memorizada aqui deixa de valer na próxima consulta.
+_categorias_sistema = {}
+CACHE_NAMESPACE_CATEGORIAS_SISTEMA = 'categorias_sistema'
+
+
+def categoria_sistema_pk(nome):
     """
-    Obtém ou cria a categoria 'Outros' do sistema e retorna o objeto.
-    Usado para on_delete=models.SET().
+    Retorna a PK da categoria de sistema `nome`, criando-a se preciso.
+    A PK é consultada uma única vez por versão; uma categoria recém-criada só
+    é memorizada após o commit, para que um rollback não deixe uma PK inexistente.
     """
-    # Usamos get_or_create para garantir que a categoria exista e evitar race conditions.
-    # Como é uma categoria de sistema, o usuário é None.
-    categoria, created = Categoria.objects.get_or_create(
-        nome='Outros',
+    # Importado aqui: o pacote de serviços depende deste módulo.
+    from .services.cache_service import obter_versao
+
+    versao = obter_versao(CACHE_NAMESPACE_CATEGORIAS_SISTEMA, 'sistema')
+    memorizada = _categorias_sistema.get(nome)
+    if memorizada and memorizada[0] == versao:
+        return memorizada[1]
+
+    categoria, criada = Categoria.objects.get_or_create(
+        nome=nome,
         usuario__isnull=True,
         defaults={'usuario': None}
     )
-    return categoria
+    pk = categoria.pk
+    if criada:
+        transaction.on_commit(lambda: _categorias_sistema.__setitem__(nome, (versao, pk)))
+    else:
+        _categorias_sistema[nome] = (versao, pk)
+    return pk
+
+
+def categoria_sistema(nome):
+    """Retorna a categoria de sistema `nome` sem consultar o banco quando a PK já é conhecida."""
+    return Categoria.from_db('default', ['id', 'usuario_id', 'nome'], [categoria_sistema_pk(nome), None, nome])
+
+
+def esquecer_categorias_sistema():
+    """Descarta as PKs memorizadas neste processo, que serão resolvidas de novo no próximo uso."""
+    _categorias_sistema.clear()
+
+
+def invalidar_categorias_sistema():
+    """
+    Chamado quando uma categoria de sistema é alterada ou apagada: descarta as PKs
+    memorizadas neste processo na hora e, após o commit, nos demais (workers,
+    instâncias e jobs), trocando a versão compartilhada.
+    """
+    from .services.cache_service import incrementar_versao
+
+    esquecer_categorias_sistema()
+    transaction.on_commit(lambda: incrementar_versao(CACHE_NAMESPACE_CATEGORIAS_SISTEMA, 'sistema'))
+
+
+def aquecer_categorias_sistema():
+    """Resolve de antemão as categorias de sistema. Sem banco disponível, elas são resolvidas no primeiro uso."""
+    try:
+        for nome in (CATEGORIA_OUTROS, CATEGORIA_PAGAMENTO_FATURA):
+            categoria_sistema_pk(nome)
+    except DatabaseError:
+        esquecer_categorias_sistema()
+
+
+def get_default_other_category():
+    """
+    Obtém ou cria a categoria 'Outros' do sistema e retorna o objeto.
+    Usado para on_delete=models.SET().
+    """
+    return categoria_sistema(CATEGORIA_OUTROS)
 
 def get_default_other_category_pk():
     """Retorna a PK da categoria 'Outros' para o 'default' do campo."""
-    return get_default_other_category().pk
+    return categoria_sistema_pk(CATEGORIA_OUTROS)
 
 # --- Modelos Principais de Cadastros ---
 
@@ -32,6 +97,10 @@ class ContaBancaria(models.Model):
     """Representa uma conta bancária de um usuário."""
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='contas_bancarias')
     nome_banco = models.CharField(max_length=100, help_text="Ex: Nubank, Itaú, etc.")
+    codigo_banco = models.CharField(
+        max_length=10, blank=True, null=True,
+        help_text="Código do banco (ex: 341). Identifica a conta nos arquivos OFX junto com o número."
+    )
     agencia = models.CharField(max_length=20, blank=True, null=True)
     numero_conta = models.CharField(max_length=30)
     saldo_inicial = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
@@ -45,6 +114,10 @@ class ContaBancaria(models.Model):
         editable=False,
         help_text="Saldo atual calculado via sinais para otimização de performance."
     )
+    saldo_atualizado_em = models.DateField(
+        null=True, blank=True, editable=False,
+        help_text="Dia em que o saldo foi recalculado por completo; as variações só são aplicadas sobre um saldo do dia."
+    )
 
     class Meta:
         verbose_name = "Conta Bancária"
@@ -252,6 +325,44 @@ class Lancamento(models.Model):
         verbose_name = "Lançamento"
         verbose_name_plural = "Lançamentos"
         ordering = ['-data_competencia', '-id']
+        # Extrato da conta paginado por cursor sobre (data_caixa, id).
+        indexes = [
+            models.Index(fields=['conta_bancaria', 'data_caixa', 'id']),
+            # Busca por descrição (criado só no PostgreSQL; no SQLite a migração cria uma tabela FTS5).
+            GinIndex(OpClass(Upper('descricao'), name='gin_trgm_ops'), name='core_lancamento_descricao_trgm'),
+        ]
+
+    # Campos que determinam quanto um lançamento contribui para o saldo da conta.
+    CAMPOS_SALDO = ('conta_bancaria_id', 'tipo', 'valor', 'data_caixa')
+    # Campos que determinam em qual linha de ResumoMensal o lançamento é totalizado.
+    CAMPOS_RESUMO = (
+        'usuario_id', 'conta_bancaria_id', 'cartao_credito_id', 'categoria_id',
+        'tipo', 'valor', 'data_caixa', 'data_competencia'
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o estado lido do banco para que saldos e resumos sejam ajustados apenas pela diferença.
+        instance._estado_saldo_original = instance.estado_saldo()
+        instance._estado_resumo_original = instance.estado_resumo()
+        return instance
+
+    def _estado(self, campos):
+        if any(campo not in self.__dict__ for campo in campos):
+            return None
+        return tuple(self.__dict__[campo] for campo in campos)
+
+    def estado_saldo(self):
+        """
+        Retorna os campos que afetam o saldo, ou None se algum deles não foi
+        carregado (ex: consultas com only()/defer()).
+        """
+        return self._estado(self.CAMPOS_SALDO)
+
+    def estado_resumo(self):
+        """Retorna os campos que afetam os resumos mensais, ou None se algum não foi carregado."""
+        return self._estado(self.CAMPOS_RESUMO)
 
     def __str__(self):
         sinal = "-" if self.tipo == self.TipoTransacao.DEBITO else "+"
@@ -264,6 +375,117 @@ class Lancamento(models.Model):
         return reverse('core:home')
 
 
+class RegraRecorrencia(models.Model):
+    """
+    Regra de uma série de lançamentos recorrentes. A PK é o `recorrencia_id` dos
+    lançamentos da série. As ocorrências só são gravadas como Lancamento quando chegam
+    (comando materializar_recorrencias) ou são conciliadas ou editadas; as futuras
+    existem apenas aqui, são montadas em memória pelas leituras (ver
+    services.ocorrencias_virtuais), e alterar ou encerrar a série mexe em uma única linha.
+    """
+    class Periodicidade(models.TextChoices):
+        MENSAL = 'MENSAL', 'Mensal'
+        DIARIA = 'DIARIA', 'Diária'
+        SEMANAL = 'SEMANAL', 'Semanal'
+        SEMESTRAL = 'SEMESTRAL', 'Semestral'
+        ANUAL = 'ANUAL', 'Anual'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='regras_recorrencia')
+
+    # Modelo das ocorrências
+    descricao = models.CharField(max_length=255)
+    valor = models.DecimalField(max_digits=15, decimal_places=2)
+    tipo = models.CharField(max_length=1, choices=Lancamento.TipoTransacao.choices)
+    categoria = models.ForeignKey(Categoria, on_delete=models.PROTECT, related_name='+')
+    conta_bancaria = models.ForeignKey(ContaBancaria, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    cartao_credito = models.ForeignKey(CartaoCredito, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+
+    periodicidade = models.CharField(max_length=10, choices=Periodicidade.choices, default=Periodicidade.MENSAL)
+    quantidade = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Total de ocorrências, incluindo a primeira. Vazio: sem término."
+    )
+    data_fim = models.DateField(null=True, blank=True, help_text="Última data de competência da série, se houver.")
+
+    # Andamento da materialização
+    ocorrencias_geradas = models.PositiveIntegerField(default=1)
+    proxima_competencia = models.DateField(
+        null=True, blank=True, help_text="Data de competência da próxima ocorrência a gravar. Vazio: série concluída."
+    )
+    proxima_caixa = models.DateField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Regra de Recorrência"
+        verbose_name_plural = "Regras de Recorrência"
+        indexes = [models.Index(fields=['usuario', 'proxima_competencia'])]
+
+    def __str__(self):
+        return f"{self.descricao} ({self.get_periodicidade_display()})"
+
+
+# --- Modelos de Saldo Materializado ---
+
+class SaldoMensal(models.Model):
+    """
+    Checkpoint do saldo de uma conta na abertura de um mês (antes de qualquer
+    lançamento do mês). Criado sob demanda por `services.saldo_em` e ajustado
+    pela variação de cada lançamento salvo, evita reagregar todo o histórico.
+    """
+    conta_bancaria = models.ForeignKey(ContaBancaria, on_delete=models.CASCADE, related_name='saldos_mensais')
+    mes = models.DateField(help_text="Primeiro dia do mês.")
+    saldo_abertura = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Saldo Mensal"
+        verbose_name_plural = "Saldos Mensais"
+        unique_together = [['conta_bancaria', 'mes']]
+
+    def __str__(self):
+        return f"{self.conta_bancaria.nome_banco} - {self.mes.strftime('%m/%Y')}: R$ {self.saldo_abertura}"
+
+
+class ResumoMensal(models.Model):
+    """
+    Totais mensais dos lançamentos de um usuário por conta/cartão, categoria e tipo.
+    `total_caixa` soma os lançamentos cuja data de caixa cai no mês e `total_competencia`
+    os cuja data de competência cai no mês. Mantido pela variação de cada lançamento
+    salvo; os meses são montados sob demanda (ver CoberturaResumoMensal).
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resumos_mensais')
+    conta_bancaria = models.ForeignKey(ContaBancaria, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    cartao_credito = models.ForeignKey(CartaoCredito, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='+')
+    mes = models.DateField(help_text="Primeiro dia do mês.")
+    tipo = models.CharField(max_length=1, choices=Lancamento.TipoTransacao.choices)
+    total_caixa = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_competencia = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = "Resumo Mensal"
+        verbose_name_plural = "Resumos Mensais"
+        indexes = [models.Index(fields=['usuario', 'mes'])]
+
+    def __str__(self):
+        return f"{self.usuario.username} - {self.mes.strftime('%m/%Y')} - {self.get_tipo_display()}"
+
+
+class CoberturaResumoMensal(models.Model):
+    """
+    Marca que os ResumoMensal de um usuário estão completos para um mês.
+    Meses sem cobertura são montados a partir dos lançamentos na primeira leitura.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    mes = models.DateField(help_text="Primeiro dia do mês.")
+
+    class Meta:
+        verbose_name = "Cobertura de Resumo Mensal"
+        verbose_name_plural = "Coberturas de Resumos Mensais"
+        unique_together = [['usuario', 'mes']]
+
+    def __str__(self):
+        return f"{self.usuario.username} - {self.mes.strftime('%m/%Y')}"
+
+
 # --- Modelo de Planejamento ---
 
 class Orcamento(models.Model):
@@ -280,4 +502,98 @@ class Orcamento(models.Model):
         unique_together = [['usuario', 'categoria', 'ano_mes']]
 
     def __str__(self):
-        return f"{self.categoria.nome} - {self.ano_mes.strftime('%m/%Y')} - R$ {self.valor}"
\ No newline at end of file
+        return f"{self.categoria.nome} - {self.ano_mes.strftime('%m/%Y')} - R$ {self.valor}"
+
+# --- Modelos de Importação ---
+
+def storage_importacoes():
+    """
+    Storage dos extratos aguardando importação (STORAGES['importacoes']). Precisa ser
+    compartilhado: o arquivo é gravado pela instância que recebeu o upload e lido pelo
+    job que processa a fila, que pode rodar em outra máquina.
+    """
+    return storages['importacoes']
+
+
+class TarefaImportacao(models.Model):
+    """
+    Arquivo de extrato aguardando processamento em segundo plano.
+    Funciona como uma fila no próprio banco: o comando `processar_importacoes`
+    reserva as tarefas pendentes e grava o resultado para a pré-conciliação.
+    """
+    class StatusTarefa(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Pendente'
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        CONCLUIDA = 'CONCLUIDA', 'Concluída'
+        IMPORTADA = 'IMPORTADA', 'Importada'
+        ERRO = 'ERRO', 'Erro'
+
+    class TipoArquivo(models.TextChoices):
+        CSV = 'csv', 'CSV'
+        OFX = 'ofx', 'OFX'
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tarefas_importacao')
+    conta_bancaria = models.ForeignKey(ContaBancaria, on_delete=models.CASCADE, related_name='tarefas_importacao')
+    tipo_arquivo = models.CharField(max_length=3, choices=TipoArquivo.choices)
+    arquivo = models.FileField(upload_to='importacoes/%Y/%m/', storage=storage_importacoes, blank=True)
+    nome_arquivo = models.CharField(max_length=255)
+
+    status = models.CharField(max_length=12, choices=StatusTarefa.choices, default=StatusTarefa.PENDENTE)
+    itens_processados = models.PositiveIntegerField(default=0)
+    resultado = models.JSONField(
+        null=True, blank=True,
+        help_text="Avisos e lançamentos antigos gerados pelo processamento. Os lançamentos para revisão ficam em LancamentoImportacao."
+    )
+    mensagem_erro = models.TextField(blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa de Importação"
+        verbose_name_plural = "Tarefas de Importação"
+        ordering = ['criado_em']
+        indexes = [models.Index(fields=['status', 'criado_em'])]
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.get_status_display()}) - {self.usuario.username}"
+
+    @property
+    def finalizada(self):
+        return self.status in (self.StatusTarefa.CONCLUIDA, self.StatusTarefa.IMPORTADA, self.StatusTarefa.ERRO)
+
+
+class LancamentoImportacao(models.Model):
+    """
+    Lançamento lido de um arquivo e aguardando revisão na pré-conciliação.
+    As edições da tela são gravadas aqui, linha a linha, e a confirmação
+    move as linhas aprovadas para Lancamento com um único INSERT ... SELECT.
+    """
+    tarefa = models.ForeignKey(TarefaImportacao, on_delete=models.CASCADE, related_name='itens')
+    posicao = models.PositiveIntegerField(help_text="Ordem do lançamento no arquivo.")
+    conta_bancaria = models.ForeignKey(ContaBancaria, on_delete=models.CASCADE, related_name='+')
+
+    descricao = models.CharField(max_length=255)
+    valor = models.DecimalField(max_digits=15, decimal_places=2)
+    tipo = models.CharField(max_length=1, choices=Lancamento.TipoTransacao.choices)
+    data_competencia = models.DateField()
+    data_caixa = models.DateField()
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='+')
+    numero_documento = models.CharField(max_length=100, null=True, blank=True)
+    import_hash = models.CharField(max_length=32)
+
+    ja_importado = models.BooleanField(default=False, help_text="O hash já existia quando o arquivo foi processado.")
+    excluido = models.BooleanField(default=False, help_text="Marcado pelo usuário para não ser importado.")
+    periodicidade = models.CharField(max_length=10, null=True, blank=True)
+    quantidade_repeticoes = models.PositiveIntegerField(null=True, blank=True)
+    recorrencia_id = models.UUIDField(null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = "Lançamento em Importação"
+        verbose_name_plural = "Lançamentos em Importação"
+        ordering = ['posicao']
+        unique_together = [['tarefa', 'posicao']]
+
+    def __str__(self):
+        return f"{self.descricao} ({self.tarefa_id}/{self.posicao})"
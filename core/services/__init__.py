@@ -5,11 +5,35 @@
 # from core import services
 # services.gerar_dados_grafico_saldo(...)
 
-from .dashboard_service import gerar_dados_grafico_saldo, gerar_dados_grafico_categorias
+from .dashboard_service import (
+    gerar_dados_grafico_saldo, gerar_dados_grafico_categorias, obter_dados_dashboard, obter_dados_dashboard_async,
+    invalidar_dashboard_usuario, invalidar_dashboard_todos_usuarios, etag_dados_usuario
+)
 from .csv_import_service import processar_arquivo_csv
 from .ofx_import_service import processar_arquivo_ofx # New import
-from .account_service import recalcular_saldo_conta
-from .rule_service import aplicar_regras_para_lancamento, aplicar_regra_em_massa
+from .account_service import recalcular_saldo_conta, calcular_saldo_conta, aplicar_variacao_saldo, saldo_em
+from .rule_service import (
+    aplicar_regras_para_lancamento, aplicar_regra_em_massa, obter_automato_regras,
+    invalidar_regras_usuario, invalidar_regras_todos_usuarios
+)
+from .recalculo_service import adiar_recalculos, recalculos_adiados, registrar_recalculos
+from .resumo_service import atualizar_resumos_mensais, garantir_resumos_mensais, invalidar_resumos_mensais
 from .report_service import gerar_dados_fluxo_caixa
-from .lancamento_service import criar_lancamentos_recorrentes
-from .fatura_service import get_or_create_fatura_aberta, recalcular_valor_fatura, fechar_fatura, reabrir_fatura
+from .busca_service import filtrar_por_descricao, buscar_lancamentos
+from .lancamento_service import (
+    criar_lancamentos_recorrentes, materializar_recorrencias, ocorrencias_virtuais, gravar_ocorrencia_recorrente,
+    serie_tem_ocorrencias_futuras, atualizar_recorrencia, encerrar_recorrencias, conciliar_lancamentos_em_lote,
+    filtrar_extrato, editar_lancamentos_em_lote, excluir_lancamentos_em_lote, pagina_extrato, saldo_final_extrato,
+    ocorrencias_do_extrato
+)
+from .import_service import (
+    buscar_hashes_existentes, preparar_itens_importacao, atualizar_item_importacao, promover_itens_importacao
+)
+from .importacao_tarefa_service import (
+    criar_tarefa_importacao, reservar_proxima_tarefa, executar_tarefa_importacao, liberar_tarefas_travadas,
+    remover_tarefas_antigas
+)
+from .fatura_service import (
+    get_or_create_fatura_aberta, mapear_faturas, ciclo_fatura, referencia_fatura, recalcular_valor_fatura, fechar_fatura,
+    reabrir_fatura
+)
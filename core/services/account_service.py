@@ -1,20 +1,16 @@
 # core/services/account_service.py
 from decimal import Decimal
 from datetime import date
-from django.db.models import Sum, Q
-from ..models import Lancamento, ContaBancaria
+from django.db.models import Sum, Q, F, Case, When, Value, DecimalField
+from ..models import Lancamento, ContaBancaria, SaldoMensal
 
-def recalcular_saldo_conta(conta: ContaBancaria):
+
+def calcular_saldo_conta(conta: ContaBancaria) -> Decimal:
     """
-    Recalcula e atualiza o saldo de uma conta bancária específica.
-    Esta é a lógica central que será usada por signals e chamadas manuais.
-    O saldo calculado reflete o saldo REAL, considerando apenas lançamentos
-    com data de caixa até o dia de hoje.
+    Calcula, agregando todos os lançamentos, o saldo REAL da conta:
+    o saldo inicial mais os lançamentos com data de caixa entre a data
+    do saldo inicial e o dia de hoje.
     """
-    if not isinstance(conta, ContaBancaria) or not conta.pk:
-        return
-
-    # Agrega os lançamentos que já ocorreram desde a data do saldo inicial
     agregado = Lancamento.objects.filter(
         conta_bancaria=conta,
         data_caixa__gte=conta.data_saldo_inicial,
@@ -26,9 +22,176 @@ def recalcular_saldo_conta(conta: ContaBancaria):
 
     creditos = agregado.get('total_creditos') or Decimal(0.00)
     debitos = agregado.get('total_debitos') or Decimal(0.00)
-    
+
     # O cálculo correto sempre parte do saldo inicial da conta
-    novo_saldo = conta.saldo_inicial + creditos - debitos
+    return conta.saldo_inicial + creditos - debitos
+
+
+def recalcular_saldo_conta(conta: ContaBancaria):
+    """
+    Recalcula por completo e atualiza o saldo de uma conta bancária específica.
+    Usado quando a própria conta muda, por operações em lote e pelo comando
+    `verificar_saldos`; alterações de um lançamento usam aplicar_variacao_saldo.
+    """
+    if not isinstance(conta, ContaBancaria) or not conta.pk:
+        return
+
+    _gravar_saldo_calculado(conta)
+    # Um recálculo completo parte do zero: os checkpoints mensais serão refeitos sob demanda.
+    SaldoMensal.objects.filter(conta_bancaria=conta).delete()
+
+
+def _gravar_saldo_calculado(conta: ContaBancaria):
+    novo_saldo = calcular_saldo_conta(conta)
 
     # Atualiza o campo de forma eficiente, sem disparar outros signals
-    ContaBancaria.objects.filter(pk=conta.pk).update(saldo_calculado=novo_saldo)
\ No newline at end of file
+    ContaBancaria.objects.filter(pk=conta.pk).update(saldo_calculado=novo_saldo, saldo_atualizado_em=date.today())
+
+
+def _valor_com_sinal(estado, sinal):
+    """
+    Converte o estado de um lançamento (conta, tipo, valor, data de caixa) em
+    (conta_id, data_caixa, valor com sinal), ou None se ele não pertence a uma conta.
+    """
+    if estado is None:
+        return None
+    conta_id, tipo, valor, data_caixa = estado
+    if isinstance(data_caixa, str):
+        data_caixa = date.fromisoformat(data_caixa)
+    if not conta_id or not data_caixa:
+        return None
+
+    valor = Decimal(str(valor))
+    return conta_id, data_caixa, sinal * (valor if tipo == Lancamento.TipoTransacao.CREDITO else -valor)
+
+
+def _ajustar_saldos_mensais(parcelas):
+    """
+    Soma a variação de cada lançamento aos checkpoints dos meses seguintes à sua data de caixa.
+    Checkpoints ainda não criados não precisam de ajuste: nascem já com o valor correto.
+    """
+    for conta_id, data_caixa, valor in parcelas:
+        SaldoMensal.objects.filter(
+            conta_bancaria_id=conta_id,
+            mes__gt=data_caixa,
+            conta_bancaria__data_saldo_inicial__lte=data_caixa,
+        ).update(saldo_abertura=F('saldo_abertura') + valor)
+
+
+def aplicar_variacao_saldo(estado_anterior, estado_novo):
+    """
+    Ajusta o saldo das contas envolvidas pela diferença entre o estado anterior
+    e o novo de um lançamento (None quando ele não existia ou deixou de existir),
+    com um UPDATE atômico sobre o saldo armazenado, sem reagregar o histórico.
+
+    Se o saldo da conta não foi recalculado hoje, lançamentos com data de caixa
+    futura podem ter passado a valer; nesse caso a conta é recalculada por completo.
+    """
+    if estado_anterior == estado_novo:
+        return
+
+    parcelas = [
+        parcela for parcela in (_valor_com_sinal(estado_anterior, -1), _valor_com_sinal(estado_novo, 1)) if parcela
+    ]
+    _ajustar_saldos_mensais(parcelas)
+
+    hoje = date.today()
+    campo_decimal = DecimalField(max_digits=15, decimal_places=2)
+    parcelas_por_conta = {}
+    for conta_id, data_caixa, valor in parcelas:
+        if data_caixa > hoje:
+            continue
+        # A comparação com a data do saldo inicial fica no próprio UPDATE, sem ler a conta antes.
+        parcelas_por_conta.setdefault(conta_id, []).append(Case(
+            When(data_saldo_inicial__lte=data_caixa, then=Value(valor, output_field=campo_decimal)),
+            default=Value(Decimal('0.00'), output_field=campo_decimal),
+            output_field=campo_decimal,
+        ))
+
+    for conta_id, expressoes in parcelas_por_conta.items():
+        novo_saldo = F('saldo_calculado')
+        for expressao in expressoes:
+            novo_saldo = novo_saldo + expressao
+
+        atualizadas = ContaBancaria.objects.filter(
+            pk=conta_id, saldo_atualizado_em=hoje
+        ).update(saldo_calculado=novo_saldo)
+
+        if not atualizadas:
+            conta = ContaBancaria.objects.filter(pk=conta_id).first()
+            if conta:
+                _gravar_saldo_calculado(conta)
+
+
+def _movimento_por_conta(conta_ids, inicio, fim):
+    """
+    Soma, por conta, os lançamentos com data de caixa em [inicio, fim) que
+    contam para o saldo (a partir da data do saldo inicial de cada conta).
+    `inicio` None significa desde a data do saldo inicial.
+    """
+    filtros = Q(conta_bancaria_id__in=conta_ids, data_caixa__lt=fim, data_caixa__gte=F('conta_bancaria__data_saldo_inicial'))
+    if inicio is not None:
+        filtros &= Q(data_caixa__gte=inicio)
+
+    agregados = Lancamento.objects.filter(filtros).values('conta_bancaria_id').annotate(
+        creditos=Sum('valor', filter=Q(tipo='C'), default=Decimal('0.00')),
+        debitos=Sum('valor', filter=Q(tipo='D'), default=Decimal('0.00')),
+    ).order_by()
+    return {item['conta_bancaria_id']: item['creditos'] - item['debitos'] for item in agregados}
+
+
+def _criar_saldos_mensais(contas, mes):
+    """
+    Cria os checkpoints de abertura do mês para as contas informadas, partindo
+    do checkpoint anterior mais próximo de cada uma (ou do saldo inicial).
+    """
+    anteriores = {}
+    for checkpoint in SaldoMensal.objects.filter(
+        conta_bancaria__in=contas, mes__lt=mes
+    ).order_by('conta_bancaria_id', '-mes'):
+        anteriores.setdefault(checkpoint.conta_bancaria_id, checkpoint)
+
+    # Contas que partem do mesmo ponto compartilham uma única consulta agrupada de movimento.
+    por_inicio = {}
+    for conta in contas:
+        anterior = anteriores.get(conta.pk)
+        por_inicio.setdefault(anterior.mes if anterior else None, []).append(conta)
+
+    novos = []
+    for inicio, grupo in por_inicio.items():
+        movimentos = _movimento_por_conta([conta.pk for conta in grupo], inicio, mes)
+        for conta in grupo:
+            base = anteriores[conta.pk].saldo_abertura if inicio else conta.saldo_inicial
+            movimento = movimentos.get(conta.pk, Decimal('0.00'))
+            novos.append(SaldoMensal(conta_bancaria=conta, mes=mes, saldo_abertura=base + movimento))
+
+    # ignore_conflicts: outra requisição pode ter criado o mesmo checkpoint em paralelo.
+    SaldoMensal.objects.bulk_create(novos, ignore_conflicts=True)
+    return {checkpoint.conta_bancaria_id: checkpoint.saldo_abertura for checkpoint in novos}
+
+
+def saldo_em(conta_ids, data: date) -> dict:
+    """
+    Retorna {conta_id: saldo} com o saldo de cada conta na abertura do dia `data`,
+    isto é, antes de qualquer lançamento desse dia, incluindo lançamentos futuros
+    (projeção). Usa o checkpoint do mês e soma só os lançamentos do mês até a data.
+    """
+    conta_ids = list(conta_ids)
+    if not conta_ids:
+        return {}
+    mes = data.replace(day=1)
+
+    saldos = dict(SaldoMensal.objects.filter(
+        conta_bancaria_id__in=conta_ids, mes=mes
+    ).values_list('conta_bancaria_id', 'saldo_abertura'))
+
+    faltantes = [pk for pk in conta_ids if pk not in saldos]
+    if faltantes:
+        contas = list(ContaBancaria.objects.filter(pk__in=faltantes).only('pk', 'saldo_inicial', 'data_saldo_inicial'))
+        saldos.update(_criar_saldos_mensais(contas, mes))
+
+    if data > mes:
+        for conta_id, movimento in _movimento_por_conta(list(saldos), mes, data).items():
+            saldos[conta_id] += movimento
+
+    return saldos
@@ -0,0 +1,56 @@
+# core/services/busca_service.py
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from ..models import Lancamento
+
+# Quantos resultados a busca global exibe, dos mais recentes para os mais antigos.
+LIMITE_BUSCA = 100
+# Termos menores que um trigrama não são atendidos pelo índice.
+TAMANHO_MINIMO_INDEXADO = 3
+
+# SQLite (settings_local): tabela FTS5 de trigramas mantida por triggers; no PostgreSQL,
+# índice GIN de trigramas sobre UPPER(descricao). Ambos criados pela migração 0014.
+TABELA_BUSCA_SQLITE = 'core_lancamento_busca'
+
+
+def filtrar_por_descricao(lancamentos, texto):
+    """
+    Restringe o queryset aos lançamentos cuja descrição contém `texto`, sem
+    diferenciar maiúsculas de minúsculas (a mesma semântica de `descricao__icontains`),
+    usando o índice de trigramas do banco quando ele existe.
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return lancamentos
+
+    using = lancamentos.db
+    if connections[using].vendor == 'sqlite' and len(texto) >= TAMANHO_MINIMO_INDEXADO:
+        # A expressão vira uma frase FTS5 (aspas duplicadas para escapar): casa como substring.
+        frase = '"{}"'.format(texto.replace('"', '""'))
+        return lancamentos.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {TABELA_BUSCA_SQLITE} WHERE {TABELA_BUSCA_SQLITE} MATCH %s", [frase]
+        ))
+    # No PostgreSQL o índice GIN atende o próprio ILIKE; sem índice, é uma varredura comum.
+    return lancamentos.filter(descricao__icontains=texto)
+
+
+def buscar_lancamentos(usuario, texto, limite=LIMITE_BUSCA):
+    """
+    Busca global: lançamentos de todas as contas e cartões do usuário cuja descrição
+    contém cada um dos termos de `texto`, dos mais recentes para os mais antigos.
+    Retorna (lancamentos, ha_mais), com no máximo `limite` lançamentos.
+    """
+    termos = (texto or '').split()
+    if not termos:
+        return [], False
+
+    lancamentos = Lancamento.objects.filter(usuario=usuario)
+    for termo in termos:
+        lancamentos = filtrar_por_descricao(lancamentos, termo)
+    lancamentos = lancamentos.select_related(
+        'categoria', 'conta_bancaria', 'cartao_credito'
+    ).order_by('-data_competencia', '-id')
+
+    resultado = list(lancamentos[:limite + 1])
+    return resultado[:limite], len(resultado) > limite
@@ -0,0 +1,47 @@
+# core/services/cache_service.py
+import uuid
+
+from django.core.cache import cache
+
+
+def _chave_versao(namespace, usuario_id):
+    return f"versao:{namespace}:{usuario_id}"
+
+
+def obter_versao(namespace, usuario_id):
+    """
+    Retorna o token de versão atual de um conjunto de dados do usuário.
+    O token vive no cache do Django, então é compartilhado entre processos
+    quando um backend compartilhado estiver configurado.
+    """
+    chave = _chave_versao(namespace, usuario_id)
+    versao = cache.get(chave)
+    if versao is None:
+        # Usamos um token aleatório (e não um contador) para que uma chave despejada
+        # do cache nunca "volte" a um valor antigo que ainda esteja em memória.
+        # add() não sobrescreve um token criado por outro processo no meio do caminho.
+        cache.add(chave, uuid.uuid4().hex, timeout=None)
+        versao = cache.get(chave)
+    # Sem um cache funcional (ex: DummyCache), cada chamada recebe um token novo,
+    # o que desliga o reaproveitamento em vez de servir dados desatualizados.
+    return versao or uuid.uuid4().hex
+
+
+def incrementar_versao(namespace, usuario_id):
+    """Invalida tudo o que foi derivado da versão anterior dos dados do usuário."""
+    nova_versao = uuid.uuid4().hex
+    cache.set(_chave_versao(namespace, usuario_id), nova_versao, timeout=None)
+    return nova_versao
+
+
+def obter_versoes(namespace, usuario_ids):
+    """
+    Como obter_versao(), para várias chaves de uma vez: uma única leitura do cache
+    (get_many) quando todos os tokens já existem. Retorna uma tupla na mesma ordem.
+    """
+    chaves = [_chave_versao(namespace, usuario_id) for usuario_id in usuario_ids]
+    encontradas = cache.get_many(chaves)
+    return tuple(
+        encontradas.get(chave) or obter_versao(namespace, usuario_id)
+        for chave, usuario_id in zip(chaves, usuario_ids)
+    )
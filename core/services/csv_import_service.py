@@ -1,4 +1,5 @@
 # core/services/csv_import_service.py
+import codecs
 import csv
 import io
 from datetime import datetime
@@ -8,42 +9,115 @@ from ..models import Lancamento, get_default_other_category
 from ..utils import gerar_hash_lancamento
 from .. import services
 
-def processar_arquivo_csv(csv_file, conta_selecionada):
+# Tamanho dos blocos lidos do upload. Apenas um bloco (mais a linha incompleta
+# que sobra dele) fica decodificado em memória por vez.
+TAMANHO_BLOCO = 64 * 1024
+# De quantas em quantas linhas o progresso é informado a quem chamou.
+INTERVALO_PROGRESSO = 200
+
+
+def _blocos_do_arquivo(arquivo):
+    """Lê o upload em blocos, usando o chunks() do Django quando disponível."""
+    if hasattr(arquivo, 'chunks'):
+        yield from arquivo.chunks(TAMANHO_BLOCO)
+        return
+    while True:
+        bloco = arquivo.read(TAMANHO_BLOCO)
+        if not bloco:
+            return
+        yield bloco
+
+
+def _detectar_codificacao(primeiro_bloco):
     """
-    Processa um arquivo CSV de extrato bancário.
+    Detecta a codificação a partir do primeiro bloco do arquivo.
+    Exportações de bancos costumam vir em UTF-8 (às vezes com BOM) ou Latin-1.
     """
+    if primeiro_bloco.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
     try:
-        decoded_file = csv_file.read().decode('utf-8')
+        # final=False tolera um caractere multibyte cortado no fim do bloco.
+        codecs.getincrementaldecoder('utf-8')().decode(primeiro_bloco, final=False)
+        return 'utf-8'
     except UnicodeDecodeError:
-        csv_file.seek(0)
-        decoded_file = csv_file.read().decode('latin-1')
+        return 'latin-1'
+
+
+def _com_primeiro(primeiro, restante):
+    if primeiro:
+        yield primeiro
+    yield from restante
+
+
+def _textos_decodificados(arquivo):
+    """
+    Decodifica o upload incrementalmente, gerando um trecho de texto por bloco lido.
+    A codificação é detectada no primeiro bloco, com recuo para Latin-1 se o restante não for UTF-8.
+    """
+    blocos = _blocos_do_arquivo(arquivo)
+    primeiro_bloco = next(blocos, b'')
+    decodificador = codecs.getincrementaldecoder(_detectar_codificacao(primeiro_bloco))()
+
+    for bloco in _com_primeiro(primeiro_bloco, blocos):
+        try:
+            yield decodificador.decode(bloco)
+        except UnicodeDecodeError:
+            # O arquivo parecia UTF-8 no início, mas não é: o restante é lido como Latin-1,
+            # aproveitando os bytes que o decodificador anterior ainda tinha guardados.
+            bytes_guardados, _ = decodificador.getstate()
+            decodificador = codecs.getincrementaldecoder('latin-1')()
+            yield decodificador.decode(bytes_guardados + bloco)
+
+    yield decodificador.decode(b'', final=True)
+
+
+def _linhas_decodificadas(arquivo):
+    """
+    Gera uma linha de texto por vez a partir do upload decodificado,
+    preservando as quebras de linha para que o csv.reader trate campos entre aspas.
+    """
+    pendente = ''
+    for texto in _textos_decodificados(arquivo):
+        linhas = list(io.StringIO(pendente + texto, newline=''))
+        pendente = ''
+        # A última linha só é liberada quando sua quebra estiver completa
+        # (um '\r' no fim do bloco pode ser a primeira metade de um '\r\n').
+        if linhas and (not linhas[-1].endswith('\n')):
+            pendente = linhas.pop()
+        yield from linhas
 
-    io_string = io.StringIO(decoded_file)
-    reader = csv.reader(io_string, delimiter=',')
+    if pendente:
+        yield pendente
+
+
+def _linhas_csv(arquivo):
+    """Gera as linhas do CSV já separadas em colunas, sem o cabeçalho."""
+    reader = csv.reader(_linhas_decodificadas(arquivo), delimiter=',')
     next(reader, None)
+    yield from reader
 
-    hashes_existentes = set(Lancamento.objects.filter(
-        conta_bancaria=conta_selecionada, 
-        import_hash__isnull=False
-    ).values_list('import_hash', flat=True))
 
-    lancamentos_a_revisar = []
-    warnings = []
-    lancamentos_antigos = [] 
-    
+def _interpretar_linhas(linhas, conta_selecionada):
+    """
+    Converte cada linha do CSV em um lançamento para revisão.
+    Gera tuplas (tipo, item), onde tipo é 'revisar', 'antigo' ou 'aviso'.
+    """
     # Pega a data de saldo inicial da conta uma vez antes do loop
     data_saldo_inicial_conta = conta_selecionada.data_saldo_inicial
-    
-    for row in reader:
+    # Compila as regras do usuário uma única vez para todas as linhas do arquivo
+    automato_regras = services.obter_automato_regras(conta_selecionada.usuario_id)
+    categoria_padrao = get_default_other_category()
+
+    for row in linhas:
         try:
             if not row[4] or row[4].strip() == '0': continue
-            
+
             data_caixa_str = row[0].strip()
             descricao = row[2].strip()
             data_competencia_str = row[3].strip() or data_caixa_str
             numero_documento = row[4].strip()
             valor_str = row[5].strip()
-            
+
             data_competencia_obj = datetime.strptime(data_competencia_str, '%d/%m/%Y').date()
             data_caixa_obj = datetime.strptime(data_caixa_str, '%d/%m/%Y').date()
 
@@ -55,36 +129,62 @@ def processar_arquivo_csv(csv_file, conta_selecionada):
 
             # Cria uma instância temporária para aplicar as regras de categoria
             temp_lancamento = Lancamento(
-                usuario=conta_selecionada.usuario,
+                usuario_id=conta_selecionada.usuario_id,
                 descricao=descricao,
                 # Define a categoria padrão para que as regras possam ser aplicadas
-                categoria=get_default_other_category()
+                categoria=categoria_padrao
             )
-            services.aplicar_regras_para_lancamento(temp_lancamento)
+            services.aplicar_regras_para_lancamento(temp_lancamento, automato_regras)
 
             if data_caixa_obj < data_saldo_inicial_conta:
                 # Se for, adiciona à lista de 'antigos' e pula para a próxima linha.
-                lancamentos_antigos.append({
+                yield 'antigo', {
                     'data_caixa': data_caixa_obj.strftime('%d/%m/%Y'),
-                    'descricao': row[2].strip(),
-                    'valor': row[5].strip(),
-                })
+                    'descricao': descricao,
+                    'valor': valor_str,
+                }
                 continue
 
-            lancamentos_a_revisar.append({
+            yield 'revisar', {
                 'data_competencia': data_competencia_obj.isoformat(),
                 'data_caixa': data_caixa_obj.isoformat(),
                 'descricao': descricao, 'valor': f'{abs(valor):.2f}',
                 'tipo': 'Crédito' if valor > 0 else 'Débito',
                 'import_hash': hash_gerado,
-                'ja_importado': hash_gerado in hashes_existentes,
                 'numero_documento': numero_documento,
                 'categoria_id': temp_lancamento.categoria.id,
                 'categoria_nome': temp_lancamento.categoria.nome,
-            })
+            }
 
         except (IndexError, ValueError, InvalidOperation) as e:
-            warnings.append(f"Linha ignorada: {','.join(row)}. Erro: {e}")
+            yield 'aviso', f"Linha ignorada: {','.join(row)}. Erro: {e}"
             continue
 
-    return lancamentos_a_revisar, warnings, lancamentos_antigos
\ No newline at end of file
+
+def processar_arquivo_csv(csv_file, conta_selecionada, ao_progredir=None):
+    """
+    Processa um arquivo CSV de extrato bancário.
+    O arquivo é lido em blocos e interpretado linha a linha, então o uso de
+    memória do parser não cresce com o tamanho do upload.
+    Se informado, `ao_progredir` recebe periodicamente o número de linhas processadas.
+    """
+    lancamentos_a_revisar = []
+    warnings = []
+    lancamentos_antigos = []
+
+    for processadas, (tipo, item) in enumerate(_interpretar_linhas(_linhas_csv(csv_file), conta_selecionada), start=1):
+        if ao_progredir and processadas % INTERVALO_PROGRESSO == 0:
+            ao_progredir(processadas)
+        if tipo == 'revisar':
+            lancamentos_a_revisar.append(item)
+        elif tipo == 'antigo':
+            lancamentos_antigos.append(item)
+        else:
+            warnings.append(item)
+
+    # Só os hashes gerados a partir do arquivo são consultados no banco.
+    hashes_existentes = services.buscar_hashes_existentes(item['import_hash'] for item in lancamentos_a_revisar)
+    for item in lancamentos_a_revisar:
+        item['ja_importado'] = item['import_hash'] in hashes_existentes
+
+    return lancamentos_a_revisar, warnings, lancamentos_antigos
@@ -1,10 +1,168 @@
 # core/services/dashboard_service.py
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from functools import partial
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 
-from ..models import ContaBancaria, Lancamento, Fatura
-from django.db.models import Sum, Q
+from ..models import ContaBancaria, Lancamento, Fatura, ResumoMensal
+from .. import services
+from .cache_service import obter_versao, incrementar_versao
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Sum, Q, F, Case, When, DecimalField
+
+CACHE_NAMESPACE_DASHBOARD = 'dashboard'
+# As entradas são invalidadas pela versão dos dados; o prazo só limita o que fica esquecido no cache.
+TEMPO_CACHE_DASHBOARD = 60 * 60 * 24
+# Threads que calculam os gráficos do painel em paralelo. Cada uma usa sua própria conexão
+# com o banco, então o limite também limita as conexões extras abertas por processo.
+MAX_THREADS_DASHBOARD = 3
+_executor_dashboard = ThreadPoolExecutor(max_workers=MAX_THREADS_DASHBOARD, thread_name_prefix='dashboard')
+
+
+def _chave_dashboard(usuario_id, ano, mes, contas_ids):
+    contas = ','.join(str(pk) for pk in contas_ids)
+    return 'dashboard:{}:{}:{}:{}:{}:{}'.format(
+        usuario_id,
+        obter_versao(CACHE_NAMESPACE_DASHBOARD, usuario_id),
+        obter_versao(CACHE_NAMESPACE_DASHBOARD, 'sistema'),
+        ano, mes,
+        # A lista de contas pode ser longa; o hash mantém a chave dentro do limite dos backends.
+        hashlib.md5(contas.encode()).hexdigest(),
+    )
+
+
+def obter_dados_dashboard(usuario, ano, mes, contas_ids):
+    """
+    Retorna os dados dos gráficos do painel (saldo, despesas por categoria e fluxo de caixa)
+    para o mês e as contas informadas, reaproveitando o resultado guardado no cache do
+    Django enquanto a versão dos dados do usuário não mudar.
+    """
+    contas_ids = sorted({int(pk) for pk in contas_ids})
+    chave = _chave_dashboard(usuario.pk, ano, mes, contas_ids)
+    dados = cache.get(chave)
+    if dados is None:
+        dados = _montar_dados_dashboard(*(funcao() for funcao in _calculos_dashboard(usuario, ano, mes, contas_ids)))
+        cache.set(chave, dados, TEMPO_CACHE_DASHBOARD)
+    return dados
+
+
+async def obter_dados_dashboard_async(usuario, ano, mes, contas_ids):
+    """
+    Versão assíncrona de obter_dados_dashboard: em caso de cache vazio, os três
+    cálculos, que são independentes, rodam ao mesmo tempo em um pool limitado de
+    threads, e a latência passa a ser a do mais lento em vez da soma dos três.
+    """
+    contas_ids = sorted({int(pk) for pk in contas_ids})
+    chave = await sync_to_async(_chave_dashboard)(usuario.pk, ano, mes, contas_ids)
+    dados = await cache.aget(chave)
+    if dados is None:
+        calculos = _calculos_dashboard(usuario, ano, mes, contas_ids)
+        if await sync_to_async(lambda: connection.in_atomic_block)():
+            # Outras conexões não enxergam o que a transação em curso ainda não confirmou.
+            resultados = [await sync_to_async(funcao)() for funcao in calculos]
+        else:
+            resultados = await _executar_em_paralelo(calculos)
+        dados = _montar_dados_dashboard(*resultados)
+        await cache.aset(chave, dados, TEMPO_CACHE_DASHBOARD)
+    return dados
+
+
+async def _executar_em_paralelo(calculos):
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(_executor_dashboard, _executar_com_conexao_propria, funcao)
+        for funcao in calculos
+    ))
+
+
+def _calculos_dashboard(usuario, ano, mes, contas_ids):
+    """Os três cálculos independentes do painel, na ordem esperada por _montar_dados_dashboard."""
+    return [
+        partial(gerar_dados_grafico_saldo, usuario, ano=ano, mes=mes, contas_ids=contas_ids),
+        partial(gerar_dados_grafico_categorias, usuario, ano=ano, mes=mes, contas_ids=contas_ids),
+        partial(services.gerar_dados_fluxo_caixa, usuario, ano, contas_ids=contas_ids),
+    ]
+
+
+def _montar_dados_dashboard(grafico_saldo, despesas, fluxo_caixa):
+    chart_labels, chart_data = grafico_saldo
+    return {
+        'chart_labels': chart_labels,
+        'chart_data': chart_data,
+        'despesas': despesas,
+        'fluxo_caixa': fluxo_caixa,
+    }
+
+
+def _executar_com_conexao_propria(funcao):
+    # As threads do pool não passam pelo ciclo de requisição do Django,
+    # então as conexões vencidas (ou, com CONN_MAX_AGE=0, todas) são fechadas aqui.
+    close_old_connections()
+    try:
+        return funcao()
+    finally:
+        close_old_connections()
+
+
+def etag_dados_usuario(usuario_id, *partes):
+    """
+    Gera um ETag forte para uma resposta derivada dos dados do usuário: muda quando
+    a versão dos dados (a mesma do cache do painel) muda, a cada dia (lançamentos
+    agendados passam a valer), a cada nova revisão implantada no Cloud Run ou
+    quando mudam os parâmetros da resposta (`partes`). Só consulta o cache, nunca os lançamentos.
+    """
+    componentes = [
+        usuario_id,
+        obter_versao(CACHE_NAMESPACE_DASHBOARD, usuario_id),
+        obter_versao(CACHE_NAMESPACE_DASHBOARD, 'sistema'),
+        date.today().isoformat(),
+        os.environ.get('K_REVISION', ''),
+        *partes,
+    ]
+    return hashlib.sha256(':'.join(str(parte) for parte in componentes).encode()).hexdigest()
+
+
+class _InvalidacaoPainel:
+    """Callback de on_commit que troca a versão do painel de um usuário (ou a do 'sistema')."""
+
+    def __init__(self, chave_versao):
+        self.chave_versao = chave_versao
+        self.executada = False
+
+    def __call__(self):
+        self.executada = True
+        incrementar_versao(CACHE_NAMESPACE_DASHBOARD, self.chave_versao)
+
+
+def _invalidar_apos_commit(chave_versao):
+    """
+    Troca a versão do painel uma única vez por transação, quando a alteração fica
+    visível para todos (fora de uma transação, na hora). Antes do commit, outras
+    requisições só enxergam os dados antigos, que continuam válidos na versão atual.
+    """
+    # Um callback ainda pendente para a mesma versão basta; um rollback o descarta
+    # junto com as alterações, e a próxima escrita volta a registrá-lo.
+    for _, pendente, _ in transaction.get_connection().run_on_commit:
+        if isinstance(pendente, _InvalidacaoPainel) and pendente.chave_versao == chave_versao and not pendente.executada:
+            return
+    transaction.on_commit(_InvalidacaoPainel(chave_versao))
+
+
+def invalidar_dashboard_usuario(usuario_id):
+    """Descarta os dados do painel guardados para o usuário. Chamado pelos signals de escrita."""
+    _invalidar_apos_commit(usuario_id)
+
+
+def invalidar_dashboard_todos_usuarios():
+    """Usado quando uma categoria do sistema (compartilhada por todos) é alterada."""
+    _invalidar_apos_commit('sistema')
+
 
 def gerar_dados_grafico_saldo(usuario, ano, mes, contas_ids=None):
     """
@@ -15,8 +173,10 @@ def gerar_dados_grafico_saldo(usuario, ano, mes, contas_ids=None):
     contas_a_calcular = ContaBancaria.objects.filter(usuario=usuario)
     if contas_ids is not None:
         contas_a_calcular = contas_a_calcular.filter(pk__in=contas_ids)
-    
-    if not contas_a_calcular.exists():
+    inicio_contas = dict(contas_a_calcular.values_list('pk', 'data_saldo_inicial'))
+    conta_ids = list(inicio_contas)
+
+    if not conta_ids:
         return [], []
 
     # 2. Define o período do gráfico para o mês selecionado.
@@ -24,52 +184,22 @@ def gerar_dados_grafico_saldo(usuario, ano, mes, contas_ids=None):
     data_fim_mes = data_inicio_mes + relativedelta(months=1) - relativedelta(days=1)
 
     # 3. Calcula o saldo consolidado no início do mês para as contas selecionadas.
-    saldo_acumulado = Decimal('0.0')
-    for conta in contas_a_calcular:
-        saldo_da_conta = conta.saldo_inicial
-        
-        # Soma as transações passadas da conta para encontrar o saldo no início do mês.
-        agregado_passado = Lancamento.objects.filter(
-            conta_bancaria=conta,
-            data_caixa__gte=conta.data_saldo_inicial,
-            data_caixa__lt=data_inicio_mes
-        ).aggregate(
-            creditos=Sum('valor', filter=Q(tipo='C'), default=Decimal('0.0')),
-            debitos=Sum('valor', filter=Q(tipo='D'), default=Decimal('0.0'))
-        )
-        
-        saldo_da_conta += (agregado_passado['creditos'] - agregado_passado['debitos'])
-        saldo_acumulado += saldo_da_conta
+    # O checkpoint mensal evita reagregar todo o histórico de cada conta.
+    saldos_abertura = services.saldo_em(conta_ids, data_inicio_mes)
+    saldo_acumulado = sum(saldos_abertura.values(), Decimal('0.0'))
 
-    # 4. Busca os lançamentos do período para as contas selecionadas.
-    lancamentos_periodo = Lancamento.objects.filter(
-        usuario=usuario,
-        data_caixa__range=(data_inicio_mes, data_fim_mes),
-        conta_bancaria__in=contas_a_calcular
-    ).order_by('data_caixa')
-
-    # 5. Agrupa as mudanças diárias para aplicar ao saldo.
-    mudancas_diarias = {}
-    for lancamento in lancamentos_periodo:
-        valor_com_sinal = lancamento.valor if lancamento.tipo == 'C' else -lancamento.valor
-        mudancas_diarias[lancamento.data_caixa] = mudancas_diarias.get(lancamento.data_caixa, Decimal('0.0')) + valor_com_sinal
-
-    # Adiciona a projeção de pagamento de faturas ABERTAS para as contas selecionadas.
-    # Faturas FECHADAS já têm um lançamento de pagamento que é pego pela query anterior.
-    faturas_abertas_periodo = Fatura.objects.filter(
-        usuario=usuario,
-        status=Fatura.StatusFatura.ABERTA,
-        data_vencimento__range=(data_inicio_mes, data_fim_mes),
-        cartao__conta_pagamento__in=contas_a_calcular
-    )
+    # 4. Soma, direto no banco e agrupado por dia, a variação líquida de todas as contas selecionadas.
+    mudancas_diarias = _variacoes_diarias(usuario, conta_ids, data_inicio_mes, data_fim_mes)
 
-    for fatura in faturas_abertas_periodo:
-        # O pagamento da fatura é sempre um débito no fluxo de caixa da conta.
-        valor_debito = -fatura.valor_total
-        data_vencimento = fatura.data_vencimento
-        mudancas_diarias[data_vencimento] = mudancas_diarias.get(data_vencimento, Decimal('0.0')) + valor_debito
+    # As ocorrências recorrentes ainda não gravadas vêm das regras: as anteriores ao mês
+    # entram no saldo de abertura e as do mês, na variação do dia.
+    for dia, variacao in _variacoes_virtuais(usuario, inicio_contas, data_fim_mes).items():
+        if dia < data_inicio_mes:
+            saldo_acumulado += variacao
+        else:
+            mudancas_diarias[dia] = mudancas_diarias.get(dia, Decimal('0.0')) + variacao
 
-    # 6. Popula os dados do gráfico dia a dia, começando com o saldo inicial calculado.
+    # 5. Popula os dados do gráfico dia a dia, começando com o saldo inicial calculado.
     chart_labels = []
     chart_data = []
     
@@ -82,6 +212,62 @@ def gerar_dados_grafico_saldo(usuario, ano, mes, contas_ids=None):
 
     return chart_labels, chart_data
 
+
+def _variacoes_diarias(usuario, conta_ids, data_inicio, data_fim):
+    """
+    Retorna {data: variação líquida} dos lançamentos das contas no período, mais a
+    projeção de pagamento das faturas ABERTAS pagas por essas contas, com duas
+    consultas agrupadas por dia, independentemente do número de contas.
+    """
+    campo_decimal = DecimalField(max_digits=15, decimal_places=2)
+    variacoes = Lancamento.objects.filter(
+        usuario=usuario,
+        data_caixa__range=(data_inicio, data_fim),
+        conta_bancaria_id__in=conta_ids
+    ).values('data_caixa').annotate(
+        variacao=Sum(Case(
+            When(tipo='C', then=F('valor')),
+            default=-F('valor'),
+            output_field=campo_decimal,
+        ))
+    ).order_by()
+    mudancas_diarias = {item['data_caixa']: item['variacao'] for item in variacoes}
+
+    # Faturas FECHADAS já têm um lançamento de pagamento que é pego pela consulta anterior.
+    # O pagamento da fatura é sempre um débito no fluxo de caixa da conta.
+    faturas_abertas = Fatura.objects.filter(
+        usuario=usuario,
+        status=Fatura.StatusFatura.ABERTA,
+        data_vencimento__range=(data_inicio, data_fim),
+        cartao__conta_pagamento_id__in=conta_ids
+    ).values('data_vencimento').annotate(total=Sum('valor_total')).order_by()
+    for item in faturas_abertas:
+        data_vencimento = item['data_vencimento']
+        mudancas_diarias[data_vencimento] = mudancas_diarias.get(data_vencimento, Decimal('0.0')) - item['total']
+
+    return mudancas_diarias
+
+def _variacoes_virtuais(usuario, inicio_contas, data_fim):
+    """
+    Retorna {data: variação líquida} das ocorrências recorrentes ainda não gravadas até
+    `data_fim` nas contas de `inicio_contas` ({conta_id: data do saldo inicial}): as de
+    conta na data de caixa, as de cartão no vencimento da fatura em que entrarão.
+    """
+    variacoes = {}
+    for ocorrencia in services.ocorrencias_virtuais(usuario.pk, data_fim, list(inicio_contas)):
+        if ocorrencia.cartao_credito_id:
+            cartao = ocorrencia.cartao_credito
+            referencia = services.referencia_fatura(cartao, ocorrencia.data_competencia)
+            dia = services.ciclo_fatura(cartao.dia_fechamento, cartao.dia_vencimento, referencia)[1]
+            conta_id = cartao.conta_pagamento_id
+        else:
+            dia, conta_id = ocorrencia.data_caixa, ocorrencia.conta_bancaria_id
+        if dia is None or conta_id not in inicio_contas or not inicio_contas[conta_id] <= dia <= data_fim:
+            continue
+        variacoes[dia] = variacoes.get(dia, Decimal('0.0')) + ocorrencia.valor_com_sinal
+    return variacoes
+
+
 def gerar_dados_grafico_categorias(usuario, ano, mes, contas_ids=None):
     """
     Calcula os dados para o gráfico de rosca de despesas por categoria.
@@ -89,14 +275,14 @@ def gerar_dados_grafico_categorias(usuario, ano, mes, contas_ids=None):
     Pode ser filtrado por uma lista de IDs de contas.
     """
     data_inicio_mes = date(ano, mes, 1)
-    data_fim_mes = data_inicio_mes + relativedelta(months=1) - relativedelta(days=1)
 
-    # Busca todas as despesas do período, agrupadas por categoria.
-    despesas_qs = Lancamento.objects.filter(
+    # Busca as despesas do período nos resumos mensais (montados a partir dos lançamentos se faltarem).
+    services.garantir_resumos_mensais(usuario.pk, [data_inicio_mes])
+    despesas_qs = ResumoMensal.objects.filter(
         usuario=usuario,
         tipo='D', # Apenas Débitos (despesas)
-        data_caixa__range=(data_inicio_mes, data_fim_mes)
-    ).exclude(
+        mes=data_inicio_mes
+    ).exclude(total_caixa=0).exclude(
         # Exclui o pagamento da fatura para não contar a despesa duas vezes.
         # As despesas reais já estão nos lançamentos individuais do cartão.
         categoria__nome="Pagamento de Fatura"
@@ -110,19 +296,32 @@ def gerar_dados_grafico_categorias(usuario, ano, mes, contas_ids=None):
         
         despesas_qs = despesas_qs.filter(filtro_contas | filtro_cartoes)
 
-    despesas_por_categoria = despesas_qs.values(
-        'categoria__nome' # Agrupa pelo nome da categoria
-    ).annotate(
-        total=Sum('valor') # Soma os valores para cada categoria
-    ).order_by(
-        '-total' # Ordena do maior para o menor gasto
+    despesas_por_categoria = {}
+    for item in despesas_qs.values('categoria__nome').annotate(total=Sum('total_caixa')).order_by():
+        nome = item['categoria__nome'] or 'Sem Categoria' # Agrupa pelo nome da categoria
+        despesas_por_categoria[nome] = despesas_por_categoria.get(nome, Decimal('0.0')) + item['total']
+
+    # Despesas das ocorrências recorrentes do mês ainda não gravadas, montadas a partir das regras.
+    data_fim_mes = data_inicio_mes + relativedelta(months=1, days=-1)
+    for ocorrencia in services.ocorrencias_virtuais(usuario.pk, data_fim_mes, contas_ids):
+        if ocorrencia.tipo != 'D' or ocorrencia.data_caixa is None or ocorrencia.data_caixa < data_inicio_mes:
+            continue
+        if ocorrencia.data_caixa > data_fim_mes or ocorrencia.categoria.nome == "Pagamento de Fatura":
+            continue
+        nome = ocorrencia.categoria.nome
+        despesas_por_categoria[nome] = despesas_por_categoria.get(nome, Decimal('0.0')) + ocorrencia.valor
+
+    # Ordena do maior para o menor gasto
+    despesas_por_categoria = sorted(
+        ({'categoria__nome': nome, 'total': total} for nome, total in despesas_por_categoria.items() if total),
+        key=lambda item: item['total'], reverse=True
     )
 
     if not despesas_por_categoria:
         return {}
 
     # Prepara os dados para a visão completa (todas as categorias)
-    labels_completos = [item['categoria__nome'] or 'Sem Categoria' for item in despesas_por_categoria]
+    labels_completos = [item['categoria__nome'] for item in despesas_por_categoria]
     data_completos = [float(item['total']) for item in despesas_por_categoria]
 
     # Lógica para "Top 5 + Outros"
@@ -134,7 +333,7 @@ def gerar_dados_grafico_categorias(usuario, ano, mes, contas_ids=None):
     outros_items = despesas_por_categoria[TOP_N:]
 
     for item in top_items:
-        labels_condensados.append(item['categoria__nome'] or 'Sem Categoria')
+        labels_condensados.append(item['categoria__nome'])
         data_condensados.append(float(item['total']))
 
     if outros_items:
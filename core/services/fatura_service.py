@@ -1,72 +1,110 @@
 # core/services/fatura_service.py
 from datetime import date
 import calendar
+from functools import lru_cache
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 
 from django.db import transaction
 from django.db.models import Sum
 
-from ..models import Lancamento, Fatura, CartaoCredito, Categoria
+from ..models import Lancamento, Fatura, CartaoCredito, categoria_sistema_pk, CATEGORIA_PAGAMENTO_FATURA
+from .recalculo_service import registrar_recalculos
+from .. import services
 
 
-def get_or_create_fatura_aberta(lancamento: Lancamento) -> Fatura:
+def _dia_no_mes(mes: date, dia: int) -> date:
+    """O dia informado no mês de `mes` ou, se ele não existir (ex: dia 31 em Fev), o último dia do mês."""
+    _, ultimo_dia_mes = calendar.monthrange(mes.year, mes.month)
+    return mes.replace(day=min(dia, ultimo_dia_mes))
+
+
+@lru_cache(maxsize=4096)
+def ciclo_fatura(dia_fechamento: int, dia_vencimento: int, ano_mes_referencia: date) -> tuple:
     """
-    Encontra a fatura aberta correta para um lançamento de cartão de crédito
-    ou cria uma nova se necessário.
+    Retorna (data_fechamento, data_vencimento) da fatura do mês de referência
+    para um cartão com esses dias de fechamento e vencimento.
+    O calendário depende só desses valores, então é calculado uma vez por processo.
     """
-    cartao = lancamento.cartao_credito
-    data_compra = lancamento.data_competencia
+    # O mês de referência é sempre o mês de vencimento
+    data_vencimento = _dia_no_mes(ano_mes_referencia, dia_vencimento)
+
+    mes_fechamento = ano_mes_referencia
+    if dia_fechamento > dia_vencimento:
+        # Se o dia de fechamento é maior que o de vencimento (ex: fecha dia 25, vence dia 5),
+        # o fechamento ocorre no mês anterior ao do vencimento.
+        mes_fechamento = ano_mes_referencia - relativedelta(months=1)
 
-    # 1. Determina o mês de vencimento da fatura
-    mes_vencimento = data_compra.month
-    ano_vencimento = data_compra.year
+    return _dia_no_mes(mes_fechamento, dia_fechamento), data_vencimento
 
+
+def referencia_fatura(cartao: CartaoCredito, data_compra: date) -> date:
+    """Primeiro dia do mês de referência da fatura em que entra uma compra feita em `data_compra`."""
+    referencia = data_compra.replace(day=1)
     if data_compra.day > cartao.dia_fechamento:
         # Se a compra foi feita após o fechamento, ela entra na fatura do mês seguinte.
-        data_vencimento_fatura = data_compra + relativedelta(months=1)
-        mes_vencimento = data_vencimento_fatura.month
-        ano_vencimento = data_vencimento_fatura.year
-
-    # 2. Define as datas da fatura de forma robusta
-    try:
-        data_vencimento = date(ano_vencimento, mes_vencimento, cartao.dia_vencimento)
-    except ValueError:
-        # Se o dia do vencimento não existe no mês (ex: dia 31 em Fev), usa o último dia.
-        _, ultimo_dia_mes = calendar.monthrange(ano_vencimento, mes_vencimento)
-        data_vencimento = date(ano_vencimento, mes_vencimento, ultimo_dia_mes)
-
-    # Calcula a data de fechamento
-    mes_fechamento, ano_fechamento = data_vencimento.month, data_vencimento.year
-    if cartao.dia_fechamento > cartao.dia_vencimento:
-        # Se o dia de fechamento é maior que o de vencimento (ex: fecha dia 25, vence dia 5),
-        # o fechamento ocorre no mês anterior ao do vencimento.
-        data_mes_anterior = data_vencimento - relativedelta(months=1)
-        mes_fechamento, ano_fechamento = data_mes_anterior.month, data_mes_anterior.year
-    
-    try:
-        data_fechamento = date(ano_fechamento, mes_fechamento, cartao.dia_fechamento)
-    except ValueError:
-        # Se o dia de fechamento não existe no mês, usa o último dia.
-        _, ultimo_dia_mes = calendar.monthrange(ano_fechamento, mes_fechamento)
-        data_fechamento = date(ano_fechamento, mes_fechamento, ultimo_dia_mes)
-    
-    # O mês de referência é sempre o mês de vencimento
-    ano_mes_referencia = date(ano_vencimento, mes_vencimento, 1)
+        referencia += relativedelta(months=1)
+    return referencia
+
+
+def _dados_nova_fatura(cartao: CartaoCredito, ano_mes_referencia: date) -> dict:
+    data_fechamento, data_vencimento = ciclo_fatura(cartao.dia_fechamento, cartao.dia_vencimento, ano_mes_referencia)
+    return {
+        'data_fechamento': data_fechamento,
+        'data_vencimento': data_vencimento,
+        'status': Fatura.StatusFatura.ABERTA,
+    }
+
+
+def get_or_create_fatura_aberta(lancamento: Lancamento) -> Fatura:
+    """
+    Encontra a fatura aberta correta para um lançamento de cartão de crédito
+    ou cria uma nova se necessário.
+    """
+    cartao = lancamento.cartao_credito
+    ano_mes_referencia = referencia_fatura(cartao, lancamento.data_competencia)
 
-    # 3. Tenta encontrar uma fatura existente ou cria uma nova
     fatura, created = Fatura.objects.get_or_create(
         cartao=cartao,
         usuario=lancamento.usuario,
         ano_mes_referencia=ano_mes_referencia,
-        defaults={
-            'data_fechamento': data_fechamento,
-            'data_vencimento': data_vencimento,
-            'status': Fatura.StatusFatura.ABERTA,
-        }
+        defaults=_dados_nova_fatura(cartao, ano_mes_referencia)
     )
     return fatura
 
+
+def mapear_faturas(cartao: CartaoCredito, datas_compra) -> dict:
+    """
+    Versão em lote de get_or_create_fatura_aberta: retorna {data_compra: Fatura}
+    para todas as datas, com uma consulta para as faturas existentes e um único
+    bulk_create para as que faltarem.
+    """
+    referencias = {data: referencia_fatura(cartao, data) for data in set(datas_compra)}
+    if not referencias:
+        return {}
+
+    faturas = {
+        fatura.ano_mes_referencia: fatura
+        for fatura in Fatura.objects.filter(cartao=cartao, ano_mes_referencia__in=set(referencias.values()))
+    }
+    faltantes = set(referencias.values()) - set(faturas)
+    if faltantes:
+        # ignore_conflicts: outra requisição pode ter criado a mesma fatura em paralelo.
+        # Sem as PKs devolvidas nesse modo, as faturas criadas são lidas em seguida.
+        Fatura.objects.bulk_create([
+            Fatura(cartao=cartao, usuario_id=cartao.usuario_id, ano_mes_referencia=referencia,
+                   **_dados_nova_fatura(cartao, referencia))
+            for referencia in sorted(faltantes)
+        ], ignore_conflicts=True)
+        faturas.update({
+            fatura.ano_mes_referencia: fatura
+            for fatura in Fatura.objects.filter(cartao=cartao, ano_mes_referencia__in=faltantes)
+        })
+        # O bulk_create não dispara o post_save que invalida o painel.
+        services.invalidar_dashboard_usuario(cartao.usuario_id)
+
+    return {data: faturas[referencia] for data, referencia in referencias.items()}
+
 def recalcular_valor_fatura(fatura: Fatura):
     """Recalcula o valor total de uma fatura com base em seus lançamentos."""
     if not fatura:
@@ -88,10 +126,7 @@ def fechar_fatura(fatura: Fatura, data_pagamento: date) -> Lancamento:
 
     # 1. Obter ou criar a categoria "Pagamento de Fatura"
     # Esta categoria será ignorada nos relatórios de despesas.
-    categoria_pagamento, _ = Categoria.objects.get_or_create(
-        nome="Pagamento de Fatura",
-        usuario__isnull=True
-    )
+    categoria_pagamento_id = categoria_sistema_pk(CATEGORIA_PAGAMENTO_FATURA)
 
     # 2. Criar o lançamento de débito agendado na conta de pagamento
     lancamento_debito = Lancamento.objects.create(
@@ -100,7 +135,7 @@ def fechar_fatura(fatura: Fatura, data_pagamento: date) -> Lancamento:
         descricao=f"Pagamento Fatura {fatura.cartao.nome_cartao} - Venc. {fatura.data_vencimento.strftime('%d/%m')}",
         valor=fatura.valor_total,
         tipo=Lancamento.TipoTransacao.DEBITO,
-        categoria=categoria_pagamento,
+        categoria_id=categoria_pagamento_id,
         data_competencia=data_pagamento, # Data em que a ação de fechar/pagar foi feita
         data_caixa=fatura.data_vencimento, # Data em que o dinheiro efetivamente sairá da conta
         conciliado=False # Pagamento agora nasce como não conciliado para ser verificado no extrato.
@@ -114,7 +149,11 @@ def fechar_fatura(fatura: Fatura, data_pagamento: date) -> Lancamento:
 
     # 4. Atualizar a data_caixa de todos os lançamentos da fatura
     # Isso garante que as despesas individuais impactem o fluxo de caixa no mês do pagamento.
+    # Os resumos mudam nos meses de onde as datas saem e no mês do vencimento.
+    datas = set(fatura.lancamentos.values_list('data_caixa', flat=True).distinct())
+    datas.add(fatura.data_vencimento)
     fatura.lancamentos.all().update(data_caixa=fatura.data_vencimento)
+    registrar_recalculos(meses=[(fatura.cartao.usuario_id, data) for data in datas])
 
     return lancamento_debito
 
@@ -0,0 +1,212 @@
+# core/services/import_service.py
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection
+from django.db.models import Q
+
+from ..models import Lancamento, Categoria, TarefaImportacao, LancamentoImportacao
+from .. import services
+
+TAMANHO_LOTE = 500
+CAMPOS_EDITAVEIS = ['descricao', 'valor', 'tipo', 'dataCompetencia', 'dataCaixa', 'categoriaId']
+
+
+def buscar_hashes_existentes(hashes):
+    """
+    Consulta, em lotes de IN sobre o índice único de import_hash, quais dos hashes
+    informados já estão gravados. O custo acompanha o tamanho do arquivo, não o
+    histórico da conta.
+    """
+    hashes = list(hashes)
+    existentes = set()
+    for inicio in range(0, len(hashes), TAMANHO_LOTE):
+        lote = hashes[inicio:inicio + TAMANHO_LOTE]
+        existentes.update(
+            Lancamento.objects.filter(import_hash__in=lote).values_list('import_hash', flat=True)
+        )
+    return existentes
+
+
+def _categorias_permitidas(usuario):
+    return set(Categoria.objects.filter(
+        Q(usuario=usuario) | Q(usuario__isnull=True)
+    ).values_list('id', flat=True))
+
+
+def _interpretar_dados_lancamento(data, categorias_permitidas, campos_obrigatorios=CAMPOS_EDITAVEIS):
+    """
+    Valida e converte os campos de um lançamento vindos da pré-conciliação.
+    Retorna uma tupla (campos, recorrencia, erro): `campos` tem os valores já convertidos
+    e `recorrencia` é (periodicidade, quantidade) ou None.
+    """
+    if not isinstance(data, dict) or not all(data.get(k) not in (None, '') for k in campos_obrigatorios):
+        return None, None, "dados incompletos."
+
+    try:
+        data_caixa_obj = datetime.fromisoformat(data['dataCaixa']).date()
+        data_competencia_obj = datetime.fromisoformat(data['dataCompetencia']).date()
+        valor = Decimal(data['valor'])
+        categoria_id = int(data['categoriaId'])
+    except (ValueError, TypeError, InvalidOperation):
+        return None, None, "data, valor ou categoria inválidos."
+
+    if data['tipo'] not in ('Crédito', 'Débito'):
+        return None, None, "tipo de lançamento inválido."
+    if categoria_id not in categorias_permitidas:
+        return None, None, "categoria não encontrada."
+
+    campos = {
+        'data_competencia': data_competencia_obj,
+        'data_caixa': data_caixa_obj,
+        'descricao': data['descricao'],
+        'valor': abs(valor),
+        'tipo': 'C' if data['tipo'] == 'Crédito' else 'D',
+        'categoria_id': categoria_id,
+    }
+
+    recorrencia = None
+    if data.get('repeticao') == 'RECORRENTE':
+        try:
+            quantidade = int(data.get('quantidadeRepeticoes'))
+        except (ValueError, TypeError):
+            quantidade = 0
+        periodicidade = data.get('periodicidade')
+        if quantidade > 1 and periodicidade:
+            recorrencia = (periodicidade, quantidade)
+
+    return campos, recorrencia, None
+
+
+# --- Pré-conciliação em tabela de staging ---
+
+def preparar_itens_importacao(tarefa, lancamentos_a_revisar):
+    """
+    Grava os lançamentos lidos do arquivo como LancamentoImportacao da tarefa,
+    para que a pré-conciliação os edite no banco em vez de trafegar o JSON inteiro.
+    """
+    itens = [
+        LancamentoImportacao(
+            tarefa=tarefa,
+            posicao=posicao,
+            # O OFX pode direcionar cada extrato para outra conta do usuário.
+            conta_bancaria_id=dados.get('conta_id') or tarefa.conta_bancaria_id,
+            descricao=dados['descricao'][:255],
+            valor=Decimal(dados['valor']),
+            tipo='C' if dados['tipo'] == 'Crédito' else 'D',
+            data_competencia=date.fromisoformat(dados['data_competencia']),
+            data_caixa=date.fromisoformat(dados['data_caixa']),
+            categoria_id=dados['categoria_id'],
+            numero_documento=dados.get('numero_documento') or None,
+            import_hash=dados['import_hash'],
+            ja_importado=dados.get('ja_importado', False),
+        )
+        for posicao, dados in enumerate(lancamentos_a_revisar)
+    ]
+    LancamentoImportacao.objects.bulk_create(itens, batch_size=TAMANHO_LOTE)
+    return len(itens)
+
+
+def atualizar_item_importacao(item, dados):
+    """
+    Aplica a edição feita na pré-conciliação a um único item em staging.
+    `dados` usa as mesmas chaves do dataset da linha na tela. Retorna a mensagem
+    de erro, ou None se o item foi salvo.
+    """
+    excluido = bool(dados.get('excluido')) if isinstance(dados, dict) else False
+    if excluido:
+        # Uma linha descartada não precisa ser válida; só registra a exclusão.
+        item.excluido = True
+        item.save(update_fields=['excluido'])
+        return None
+
+    campos, recorrencia, erro = _interpretar_dados_lancamento(
+        dados, _categorias_permitidas(item.tarefa.usuario_id)
+    )
+    if erro:
+        return erro
+
+    for campo, valor in campos.items():
+        setattr(item, campo, valor)
+    item.excluido = False
+    if recorrencia:
+        item.periodicidade, item.quantidade_repeticoes = recorrencia
+        item.recorrencia_id = item.recorrencia_id or uuid.uuid4()
+    else:
+        item.periodicidade = item.quantidade_repeticoes = item.recorrencia_id = None
+    item.save()
+    return None
+
+
+def promover_itens_importacao(tarefa):
+    """
+    Move para Lancamento, com um único INSERT ... SELECT, os itens da tarefa
+    aprovados na pré-conciliação.
+
+    Itens excluídos pelo usuário, já importados antes ou repetidos no próprio
+    arquivo são ignorados (NOT EXISTS + ON CONFLICT no import_hash). Os sinais
+    por linha não são disparados: as recorrências são geradas em seguida e o
+    saldo de cada conta afetada é recalculado uma única vez.
+
+    Retorna um dicionário com 'inseridos', 'ignorados' e 'erros'.
+    """
+    lancamento_tabela = connection.ops.quote_name(Lancamento._meta.db_table)
+    item_tabela = connection.ops.quote_name(LancamentoImportacao._meta.db_table)
+    sql = f"""
+        INSERT INTO {lancamento_tabela} (
+            usuario_id, conta_bancaria_id, descricao, valor, tipo, data_competencia, data_caixa,
+            categoria_id, numero_documento, import_hash, recorrencia_id, conciliado
+        )
+        SELECT
+            %s, i.conta_bancaria_id, i.descricao, i.valor, i.tipo, i.data_competencia, i.data_caixa,
+            i.categoria_id, i.numero_documento, i.import_hash, i.recorrencia_id,
+            CASE WHEN i.data_caixa <= %s THEN %s ELSE %s END
+        FROM {item_tabela} i
+        WHERE i.tarefa_id = %s AND i.excluido = %s AND i.ja_importado = %s
+          AND NOT EXISTS (SELECT 1 FROM {lancamento_tabela} l WHERE l.import_hash = i.import_hash)
+        ORDER BY i.posicao
+        ON CONFLICT DO NOTHING
+    """
+    # Regra de conciliação: Lançamentos importados só são conciliados se a data não for futura.
+    parametros = [tarefa.usuario_id, date.today(), True, False, tarefa.pk, False, False]
+
+    with services.adiar_recalculos():
+        # A troca condicional de status impede que a mesma tarefa seja confirmada duas vezes.
+        confirmada = TarefaImportacao.objects.filter(
+            pk=tarefa.pk, status=TarefaImportacao.StatusTarefa.CONCLUIDA
+        ).update(status=TarefaImportacao.StatusTarefa.IMPORTADA)
+        if not confirmada:
+            return {'inseridos': 0, 'ignorados': 0, 'erros': ["Esta importação já foi confirmada ou não está pronta."]}
+
+        aprovados = tarefa.itens.filter(excluido=False).count()
+        afetados = set(tarefa.itens.filter(excluido=False).values_list(
+            'conta_bancaria_id', 'data_caixa', 'data_competencia'
+        ))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+            inseridos = cursor.rowcount
+
+        recorrencias = {
+            item.recorrencia_id: (item.periodicidade, item.quantidade_repeticoes)
+            for item in tarefa.itens.filter(excluido=False, recorrencia_id__isnull=False)
+        }
+        total_inserido = inseridos
+        if recorrencias:
+            # Só existem as bases que o INSERT de fato gravou.
+            for base in Lancamento.objects.filter(recorrencia_id__in=recorrencias):
+                periodicidade, quantidade = recorrencias[base.recorrencia_id]
+                regra = services.criar_lancamentos_recorrentes(base, periodicidade, quantidade)
+                if regra:
+                    total_inserido += regra.ocorrencias_geradas - 1
+
+        tarefa.itens.all().delete()
+        tarefa.status = TarefaImportacao.StatusTarefa.IMPORTADA
+
+        if inseridos:
+            services.registrar_recalculos(
+                contas=[conta_id for conta_id, _, _ in afetados],
+                meses=[(tarefa.usuario_id, data) for _, *datas in afetados for data in datas],
+            )
+
+    return {'inseridos': total_inserido, 'ignorados': aprovados - inseridos, 'erros': []}
@@ -0,0 +1,123 @@
+# core/services/importacao_tarefa_service.py
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ..models import TarefaImportacao
+from .. import services
+
+logger = logging.getLogger(__name__)
+
+# O progresso é gravado a cada N itens para não transformar cada linha em um UPDATE.
+INTERVALO_PROGRESSO = 200
+
+
+def criar_tarefa_importacao(usuario, conta, tipo_arquivo, arquivo):
+    """
+    Guarda o arquivo enviado e enfileira sua importação.
+    O processamento em si acontece fora da requisição, no comando `processar_importacoes`.
+    """
+    tarefa = TarefaImportacao(
+        usuario=usuario,
+        conta_bancaria=conta,
+        tipo_arquivo=tipo_arquivo,
+        nome_arquivo=arquivo.name,
+    )
+    # O storage grava o upload em blocos, sem carregá-lo inteiro na memória.
+    tarefa.arquivo.save(arquivo.name, arquivo, save=False)
+    tarefa.save()
+    return tarefa
+
+
+def reservar_proxima_tarefa():
+    """
+    Reserva a tarefa pendente mais antiga para este worker.
+    A reserva é um UPDATE condicional ao status, então dois workers nunca
+    processam a mesma tarefa, em qualquer banco de dados.
+    """
+    while True:
+        tarefa_pk = TarefaImportacao.objects.filter(
+            status=TarefaImportacao.StatusTarefa.PENDENTE
+        ).order_by('criado_em').values_list('pk', flat=True).first()
+
+        if tarefa_pk is None:
+            return None
+
+        reservada = TarefaImportacao.objects.filter(
+            pk=tarefa_pk, status=TarefaImportacao.StatusTarefa.PENDENTE
+        ).update(status=TarefaImportacao.StatusTarefa.PROCESSANDO, iniciado_em=timezone.now())
+
+        if reservada:
+            return TarefaImportacao.objects.select_related('conta_bancaria').get(pk=tarefa_pk)
+        # Outro worker reservou primeiro; tenta a próxima.
+
+
+def liberar_tarefas_travadas(limite: timedelta):
+    """
+    Devolve para a fila as tarefas que estão 'processando' há mais tempo que o limite,
+    o que acontece quando um worker é encerrado no meio do trabalho.
+    """
+    return TarefaImportacao.objects.filter(
+        status=TarefaImportacao.StatusTarefa.PROCESSANDO,
+        iniciado_em__lt=timezone.now() - limite
+    ).update(status=TarefaImportacao.StatusTarefa.PENDENTE, iniciado_em=None, itens_processados=0)
+
+
+def executar_tarefa_importacao(tarefa: TarefaImportacao):
+    """
+    Processa o arquivo de uma tarefa já reservada e grava o resultado.
+    Erros no arquivo não derrubam o worker: a tarefa é marcada como ERRO.
+    """
+    def ao_progredir(itens_processados):
+        TarefaImportacao.objects.filter(pk=tarefa.pk).update(itens_processados=itens_processados)
+
+    conta = tarefa.conta_bancaria
+    try:
+        with tarefa.arquivo.open('rb') as arquivo:
+            if tarefa.tipo_arquivo == TarefaImportacao.TipoArquivo.CSV:
+                lancamentos_a_revisar, warnings, lancamentos_antigos = services.processar_arquivo_csv(
+                    csv_file=arquivo, conta_selecionada=conta, ao_progredir=ao_progredir
+                )
+            else:
+                lancamentos_a_revisar, warnings, lancamentos_antigos = services.processar_arquivo_ofx(
+                    ofx_file=arquivo, conta_selecionada=conta, ao_progredir=ao_progredir
+                )
+        # Os lançamentos para revisão vão para a tabela de staging, não para o JSON da tarefa.
+        services.preparar_itens_importacao(tarefa, lancamentos_a_revisar)
+    except Exception as e:
+        logger.exception("Falha ao processar a tarefa de importação %s", tarefa.pk)
+        tarefa.status = TarefaImportacao.StatusTarefa.ERRO
+        tarefa.mensagem_erro = f"Não foi possível processar o arquivo: {e}"
+    else:
+        tarefa.status = TarefaImportacao.StatusTarefa.CONCLUIDA
+        tarefa.itens_processados = len(lancamentos_a_revisar) + len(lancamentos_antigos)
+        tarefa.resultado = {
+            'warnings': warnings,
+            'lancamentos_antigos': [
+                {**item, 'valor': str(item['valor'])} for item in lancamentos_antigos
+            ],
+        }
+
+    tarefa.concluido_em = timezone.now()
+    # O arquivo original não é mais necessário depois de processado.
+    tarefa.arquivo.delete(save=False)
+    tarefa.save()
+    return tarefa
+
+
+def remover_tarefas_antigas(limite: timedelta):
+    """
+    Apaga as tarefas finalizadas há mais tempo que o limite, junto com seus
+    lançamentos em staging, para que pré-conciliações abandonadas não se acumulem.
+    """
+    tarefas = TarefaImportacao.objects.filter(
+        status__in=[
+            TarefaImportacao.StatusTarefa.CONCLUIDA,
+            TarefaImportacao.StatusTarefa.IMPORTADA,
+            TarefaImportacao.StatusTarefa.ERRO,
+        ],
+        concluido_em__lt=timezone.now() - limite
+    )
+    removidas, _ = tarefas.delete()
+    return removidas
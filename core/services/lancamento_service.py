@@ -1,62 +1,560 @@
 # core/services/lancamento_service.py
+from datetime import date
+from decimal import Decimal, InvalidOperation
 from dateutil.relativedelta import relativedelta
 import uuid
-from ..models import Lancamento
+from django.db import transaction
+from django.db.models import Q, F, Sum, Case, When, DecimalField
+from ..models import Lancamento, RegraRecorrencia, CartaoCredito, Fatura
 from .. import services
+from .recalculo_service import adiar_recalculos
 
-def criar_lancamentos_recorrentes(lancamento_base: Lancamento, periodicidade: str, quantidade: int):
+TAMANHO_LOTE = 500
+TAMANHO_PAGINA_EXTRATO = 50
+
+# Intervalo entre as repetições
+DELTAS_PERIODICIDADE = {
+    'DIARIA': relativedelta(days=1),
+    'SEMANAL': relativedelta(weeks=1),
+    'MENSAL': relativedelta(months=1),
+    'SEMESTRAL': relativedelta(months=6),
+    'ANUAL': relativedelta(years=1),
+}
+
+
+def _avancar(regra: RegraRecorrencia, data_competencia, data_caixa):
+    delta = DELTAS_PERIODICIDADE.get(regra.periodicidade, relativedelta(months=1))
+    return data_competencia + delta, (data_caixa + delta) if data_caixa else None # Garante que data_caixa é um objeto date
+
+
+def _encerrada(regra: RegraRecorrencia, ocorrencias: int, data_competencia) -> bool:
+    """Indica se a série já não tem ocorrência em `data_competencia`, depois de `ocorrencias` geradas."""
+    if regra.quantidade is not None and ocorrencias >= regra.quantidade:
+        return True
+    return regra.data_fim is not None and data_competencia > regra.data_fim
+
+
+def _gravar_ocorrencias(regra: RegraRecorrencia, datas):
     """
-    Cria lançamentos futuros com base em um lançamento original.
+    Grava as ocorrências informadas ((data_competencia, data_caixa)) com um único
+    bulk_create, sem disparar os sinais por linha: as faturas são resolvidas em lote
+    e contas, faturas e resumos afetados são marcados para recálculo.
+    """
+    # Se for um lançamento de cartão, precisamos associar a fatura correta.
+    faturas = {}
+    if regra.cartao_credito_id:
+        faturas = services.mapear_faturas(regra.cartao_credito, [competencia for competencia, _ in datas])
+
+    novos = [
+        Lancamento(
+            usuario_id=regra.usuario_id, descricao=regra.descricao,
+            valor=regra.valor, tipo=regra.tipo,
+            categoria_id=regra.categoria_id, conta_bancaria_id=regra.conta_bancaria_id,
+            cartao_credito_id=regra.cartao_credito_id, data_competencia=data_competencia,
+            data_caixa=data_caixa, conciliado=False,
+            recorrencia_id=regra.pk,
+            fatura=faturas.get(data_competencia)
+        )
+        for data_competencia, data_caixa in datas
+    ]
+    Lancamento.objects.bulk_create(novos, batch_size=TAMANHO_LOTE)
+
+    services.registrar_recalculos(
+        contas=[regra.conta_bancaria_id],
+        faturas={fatura.pk for fatura in faturas.values()},
+        meses=[(regra.usuario_id, data) for par in datas for data in par],
+    )
+
+
+def _ocorrencias_pendentes(regra: RegraRecorrencia, ate: date):
+    """
+    Gera (data_competencia, data_caixa) das ocorrências da regra ainda não gravadas, a
+    partir da próxima, enquanto alguma das duas datas não passar de `ate`.
+    """
+    competencia, caixa = regra.proxima_competencia, regra.proxima_caixa
+    geradas = regra.ocorrencias_geradas
+    while competencia is not None and min(competencia, caixa or competencia) <= ate:
+        yield competencia, caixa
+        geradas += 1
+        competencia, caixa = _avancar(regra, competencia, caixa)
+        if _encerrada(regra, geradas, competencia):
+            return
+
+
+def _materializar_regra(regra: RegraRecorrencia, ate: date) -> int:
+    """Grava as ocorrências pendentes da regra até `ate` e retorna quantas foram criadas."""
+    datas = list(_ocorrencias_pendentes(regra, ate))
+    if datas:
+        _gravar_ocorrencias(regra, datas)
+        regra.ocorrencias_geradas += len(datas)
+        competencia, caixa = _avancar(regra, *datas[-1])
+        if _encerrada(regra, regra.ocorrencias_geradas, competencia):
+            competencia = caixa = None
+        regra.proxima_competencia, regra.proxima_caixa = competencia, caixa
+        regra.save(update_fields=['ocorrencias_geradas', 'proxima_competencia', 'proxima_caixa'])
+    return len(datas)
+
+
+def criar_lancamentos_recorrentes(lancamento_base: Lancamento, periodicidade: str, quantidade: int = None, data_fim=None):
+    """
+    Transforma um lançamento já salvo na primeira ocorrência de uma série recorrente.
 
     :param lancamento_base: O objeto Lancamento original já salvo.
     :param periodicidade: A frequência da recorrência ('DIARIA', 'SEMANAL', 'MENSAL', 'SEMESTRAL', 'ANUAL').
-    :param quantidade: O número total de repetições (incluindo a base).
+    :param quantidade: O número total de repetições (incluindo a base); None para uma série sem término.
+    :param data_fim: Data de competência após a qual a série termina (opcional).
+
+    Cria a RegraRecorrencia da série e grava apenas as ocorrências que já chegaram
+    (uma série que começa no passado); as futuras são montadas em memória pelas
+    leituras (ver ocorrencias_virtuais) e gravadas quando chegam, são conciliadas ou
+    editadas. A categoria (regras) é avaliada uma vez para toda a série. Retorna a
+    regra, ou None se não há série.
     """
-    if not lancamento_base or not lancamento_base.pk or quantidade <= 1:
-        return
+    if not lancamento_base or not lancamento_base.pk:
+        return None
+    if quantidade is not None and quantidade <= 1:
+        return None
 
     # Garante que a série de recorrência tenha um ID
     if lancamento_base.recorrencia_id is None:
         lancamento_base.recorrencia_id = uuid.uuid4()
         lancamento_base.save(update_fields=['recorrencia_id'])
 
-    faturas_afetadas = set()
-    data_competencia_atual = lancamento_base.data_competencia
-    data_caixa_atual = lancamento_base.data_caixa
-
-    for i in range(quantidade - 1):
-        # Calcula a próxima data
-        delta_map = {
-            'DIARIA': relativedelta(days=1),
-            'SEMANAL': relativedelta(weeks=1),
-            'MENSAL': relativedelta(months=1),
-            'SEMESTRAL': relativedelta(months=6),
-            'ANUAL': relativedelta(years=1),
-        }
-        delta = delta_map.get(periodicidade, relativedelta(months=1))
-        
-        data_competencia_atual += delta
-        if data_caixa_atual: data_caixa_atual += delta # Garante que data_caixa_atual é um objeto date
-
-        novo_lancamento = Lancamento(
-            usuario=lancamento_base.usuario, descricao=lancamento_base.descricao,
-            valor=lancamento_base.valor, tipo=lancamento_base.tipo,
-            categoria=lancamento_base.categoria, conta_bancaria=lancamento_base.conta_bancaria,
-            cartao_credito=lancamento_base.cartao_credito, data_competencia=data_competencia_atual,
-            data_caixa=data_caixa_atual, conciliado=False,
-            recorrencia_id=lancamento_base.recorrencia_id
+    # As repetições têm a mesma descrição: as regras de categoria são avaliadas uma única vez,
+    # como o sinal pre_save faria para cada novo lançamento.
+    modelo = Lancamento(
+        usuario_id=lancamento_base.usuario_id, descricao=lancamento_base.descricao,
+        categoria_id=lancamento_base.categoria_id
+    )
+    services.aplicar_regras_para_lancamento(modelo)
+
+    regra = RegraRecorrencia(
+        id=lancamento_base.recorrencia_id, usuario_id=lancamento_base.usuario_id,
+        descricao=lancamento_base.descricao, valor=lancamento_base.valor, tipo=lancamento_base.tipo,
+        categoria_id=modelo.categoria_id, conta_bancaria_id=lancamento_base.conta_bancaria_id,
+        cartao_credito_id=lancamento_base.cartao_credito_id,
+        periodicidade=periodicidade if periodicidade in DELTAS_PERIODICIDADE else RegraRecorrencia.Periodicidade.MENSAL,
+        quantidade=quantidade, data_fim=data_fim,
+    )
+    proxima = _avancar(regra, lancamento_base.data_competencia, lancamento_base.data_caixa)
+    if not _encerrada(regra, 1, proxima[0]):
+        regra.proxima_competencia, regra.proxima_caixa = proxima
+
+    with adiar_recalculos():
+        regra.save(force_insert=True)
+        _materializar_regra(regra, date.today())
+    return regra
+
+
+def materializar_recorrencias(usuario_id=None, ate: date = None) -> int:
+    """
+    Grava como Lancamento as ocorrências das séries recorrentes (do usuário ou de
+    todos) que chegaram até `ate` (por padrão, hoje), para que passem a contar no saldo
+    das contas. Roda no comando diário `materializar_recorrencias`, nunca numa leitura.
+    Retorna quantas ocorrências foram criadas.
+    """
+    ate = ate or date.today()
+    vencidas = RegraRecorrencia.objects.filter(Q(proxima_competencia__lte=ate) | Q(proxima_caixa__lte=ate))
+    if usuario_id is not None:
+        vencidas = vencidas.filter(usuario_id=usuario_id)
+
+    criadas = 0
+    for usuario in vencidas.values_list('usuario_id', flat=True).distinct().order_by('usuario_id'):
+        with adiar_recalculos():
+            # O lock impede que a mesma ocorrência seja gravada também por uma conciliação em paralelo.
+            for regra in vencidas.filter(usuario_id=usuario).select_for_update(of=('self',)).select_related('cartao_credito'):
+                criadas += _materializar_regra(regra, ate)
+    return criadas
+
+
+def ocorrencias_virtuais(usuario_id, ate: date, contas_ids=None) -> list:
+    """
+    Ocorrências das séries recorrentes do usuário ainda não gravadas, da próxima de cada
+    série até `ate`, montadas em memória a partir das regras como Lancamento não salvos
+    (pk None). `contas_ids` limita às séries dessas contas e dos cartões pagos por elas.
+
+    Extrato, gráficos e relatórios juntam estas às linhas gravadas, cada um filtrando
+    pela data que usa; nada é gravado numa leitura.
+    """
+    regras = RegraRecorrencia.objects.filter(
+        usuario_id=usuario_id, proxima_competencia__isnull=False
+    ).select_related('categoria', 'cartao_credito')
+    if contas_ids is not None:
+        regras = regras.filter(Q(conta_bancaria_id__in=contas_ids) | Q(cartao_credito__conta_pagamento_id__in=contas_ids))
+
+    ocorrencias = []
+    for regra in regras:
+        for data_competencia, data_caixa in _ocorrencias_pendentes(regra, ate):
+            ocorrencia = Lancamento(
+                usuario_id=regra.usuario_id, descricao=regra.descricao, valor=regra.valor, tipo=regra.tipo,
+                categoria=regra.categoria, conta_bancaria_id=regra.conta_bancaria_id,
+                cartao_credito=regra.cartao_credito, data_competencia=data_competencia,
+                data_caixa=data_caixa, conciliado=False, recorrencia_id=regra.pk,
+            )
+            ocorrencia.valor_com_sinal = -regra.valor if regra.tipo == 'D' else regra.valor
+            ocorrencias.append(ocorrencia)
+    return ocorrencias
+
+
+def gravar_ocorrencia_recorrente(usuario_id, recorrencia_id, data_competencia: date):
+    """
+    Grava a ocorrência da série com a data de competência informada para que ela seja
+    conciliada ou editada, junto com as anteriores ainda não gravadas (a série continua
+    contígua: gravada até a regra, virtual dali em diante). Retorna o Lancamento,
+    ou None se a série não tem ocorrência nessa data.
+    """
+    with adiar_recalculos():
+        regra = RegraRecorrencia.objects.select_for_update(of=('self',)).select_related('cartao_credito').filter(
+            usuario_id=usuario_id, pk=recorrencia_id
+        ).first()
+        if regra is None:
+            return None
+        if regra.proxima_competencia is not None and regra.proxima_competencia <= data_competencia:
+            _materializar_regra(regra, data_competencia)
+    return Lancamento.objects.filter(
+        usuario_id=usuario_id, recorrencia_id=recorrencia_id, data_competencia=data_competencia
+    ).order_by('pk').first()
+
+
+def serie_tem_ocorrencias_futuras(lancamento: Lancamento) -> bool:
+    """
+    Verifica se a série do lançamento tem ocorrências futuras não conciliadas,
+    já gravadas ou ainda por gravar.
+    """
+    return Lancamento.objects.filter(
+        recorrencia_id=lancamento.recorrencia_id,
+        data_caixa__gt=lancamento.data_caixa,
+        conciliado=False
+    ).exists() or RegraRecorrencia.objects.filter(
+        pk=lancamento.recorrencia_id, proxima_competencia__isnull=False
+    ).exists()
+
+
+def atualizar_recorrencia(usuario_id, recorrencia_id, depois_de: date = None, **campos) -> int:
+    """
+    Altera o modelo da série (descrição, valor, categoria...). As ocorrências ainda não
+    gravadas nascem da regra, então isso muda uma única linha, qualquer que seja a
+    duração da série. Com `depois_de`, as ocorrências já gravadas e não conciliadas com
+    data de caixa posterior também são alteradas; como as futuras só são gravadas ao
+    serem conciliadas ou editadas, normalmente não há nenhuma.
+    Retorna quantos lançamentos gravados foram alterados.
+    """
+    RegraRecorrencia.objects.filter(usuario_id=usuario_id, pk=recorrencia_id).update(**campos)
+    # O update não dispara os signals, e as ocorrências virtuais alimentam os gráficos.
+    services.invalidar_dashboard_usuario(usuario_id)
+    if depois_de is None:
+        return 0
+
+    gravadas = Lancamento.objects.filter(
+        usuario_id=usuario_id, recorrencia_id=recorrencia_id, data_caixa__gt=depois_de, conciliado=False
+    )
+    afetados = list(gravadas.values_list('conta_bancaria_id', 'fatura_id', 'data_caixa', 'data_competencia'))
+    if not afetados:
+        return 0
+    alterados = gravadas.update(**campos)
+    # O update em massa não dispara os signals: marca o que ele alterou para recálculo.
+    conta_nova = campos.get('conta_bancaria')
+    services.registrar_recalculos(
+        contas=[conta_id for conta_id, *_ in afetados] + [conta_nova.pk if conta_nova else None],
+        faturas=[fatura_id for _, fatura_id, *_ in afetados],
+        meses=[(usuario_id, data) for *_, data_caixa, data_competencia in afetados for data in (data_caixa, data_competencia)],
+    )
+    return alterados
+
+
+def encerrar_recorrencias(usuario_id, recorrencia_ids):
+    """Encerra as séries informadas: nenhuma nova ocorrência será gravada ou projetada."""
+    RegraRecorrencia.objects.filter(usuario_id=usuario_id, pk__in=set(recorrencia_ids)).update(
+        proxima_competencia=None, proxima_caixa=None
+    )
+    services.invalidar_dashboard_usuario(usuario_id)
+
+
+def conciliar_lancamentos_em_lote(usuario, itens) -> dict:
+    """
+    Concilia de uma só vez os lançamentos do usuário informados em `itens`, um
+    dicionário {id: {'data_caixa': date, 'valor': Decimal}} em que data e valor
+    efetivos são opcionais (ausentes, o lançamento é conciliado como está).
+
+    Lançamentos já conciliados são ignorados, e os com data de caixa futura também,
+    pois ainda não podem ser conciliados. Sem ajustes basta um único UPDATE; os ajustados
+    são gravados com bulk_update e cada conta e fatura tocada é recalculada uma vez.
+    Retorna um dicionário com 'conciliados' e 'ignorados'.
+    """
+    hoje = date.today()
+    lancamentos = Lancamento.objects.filter(usuario=usuario, pk__in=list(itens), conciliado=False).only(
+        'pk', 'usuario_id', 'conta_bancaria_id', 'fatura_id', 'data_caixa', 'data_competencia', 'valor'
+    )
+
+    sem_ajuste, ajustados = [], []
+    meses = set()
+    for lancamento in lancamentos:
+        ajuste = itens[lancamento.pk] or {}
+        data_caixa = ajuste.get('data_caixa') or lancamento.data_caixa
+        if not data_caixa or data_caixa > hoje:
+            continue
+        valor = ajuste.get('valor')
+        if data_caixa == lancamento.data_caixa and (valor is None or valor == lancamento.valor):
+            sem_ajuste.append(lancamento.pk)
+            continue
+        meses.update((usuario.pk, data) for data in (lancamento.data_caixa, data_caixa, lancamento.data_competencia))
+        lancamento.data_caixa = data_caixa
+        if valor is not None:
+            lancamento.valor = valor
+        lancamento.conciliado = True
+        ajustados.append(lancamento)
+
+    with adiar_recalculos():
+        # A conciliação em si não altera saldos: sem ajustes, nada precisa ser recalculado.
+        conciliados = Lancamento.objects.filter(pk__in=sem_ajuste).update(conciliado=True)
+        if ajustados:
+            Lancamento.objects.bulk_update(ajustados, ['data_caixa', 'valor', 'conciliado'], batch_size=TAMANHO_LOTE)
+            conciliados += len(ajustados)
+            # O bulk_update não dispara os sinais: marca o que ele alterou para recálculo.
+            services.registrar_recalculos(
+                contas=[lancamento.conta_bancaria_id for lancamento in ajustados],
+                faturas=[lancamento.fatura_id for lancamento in ajustados],
+                meses=meses,
+            )
+
+    return {'conciliados': conciliados, 'ignorados': len(itens) - conciliados}
+
+
+def filtrar_extrato(lancamentos, ano=None, mes=None, tipo='', categoria='', q=''):
+    """
+    Aplica ao queryset os filtros do extrato: mês da data de caixa (sem ano e mês,
+    todos os meses), tipo, categoria e busca na descrição.
+    """
+    if ano and mes:
+        lancamentos = lancamentos.filter(data_caixa__year=ano, data_caixa__month=mes)
+    if tipo:
+        lancamentos = lancamentos.filter(tipo=tipo)
+    if categoria:
+        lancamentos = lancamentos.filter(categoria_id=categoria)
+    if q:
+        lancamentos = services.filtrar_por_descricao(lancamentos, q)
+    return lancamentos
+
+
+def _valor_com_sinal():
+    return Case(
+        When(tipo='D', then=-F('valor')), default=F('valor'),
+        output_field=DecimalField(max_digits=15, decimal_places=2)
+    )
+
+
+def saldo_final_extrato(lancamentos, saldo_abertura) -> Decimal:
+    """Saldo após o último lançamento do conjunto: o de abertura mais a soma (com sinal) de todos."""
+    total = lancamentos.order_by().aggregate(total=Sum(_valor_com_sinal()))['total']
+    return saldo_abertura + (total or Decimal('0.00'))
+
+
+def codificar_cursor_extrato(data_caixa: date, pk: int, saldo: Decimal) -> str:
+    return f'{data_caixa.isoformat()}_{pk}_{saldo}'
+
+
+def decodificar_cursor_extrato(cursor: str):
+    """Retorna (data_caixa, pk, saldo) do cursor; levanta ValueError se ele for inválido."""
+    try:
+        data_caixa, pk, saldo = cursor.split('_')
+        return date.fromisoformat(data_caixa), int(pk), Decimal(saldo)
+    except InvalidOperation as e:
+        raise ValueError(cursor) from e
+
+
+def _chave_extrato(lancamento):
+    # No mesmo dia, as ocorrências virtuais (sem pk) ficam acima das gravadas.
+    if lancamento.pk is None:
+        return (lancamento.data_caixa, 1, str(lancamento.recorrencia_id))
+    return (lancamento.data_caixa, 0, lancamento.pk)
+
+
+def pagina_extrato(lancamentos, saldo_topo=None, cursor=None, tamanho=TAMANHO_PAGINA_EXTRATO, virtuais=()):
+    """
+    Uma página do extrato, do lançamento mais recente para o mais antigo, paginada por
+    cursor sobre (data_caixa, id): cada página é um WHERE sobre a chave seguido de um
+    LIMIT, sem OFFSET, sem COUNT e sem somar o período inteiro, e custa o mesmo em
+    qualquer ponto do histórico.
+
+    O saldo de cada linha é obtido subtraindo, linha a linha, o valor do lançamento do
+    saldo da linha anterior. A primeira página parte de `saldo_topo` (o saldo após o
+    lançamento mais recente); as seguintes, do saldo levado no cursor.
+
+    `virtuais` são ocorrências recorrentes ainda não gravadas (ver ocorrencias_virtuais),
+    intercaladas em memória com as linhas do banco. Quando a página termina numa delas,
+    o cursor leva, no lugar do id, menos a quantidade de virtuais já exibidas naquele dia.
+
+    Retorna (lancamentos, proximo_cursor), com proximo_cursor None na última página.
+    Cada lançamento recebe `valor_com_sinal` e `saldo_final_linha`.
+    """
+    lancamentos = lancamentos.annotate(valor_com_sinal=_valor_com_sinal()).order_by('-data_caixa', '-id')
+    virtuais = sorted(virtuais, key=_chave_extrato, reverse=True)
+    saldo = saldo_topo
+    data_cursor, exibidas_no_dia = None, 0
+    if cursor:
+        data_cursor, pk, saldo = decodificar_cursor_extrato(cursor)
+        if pk < 0:
+            # A página anterior terminou numa virtual: as gravadas do dia ainda não foram exibidas.
+            exibidas_no_dia = -pk
+            lancamentos = lancamentos.filter(data_caixa__lte=data_cursor)
+            mesmo_dia = [o for o in virtuais if o.data_caixa == data_cursor][exibidas_no_dia:]
+        else:
+            lancamentos = lancamentos.filter(Q(data_caixa__lt=data_cursor) | Q(data_caixa=data_cursor, pk__lt=pk))
+            mesmo_dia = []
+        virtuais = mesmo_dia + [o for o in virtuais if o.data_caixa < data_cursor]
+
+    # Um lançamento a mais só para saber se existe uma próxima página.
+    pagina = list(lancamentos[:tamanho + 1])
+    if virtuais:
+        pagina = sorted(pagina + virtuais[:tamanho + 1], key=_chave_extrato, reverse=True)[:tamanho + 1]
+    tem_proxima = len(pagina) > tamanho
+    pagina = pagina[:tamanho]
+
+    for lancamento in pagina:
+        lancamento.saldo_final_linha = saldo
+        saldo -= lancamento.valor_com_sinal
+
+    proximo_cursor = None
+    if tem_proxima:
+        ultimo = pagina[-1]
+        pk = ultimo.pk
+        if pk is None:
+            if ultimo.data_caixa != data_cursor:
+                exibidas_no_dia = 0
+            pk = -(exibidas_no_dia + sum(1 for o in pagina if o.pk is None and o.data_caixa == ultimo.data_caixa))
+        proximo_cursor = codificar_cursor_extrato(ultimo.data_caixa, pk, saldo)
+    return pagina, proximo_cursor
+
+
+def ocorrencias_do_extrato(conta, ate: date, tipo='', categoria='', q='') -> list:
+    """
+    Ocorrências virtuais das séries da própria conta (não as de cartões pagos por ela)
+    até `ate`, a partir da data do saldo inicial, com os mesmos filtros de filtrar_extrato.
+    """
+    q = q.casefold()
+    return [
+        ocorrencia for ocorrencia in ocorrencias_virtuais(conta.usuario_id, ate, [conta.pk])
+        if ocorrencia.conta_bancaria_id == conta.pk and ocorrencia.data_caixa is not None
+        and conta.data_saldo_inicial <= ocorrencia.data_caixa <= ate
+        and (not tipo or ocorrencia.tipo == tipo)
+        and (not categoria or str(ocorrencia.categoria_id) == str(categoria))
+        and q in ocorrencia.descricao.casefold()
+    ]
+
+
+def editar_lancamentos_em_lote(usuario, lancamentos, alteracoes) -> dict:
+    """
+    Aplica as mesmas alterações a um conjunto de lançamentos do usuário com UPDATEs em lote.
+
+    `alteracoes` pode ter 'categoria', 'conta_bancaria', 'cartao_credito' (objetos
+    já validados como do usuário), 'data_competencia' e 'data_caixa'. Mover para uma
+    conta desvincula o cartão e a fatura; mover para um cartão ou mudar a data de
+    competência de lançamentos de cartão os redistribui entre as faturas, com a data
+    de caixa no vencimento de cada uma. Faturas que não estão abertas não recebem
+    lançamentos: nesse caso nada é gravado. Contas e faturas tocadas são recalculadas
+    uma única vez, após o commit.
+
+    Retorna um dicionário com 'atualizados' e 'erros'.
+    """
+    campos = {}
+    if 'categoria' in alteracoes:
+        campos['categoria'] = alteracoes['categoria']
+    if 'conta_bancaria' in alteracoes:
+        campos.update(conta_bancaria=alteracoes['conta_bancaria'], cartao_credito=None, fatura=None)
+    elif 'cartao_credito' in alteracoes:
+        campos.update(cartao_credito=alteracoes['cartao_credito'], conta_bancaria=None)
+    for campo in ('data_competencia', 'data_caixa'):
+        if campo in alteracoes:
+            campos[campo] = alteracoes[campo]
+    if not campos:
+        return {'atualizados': 0, 'erros': ['Nenhuma alteração informada.']}
+
+    with adiar_recalculos():
+        afetados = list(lancamentos.filter(usuario=usuario).values_list(
+            'pk', 'conta_bancaria_id', 'cartao_credito_id', 'fatura_id', 'data_competencia', 'data_caixa'
+        ))
+        if not afetados:
+            return {'atualizados': 0, 'erros': []}
+
+        # Lançamentos que ficarão em um cartão e precisam ter a fatura redistribuída.
+        novas_faturas = {}
+        if 'cartao_credito' in campos or 'data_competencia' in campos:
+            por_cartao = {}
+            for pk, _, cartao_id, _, data_competencia, _ in afetados:
+                cartao_id = campos['cartao_credito'].pk if 'cartao_credito' in campos else cartao_id
+                if cartao_id and 'conta_bancaria' not in campos:
+                    por_cartao.setdefault(cartao_id, []).append((pk, campos.get('data_competencia', data_competencia)))
+
+            cartoes = CartaoCredito.objects.in_bulk(list(por_cartao))
+            for cartao_id, itens in por_cartao.items():
+                faturas = services.mapear_faturas(cartoes[cartao_id], [data for _, data in itens])
+                novas_faturas.update({pk: faturas[data] for pk, data in itens})
+
+            fechadas = {f for f in novas_faturas.values() if f.status != Fatura.StatusFatura.ABERTA}
+            if fechadas:
+                transaction.set_rollback(True)
+                return {'atualizados': 0, 'erros': [
+                    f"A fatura com vencimento em {fatura.data_vencimento.strftime('%d/%m/%Y')} não está aberta."
+                    for fatura in sorted(fechadas, key=lambda f: f.data_vencimento)
+                ]}
+
+        ids = [pk for pk, *_ in afetados]
+        atualizados = Lancamento.objects.filter(pk__in=ids).update(**campos)
+        if novas_faturas:
+            # Lançamentos de cartão saem do caixa no vencimento da fatura.
+            Lancamento.objects.bulk_update([
+                Lancamento(pk=pk, fatura=fatura, data_caixa=fatura.data_vencimento)
+                for pk, fatura in novas_faturas.items()
+            ], ['fatura', 'data_caixa'], batch_size=TAMANHO_LOTE)
+
+        # Os UPDATEs em lote não disparam os sinais: marca o que foi alterado para recálculo.
+        conta_nova = campos.get('conta_bancaria')
+        datas = [data for *_, data_competencia, data_caixa in afetados for data in (data_competencia, data_caixa)]
+        datas += [campos.get('data_competencia'), campos.get('data_caixa')]
+        datas += [fatura.data_vencimento for fatura in novas_faturas.values()]
+        services.registrar_recalculos(
+            contas=[conta_id for _, conta_id, *_ in afetados] + [conta_nova.pk if conta_nova else None],
+            faturas=[fatura_id for _, _, _, fatura_id, *_ in afetados] + [f.pk for f in novas_faturas.values()],
+            meses=[(usuario.pk, data) for data in datas],
         )
-        
-        # Se for um lançamento de cartão, precisamos associar a fatura correta.
-        # Não podemos usar bulk_create aqui, pois ele não dispara os sinais pre_save.
-        if novo_lancamento.cartao_credito:
-            fatura = services.get_or_create_fatura_aberta(novo_lancamento)
-            novo_lancamento.fatura = fatura
-            faturas_afetadas.add(fatura)
-        
-        novo_lancamento.save()
-
-    # Após criar todos os lançamentos, recalcula o valor das faturas afetadas.
-    if faturas_afetadas:
-        for fatura in faturas_afetadas:
-            services.recalcular_valor_fatura(fatura)
\ No newline at end of file
+
+    return {'atualizados': atualizados, 'erros': []}
+
+
+def excluir_lancamentos_em_lote(usuario, ids, incluir_futuros=False) -> int:
+    """
+    Exclui os lançamentos do usuário informados e, com `incluir_futuros`, também as
+    ocorrências futuras não conciliadas das séries recorrentes a que pertencem (a partir
+    da ocorrência selecionada mais antiga de cada série), encerrando essas séries.
+
+    As irmãs de todas as séries são buscadas em uma única consulta e a exclusão roda
+    dentro de adiar_recalculos(): contas, faturas e meses afetados são recalculados
+    uma vez após o commit. Retorna quantos lançamentos foram excluídos.
+    """
+    with adiar_recalculos():
+        selecionados = list(Lancamento.objects.filter(usuario=usuario, pk__in=ids).values_list(
+            'pk', 'recorrencia_id', 'data_caixa'
+        ))
+        alvo = {pk for pk, _, _ in selecionados}
+
+        if incluir_futuros:
+            # Data de corte de cada série: a da ocorrência selecionada mais antiga.
+            cortes = {}
+            for _, recorrencia_id, data_caixa in selecionados:
+                if recorrencia_id and data_caixa:
+                    cortes[recorrencia_id] = min(data_caixa, cortes.get(recorrencia_id, data_caixa))
+            if cortes:
+                irmas = Lancamento.objects.filter(
+                    usuario=usuario, recorrencia_id__in=list(cortes), data_caixa__gt=min(cortes.values()), conciliado=False
+                ).values_list('pk', 'recorrencia_id', 'data_caixa')
+                alvo.update(pk for pk, recorrencia_id, data_caixa in irmas if data_caixa > cortes[recorrencia_id])
+                encerrar_recorrencias(usuario.pk, cortes)
+
+        if not alvo:
+            return 0
+
+        # O collector do Django cuida do SET_NULL de Fatura.lancamento_pagamento; dentro do
+        # bloco, os sinais de cada linha só anotam contas, faturas e meses para o recálculo.
+        _, excluidos_por_modelo = Lancamento.objects.filter(pk__in=alvo).delete()
+        excluidos = excluidos_por_modelo.get(Lancamento._meta.label, 0)
+    return excluidos
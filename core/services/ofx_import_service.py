@@ -1,93 +1,223 @@
 # core/services/ofx_import_service.py
-import io
-from datetime import datetime
+import html
+import re
+from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
-from ofxparse import OfxParser
 
-from ..models import Lancamento, get_default_other_category
+from ..models import ContaBancaria, Lancamento, get_default_other_category
 from ..utils import gerar_hash_lancamento
+from .csv_import_service import _textos_decodificados
 from .. import services
 
-def processar_arquivo_ofx(ofx_file, conta_selecionada):
+# De quantas em quantas transações o progresso é informado a quem chamou.
+INTERVALO_PROGRESSO = 200
+
+# Fuso horário ao final de uma data OFX, ex: [-3:BRT] ou [5.5:IST].
+_FUSO_OFX = re.compile(r'\[(?P<horas>[-+]?\d+\.?\d*):\w*\]$')
+
+# Uma tag OFX seguida do texto que vem antes da próxima tag. Declarações como
+# <?xml ...?>, <?OFX ...?> e comentários não casam e são ignorados.
+_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9_.]+)[^>]*>([^<]*)')
+
+# Agregados cujo conteúdo é entregue como um registro.
+_AGREGADOS = {
+    'BANKACCTFROM': 'conta',
+    'CCACCTFROM': 'cartao',
+    'STMTTRN': 'transacao',
+}
+
+
+def _tags_ofx(arquivo):
+    """
+    Gera tuplas (fechamento, nome, texto) para cada tag do arquivo, lendo-o em blocos.
+    Funciona tanto para o SGML do OFX 1.x (tags de valor sem fechamento) quanto
+    para o XML do OFX 2.x.
+    """
+    pendente = ''
+    for texto in _textos_decodificados(arquivo):
+        pendente += texto
+        # Só é seguro interpretar até o último '<': o texto da última tag pode continuar no próximo bloco.
+        ultimo = pendente.rfind('<')
+        if ultimo <= 0:
+            continue
+        completo, pendente = pendente[:ultimo], pendente[ultimo:]
+        yield from _TAG_OFX.findall(completo)
+
+    yield from _TAG_OFX.findall(pendente)
+
+
+def _registros_ofx(arquivo):
+    """
+    Agrupa as tags em registros, um por vez, sem montar a árvore do documento.
+    Gera ('conta', campos) para cada BANKACCTFROM, ('cartao', campos) para cada
+    CCACCTFROM e ('transacao', campos) para cada STMTTRN, onde `campos` mapeia o
+    nome da tag para o seu valor.
+    """
+    agregado = None
+    campos = None
+    for fechamento, nome, texto in _tags_ofx(arquivo):
+        nome = nome.upper()
+        if not fechamento:
+            if nome in _AGREGADOS:
+                agregado, campos = nome, {}
+            elif campos is not None:
+                valor = texto.strip()
+                if valor:
+                    # Em agregados aninhados (ex: PAYEE) vale o primeiro valor encontrado.
+                    campos.setdefault(nome, html.unescape(valor))
+        elif nome == agregado:
+            yield _AGREGADOS[agregado], campos
+            agregado = campos = None
+
+
+def _normalizar_numero_conta(numero):
+    """Compara números de conta (e códigos de banco) apenas pelos dígitos, ignorando zeros à esquerda."""
+    return re.sub(r'\D', '', numero or '').lstrip('0')
+
+
+def _contas_do_extrato(contas_por_numero, campos):
+    """
+    Retorna as contas do usuário que podem receber um extrato BANKACCTFROM: mesmo
+    número (ACCTID) e, se a conta tiver o código do banco cadastrado, mesmo BANKID.
+    Contas com o código do banco igual têm preferência sobre as sem código.
+    """
+    banco = _normalizar_numero_conta(campos.get('BANKID'))
+    candidatas = [
+        conta for conta in contas_por_numero.get(_normalizar_numero_conta(campos.get('ACCTID')), [])
+        if not conta.codigo_banco or _normalizar_numero_conta(conta.codigo_banco) == banco
+    ]
+    mesmo_banco = [conta for conta in candidatas if conta.codigo_banco]
+    return mesmo_banco or candidatas
+
+
+def _data_ofx(valor):
+    """
+    Converte uma data OFX (AAAAMMDD[HHMMSS[.XXX]][[offset:TZ]]) para date.
+    Segue a conversão do ofxparse, usado antes deste leitor: o fuso informado é
+    descontado (o dia é o do horário em UTC). Assim o import_hash de um arquivo já
+    importado continua o mesmo e a reimportação não gera duplicados.
+    """
+    valor = valor.strip()
+    fuso = _FUSO_OFX.search(valor)
+    deslocamento = timedelta(hours=float(fuso.group('horas')) if fuso else 0)
+    try:
+        data_local = datetime.strptime(valor[:14], '%Y%m%d%H%M%S')
+    except ValueError:
+        data_local = datetime.strptime(valor[:8], '%Y%m%d')
+    return (data_local - deslocamento).date()
+
+
+def processar_arquivo_ofx(ofx_file, conta_selecionada, ao_progredir=None):
     """
     Processa um arquivo OFX de extrato bancário.
+    As transações são lidas uma a uma, sem carregar o documento inteiro. Cada extrato
+    é direcionado à conta do usuário com o mesmo banco e número do BANKACCTFROM; se não
+    houver uma única conta assim, ou se for um extrato de cartão (CCACCTFROM), usa a
+    conta selecionada no formulário e avisa quando houver ambiguidade.
+    Se informado, `ao_progredir` recebe periodicamente o número de transações processadas.
     """
     lancamentos_a_revisar = []
     warnings = []
-    lancamentos_antigos = [] 
-    
-    try:
-        # ofxparse expects a file-like object
-        ofx = OfxParser.parse(ofx_file)
-    except Exception as e:
-        warnings.append(f"Erro ao parsear o arquivo OFX: {e}")
-        return [], warnings
-
-    # Assuming the OFX file contains bank statements
-    if not ofx.accounts:
-        warnings.append("Nenhuma conta bancária encontrada no arquivo OFX.")
-        return [], warnings
+    lancamentos_antigos = []
 
-    # For simplicity, let's assume we take the first bank account found in the OFX.
-    # In a real application, you might want to match it with `conta_selecionada`
-    # based on account number, bank ID, etc.
-    ofx_account = ofx.accounts[0]
+    contas_por_numero = {}
+    for conta in ContaBancaria.objects.filter(usuario_id=conta_selecionada.usuario_id):
+        contas_por_numero.setdefault(_normalizar_numero_conta(conta.numero_conta), []).append(conta)
+    # Compila as regras do usuário uma única vez para todas as linhas do arquivo
+    automato_regras = services.obter_automato_regras(conta_selecionada.usuario_id)
+    categoria_padrao = get_default_other_category()
 
-    # Get existing hashes for the selected account to detect duplicates
-    hashes_existentes = set(Lancamento.objects.filter(
-        conta_bancaria=conta_selecionada,
-        import_hash__isnull=False
-    ).values_list('import_hash', flat=True))
+    conta_atual = conta_selecionada
+    contas_encontradas = 0
+    processadas = 0
 
-    # Pega a data de saldo inicial da conta uma vez antes do loop
-    data_saldo_inicial_conta = conta_selecionada.data_saldo_inicial
+    for tipo_registro, campos in _registros_ofx(ofx_file):
+        if tipo_registro in ('conta', 'cartao'):
+            contas_encontradas += 1
+            numero = campos.get('ACCTID', '')
+            conta_atual = conta_selecionada
+            if tipo_registro == 'cartao':
+                # Cartões não são contas bancárias: o extrato fica na conta escolhida.
+                warnings.append(
+                    f"O extrato do cartão {numero} do arquivo foi importado em {conta_selecionada.nome_banco}, a conta selecionada."
+                )
+                continue
+
+            candidatas = _contas_do_extrato(contas_por_numero, campos)
+            if len(candidatas) == 1:
+                conta_atual = candidatas[0]
+            elif len(candidatas) > 1 and conta_selecionada not in candidatas:
+                warnings.append(
+                    f"A conta {numero} do arquivo corresponde a mais de uma conta cadastrada; "
+                    f"as transações foram importadas em {conta_selecionada.nome_banco}, a conta selecionada. "
+                    "Informe o código do banco nas contas para diferenciá-las."
+                )
+            if conta_atual != conta_selecionada:
+                warnings.append(
+                    f"As transações da conta {numero} do arquivo foram direcionadas para {conta_atual.nome_banco}."
+                )
+            continue
+
+        processadas += 1
+        if ao_progredir and processadas % INTERVALO_PROGRESSO == 0:
+            ao_progredir(processadas)
 
-    for transaction in ofx_account.statement.transactions:
         try:
-            data_caixa_obj = transaction.date
-            valor = Decimal(str(transaction.amount)) # Convert to string first to avoid float precision issues
-            
-            descricao = transaction.memo.strip() if transaction.memo else transaction.payee.strip() if transaction.payee else "Lançamento OFX"
-            
-            fitid = transaction.id
-            numero_documento = transaction.checknum if transaction.checknum else transaction.refnum if transaction.refnum else fitid
+            data_caixa_obj = _data_ofx(campos['DTPOSTED'])
+            # Alguns bancos exportam o valor com vírgula decimal.
+            valor = Decimal(campos['TRNAMT'].replace(',', '.'))
+
+            descricao = campos.get('MEMO') or campos.get('NAME') or "Lançamento OFX"
+
+            fitid = campos.get('FITID', '')
+            numero_documento = campos.get('CHECKNUM') or campos.get('REFNUM') or fitid
 
             tipo = 'Crédito' if valor >= 0 else 'Débito'
             data_competencia_obj = data_caixa_obj # For OFX, posted date is usually the competence date
 
             hash_gerado = gerar_hash_lancamento(
-                conta_id=conta_selecionada.id, data_caixa=data_caixa_obj.date(), # Ensure it's a date object
+                conta_id=conta_atual.id, data_caixa=data_caixa_obj,
                 numero_documento=numero_documento, valor=valor
             )
 
             # Cria uma instância temporária para aplicar as regras de categoria
             temp_lancamento = Lancamento(
-                usuario=conta_selecionada.usuario,
+                usuario_id=conta_selecionada.usuario_id,
                 descricao=descricao,
-                categoria=get_default_other_category()
+                categoria=categoria_padrao
             )
-            services.aplicar_regras_para_lancamento(temp_lancamento)
+            services.aplicar_regras_para_lancamento(temp_lancamento, automato_regras)
 
-            if data_caixa_obj.date() < data_saldo_inicial_conta:
+            if data_caixa_obj < conta_atual.data_saldo_inicial:
                 # Se for, adiciona à lista de 'antigos' e pula para a próxima linha.
                 lancamentos_antigos.append({
-                    'data_caixa': data_caixa_obj.date().strftime('%d/%m/%Y'),
+                    'data_caixa': data_caixa_obj.strftime('%d/%m/%Y'),
                     'descricao': descricao,
                     'valor': valor,
                 })
                 continue
 
             lancamentos_a_revisar.append({
-                'data_competencia': data_competencia_obj.date().isoformat(), 'data_caixa': data_caixa_obj.date().isoformat(),
+                'data_competencia': data_competencia_obj.isoformat(), 'data_caixa': data_caixa_obj.isoformat(),
                 'descricao': descricao, 'valor': f'{abs(valor):.2f}', 'tipo': tipo,
-                'import_hash': hash_gerado, 'ja_importado': hash_gerado in hashes_existentes,
+                'import_hash': hash_gerado,
                 'numero_documento': numero_documento,
+                'conta_id': conta_atual.id,
                 'categoria_id': temp_lancamento.categoria.id,
                 'categoria_nome': temp_lancamento.categoria.nome,
             })
 
-        except (InvalidOperation, ValueError, AttributeError) as e:
-            warnings.append(f"Erro ao processar transação (FITID: {getattr(transaction, 'id', 'N/A')}): {e}")
+        except (KeyError, InvalidOperation, ValueError) as e:
+            warnings.append(f"Erro ao processar transação (FITID: {campos.get('FITID', 'N/A')}): {e}")
             continue
 
-    return lancamentos_a_revisar, warnings, lancamentos_antigos
\ No newline at end of file
+    if not contas_encontradas and not processadas:
+        warnings.append("Nenhuma conta bancária encontrada no arquivo OFX.")
+        return [], warnings, []
+
+    # Só os hashes gerados a partir do arquivo são consultados no banco.
+    hashes_existentes = services.buscar_hashes_existentes(item['import_hash'] for item in lancamentos_a_revisar)
+    for item in lancamentos_a_revisar:
+        item['ja_importado'] = item['import_hash'] in hashes_existentes
+
+    return lancamentos_a_revisar, warnings, lancamentos_antigos
@@ -0,0 +1,91 @@
+# core/services/recalculo_service.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+
+from ..models import ContaBancaria, Fatura
+from .. import services
+
+# Recálculos acumulados pelo bloco adiar_recalculos() em execução no contexto atual
+# (thread ou tarefa assíncrona), ou None fora de um bloco.
+_recalculos_pendentes = ContextVar('recalculos_pendentes', default=None)
+
+
+class _RecalculosPendentes:
+    def __init__(self):
+        self.contas = set()
+        self.faturas = set()
+        self.usuarios = set()
+        # Pares (usuario_id, primeiro dia do mês) com resumos a remontar.
+        self.meses = set()
+
+    def executar(self):
+        """Recalcula uma única vez cada conta, fatura e resumo de usuário acumulado."""
+        for conta in ContaBancaria.objects.filter(pk__in=self.contas):
+            services.recalcular_saldo_conta(conta)
+        for fatura in Fatura.objects.filter(pk__in=self.faturas):
+            services.recalcular_valor_fatura(fatura)
+
+        meses_por_usuario = {}
+        for usuario_id, mes in self.meses:
+            if usuario_id not in self.usuarios:
+                meses_por_usuario.setdefault(usuario_id, set()).add(mes)
+        for usuario_id, meses in meses_por_usuario.items():
+            services.invalidar_resumos_mensais(usuario_id, meses=meses)
+        for usuario_id in self.usuarios:
+            services.invalidar_resumos_mensais(usuario_id)
+        for usuario_id in self.usuarios | meses_por_usuario.keys():
+            services.invalidar_dashboard_usuario(usuario_id)
+
+
+def recalculos_adiados() -> bool:
+    """Indica se o código em execução está dentro de um bloco adiar_recalculos()."""
+    return _recalculos_pendentes.get() is not None
+
+
+def registrar_recalculos(contas=(), faturas=(), usuarios=(), meses=()):
+    """
+    Marca contas e faturas (por ID) para recálculo completo, meses (pares
+    (usuario_id, data)) para terem os resumos remontados e usuários para terem todos
+    os resumos remontados; o cache do painel dos usuários envolvidos é descartado.
+    Dentro de adiar_recalculos() o trabalho é acumulado; fora dele é feito na hora.
+    """
+    pendentes = _recalculos_pendentes.get()
+    imediato = pendentes is None
+    if imediato:
+        pendentes = _RecalculosPendentes()
+
+    pendentes.contas.update(pk for pk in contas if pk)
+    pendentes.faturas.update(pk for pk in faturas if pk)
+    pendentes.usuarios.update(pk for pk in usuarios if pk)
+    pendentes.meses.update((pk, data.replace(day=1)) for pk, data in meses if pk and data)
+
+    if imediato:
+        pendentes.executar()
+
+
+@contextmanager
+def adiar_recalculos():
+    """
+    Context manager (ou decorator) para operações que alteram muitos lançamentos.
+    O bloco roda dentro de transaction.atomic(). Enquanto isso, os signals de
+    Lancamento apenas anotam as contas, faturas e meses afetados; ao final, cada um
+    é recalculado uma única vez, depois do commit. Se o bloco for desfeito (exceção
+    ou transaction.set_rollback()), nada é recalculado. Blocos aninhados são
+    absorvidos pelo mais externo.
+    """
+    if _recalculos_pendentes.get() is not None:
+        with transaction.atomic():
+            yield
+        return
+
+    pendentes = _RecalculosPendentes()
+    token = _recalculos_pendentes.set(pendentes)
+    try:
+        with transaction.atomic():
+            yield
+            # Registrado dentro do bloco atômico: um rollback descarta o callback.
+            transaction.on_commit(pendentes.executar)
+    finally:
+        _recalculos_pendentes.reset(token)
@@ -3,38 +3,50 @@ from datetime import date
 import calendar
 from decimal import Decimal
 from django.db.models import Sum, Q
-from django.db.models.functions import TruncMonth
-from ..models import Lancamento
+from ..models import ResumoMensal
+from .resumo_service import garantir_resumos_mensais
+from .lancamento_service import ocorrencias_virtuais
 
-def gerar_dados_fluxo_caixa(usuario, ano, contas_ids=None):
+def gerar_dados_fluxo_caixa(usuario, ano, contas_ids=None, regime='caixa'):
     """
     Gera os dados consolidados de fluxo de caixa para um determinado ano.
     Retorna um dicionário com dados para a tabela e para o gráfico.
-    Pode ser filtrado por uma lista de IDs de contas.
+    Pode ser filtrado por uma lista de IDs de contas. `regime` escolhe entre
+    o mês da data de caixa ('caixa') e o da data de competência ('competencia').
     """
-    # Filtra lançamentos do usuário para o ano especificado que tenham data de caixa
-    # e que estejam associados a uma conta bancária (exclui faturas de cartão não pagas)
-    lancamentos_ano = Lancamento.objects.filter(
+    # Lê os totais mensais já consolidados; meses ainda não montados são agregados dos lançamentos.
+    garantir_resumos_mensais(usuario.pk, [date(ano, mes_num, 1) for mes_num in range(1, 13)])
+    campo_total = 'total_competencia' if regime == 'competencia' else 'total_caixa'
+
+    # Considera apenas movimentos associados a uma conta bancária (exclui faturas de cartão não pagas)
+    resumos_ano = ResumoMensal.objects.filter(
         usuario=usuario,
-        data_caixa__year=ano,
+        mes__year=ano,
         conta_bancaria__isnull=False
-    )
+    ).exclude(**{campo_total: 0})
     if contas_ids is not None:
-        lancamentos_ano = lancamentos_ano.filter(conta_bancaria_id__in=contas_ids)
+        resumos_ano = resumos_ano.filter(conta_bancaria_id__in=contas_ids)
 
     # Agrupa por mês e calcula a soma de créditos e débitos
-    fluxo_por_mes_query = lancamentos_ano.annotate(
-        mes=TruncMonth('data_caixa')
-    ).values(
+    fluxo_por_mes_query = resumos_ano.values(
         'mes'
     ).annotate(
-        total_creditos=Sum('valor', filter=Q(tipo='C'), default=Decimal(0)),
-        total_debitos=Sum('valor', filter=Q(tipo='D'), default=Decimal(0))
+        total_creditos=Sum(campo_total, filter=Q(tipo='C'), default=Decimal(0)),
+        total_debitos=Sum(campo_total, filter=Q(tipo='D'), default=Decimal(0))
     ).order_by('mes')
 
     # Mapeia os resultados da query para um dicionário para fácil acesso
     fluxo_map = {item['mes'].month: item for item in fluxo_por_mes_query}
 
+    # Soma as ocorrências recorrentes do ano ainda não gravadas, montadas a partir das regras.
+    campo_data = 'data_competencia' if regime == 'competencia' else 'data_caixa'
+    for ocorrencia in ocorrencias_virtuais(usuario.pk, date(ano, 12, 31), contas_ids):
+        data = getattr(ocorrencia, campo_data)
+        if ocorrencia.conta_bancaria_id is None or data is None or data.year != ano:
+            continue
+        item = fluxo_map.setdefault(data.month, {'total_creditos': Decimal(0), 'total_debitos': Decimal(0)})
+        item['total_creditos' if ocorrencia.tipo == 'C' else 'total_debitos'] += ocorrencia.valor
+
     dados_tabela = []
     dados_grafico = {
         'labels': [],
@@ -0,0 +1,143 @@
+# core/services/resumo_service.py
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, F
+from django.db.models.functions import TruncMonth
+
+from ..models import Lancamento, ResumoMensal, CoberturaResumoMensal
+
+# Campos que identificam uma linha de ResumoMensal (além do mês).
+CAMPOS_CHAVE = ('usuario_id', 'conta_bancaria_id', 'cartao_credito_id', 'categoria_id', 'tipo')
+
+
+def _como_data(valor):
+    if isinstance(valor, str):
+        return date.fromisoformat(valor)
+    return valor
+
+
+def _parcelas_resumo(estado, sinal):
+    """
+    Converte o estado de um lançamento (ver Lancamento.CAMPOS_RESUMO) em parcelas
+    ((chave..., mes), variacao_caixa, variacao_competencia) a somar nos resumos.
+    """
+    if estado is None:
+        return []
+    usuario_id, conta_id, cartao_id, categoria_id, tipo, valor, data_caixa, data_competencia = estado
+    if not usuario_id or not categoria_id:
+        return []
+
+    chave = (usuario_id, conta_id, cartao_id, categoria_id, tipo)
+    valor = sinal * Decimal(str(valor))
+    zero = Decimal('0.00')
+    parcelas = []
+    data_caixa, data_competencia = _como_data(data_caixa), _como_data(data_competencia)
+    if data_caixa:
+        parcelas.append((chave + (data_caixa.replace(day=1),), valor, zero))
+    if data_competencia:
+        parcelas.append((chave + (data_competencia.replace(day=1),), zero, valor))
+    return parcelas
+
+
+def atualizar_resumos_mensais(estado_anterior, estado_novo):
+    """
+    Ajusta os ResumoMensal pela diferença entre o estado anterior e o novo de um
+    lançamento (None quando ele não existia ou deixou de existir). Meses ainda sem
+    cobertura são ignorados: serão montados a partir dos lançamentos quando lidos.
+    """
+    if estado_anterior == estado_novo:
+        return
+
+    variacoes = {}
+    for linha, caixa, competencia in _parcelas_resumo(estado_anterior, -1) + _parcelas_resumo(estado_novo, 1):
+        atual = variacoes.get(linha, (Decimal('0.00'), Decimal('0.00')))
+        variacoes[linha] = (atual[0] + caixa, atual[1] + competencia)
+    variacoes = {linha: valores for linha, valores in variacoes.items() if any(valores)}
+    if not variacoes:
+        return
+
+    cobertos = set(CoberturaResumoMensal.objects.filter(
+        usuario_id__in={linha[0] for linha in variacoes},
+        mes__in={linha[-1] for linha in variacoes},
+    ).values_list('usuario_id', 'mes'))
+
+    for linha, (caixa, competencia) in variacoes.items():
+        if (linha[0], linha[-1]) not in cobertos:
+            continue
+        filtros = dict(zip(CAMPOS_CHAVE + ('mes',), linha))
+        # O ajuste é feito por pk: linhas duplicadas por criação concorrente continuam somando certo.
+        pk = ResumoMensal.objects.filter(**filtros).values_list('pk', flat=True).first()
+        if pk is None:
+            ResumoMensal.objects.create(total_caixa=caixa, total_competencia=competencia, **filtros)
+        else:
+            ResumoMensal.objects.filter(pk=pk).update(
+                total_caixa=F('total_caixa') + caixa,
+                total_competencia=F('total_competencia') + competencia,
+            )
+
+
+def _agregar_por_mes(usuario_id, campo_data, inicio, fim):
+    """Soma os lançamentos do usuário por chave e mês de `campo_data`, no intervalo [inicio, fim)."""
+    return Lancamento.objects.filter(
+        usuario_id=usuario_id,
+        **{f'{campo_data}__gte': inicio, f'{campo_data}__lt': fim},
+    ).annotate(mes=TruncMonth(campo_data)).values(*CAMPOS_CHAVE, 'mes').annotate(total=Sum('valor')).order_by()
+
+
+def _proximo_mes(mes):
+    return date(mes.year + 1, 1, 1) if mes.month == 12 else date(mes.year, mes.month + 1, 1)
+
+
+@transaction.atomic
+def _montar_resumos(usuario_id, meses):
+    """Monta, a partir dos lançamentos, os resumos dos meses informados e marca a cobertura."""
+    inicio, fim = min(meses), _proximo_mes(max(meses))
+
+    totais = {}
+    for indice, campo_data in enumerate(('data_caixa', 'data_competencia')):
+        for item in _agregar_por_mes(usuario_id, campo_data, inicio, fim):
+            mes = item['mes']
+            if mes not in meses:
+                continue
+            linha = tuple(item[campo] for campo in CAMPOS_CHAVE) + (mes,)
+            totais.setdefault(linha, [Decimal('0.00'), Decimal('0.00')])[indice] += item['total']
+
+    ResumoMensal.objects.filter(usuario_id=usuario_id, mes__in=meses).delete()
+    ResumoMensal.objects.bulk_create([
+        ResumoMensal(total_caixa=caixa, total_competencia=competencia, **dict(zip(CAMPOS_CHAVE + ('mes',), linha)))
+        for linha, (caixa, competencia) in totais.items()
+    ])
+    # ignore_conflicts: outra requisição pode ter montado o mesmo mês em paralelo.
+    CoberturaResumoMensal.objects.bulk_create(
+        [CoberturaResumoMensal(usuario_id=usuario_id, mes=mes) for mes in meses], ignore_conflicts=True
+    )
+
+
+def garantir_resumos_mensais(usuario_id, meses):
+    """
+    Garante que os resumos do usuário estejam completos para os meses informados
+    (primeiros dias de mês), montando a partir dos lançamentos os que faltarem.
+    """
+    meses = set(meses)
+    cobertos = set(CoberturaResumoMensal.objects.filter(
+        usuario_id=usuario_id, mes__in=meses
+    ).values_list('mes', flat=True))
+    faltantes = meses - cobertos
+    if faltantes:
+        _montar_resumos(usuario_id, faltantes)
+
+
+def invalidar_resumos_mensais(usuario_id=None, meses=None):
+    """
+    Descarta a cobertura dos resumos (de um usuário ou de todos, opcionalmente só de
+    `meses`) após alterações em lote que não passam pelos signals; os meses são
+    remontados na próxima leitura.
+    """
+    coberturas = CoberturaResumoMensal.objects.all()
+    if usuario_id is not None:
+        coberturas = coberturas.filter(usuario_id=usuario_id)
+    if meses is not None:
+        coberturas = coberturas.filter(mes__in=[mes.replace(day=1) for mes in meses])
+    coberturas.delete()
@@ -1,42 +1,224 @@
 # core/services/rule_service.py
+import threading
+from collections import OrderedDict, deque
+
 from django.db import transaction
 from ..models import Lancamento, RegraCategoria
+from .cache_service import obter_versoes, incrementar_versao
+from .recalculo_service import registrar_recalculos
+from .busca_service import filtrar_por_descricao
+
+CACHE_NAMESPACE_REGRAS = 'regras'
+
+# Quantos automatos cada processo mantém compilados; os usados há mais tempo saem primeiro.
+MAX_AUTOMATOS_EM_MEMORIA = 256
+
+# Automatos já compilados neste processo, por usuário: {usuario_id: (versao, automato)},
+# do usado há mais tempo para o mais recente. A versão vem do cache do Django, de modo
+# que uma alteração feita por outro processo também invalida a cópia local na próxima consulta.
+_automatos_por_usuario = OrderedDict()
+_automatos_lock = threading.Lock()
+
 
-def aplicar_regras_para_lancamento(lancamento: Lancamento):
+class AutomatoRegras:
+    """
+    Automato de Aho-Corasick com todas as regras de um usuário.
+    Encontra, em uma única passada pela descrição, a regra de maior prioridade
+    (menor `ordem`) cujo texto aparece nela, sem diferenciar maiúsculas/minúsculas.
+    """
+
+    def __init__(self, regras):
+        # Cada nó guarda suas transições, o link de falha e a melhor prioridade
+        # (menor índice) entre os padrões que terminam nele ou em seus sufixos.
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._melhor = [None]
+        self._resultados = []
+
+        for prioridade, regra in enumerate(regras):
+            self._resultados.append((regra.pk, regra.categoria))
+            self._inserir(regra.texto_regra.lower(), prioridade)
+
+        self._construir_links_de_falha()
+
+    def __len__(self):
+        return len(self._resultados)
+
+    def _inserir(self, padrao, prioridade):
+        no = 0
+        for caractere in padrao:
+            proximo = self._transicoes[no].get(caractere)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes[no][caractere] = proximo
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._melhor.append(None)
+            no = proximo
+        # Textos iguais (ex: "Uber" e "UBER") ficam com a regra de maior prioridade.
+        if self._melhor[no] is None or prioridade < self._melhor[no]:
+            self._melhor[no] = prioridade
+
+    def _construir_links_de_falha(self):
+        fila = deque()
+        for filho in self._transicoes[0].values():
+            fila.append(filho)
+            self._melhor[filho] = self._menor(self._melhor[filho], self._melhor[0])
+
+        while fila:
+            no = fila.popleft()
+            for caractere, filho in self._transicoes[no].items():
+                fila.append(filho)
+                falha = self._falha[no]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[filho] = destino if destino != filho else 0
+                self._melhor[filho] = self._menor(self._melhor[filho], self._melhor[self._falha[filho]])
+
+    @staticmethod
+    def _menor(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a, b)
+
+    def encontrar(self, descricao):
+        """
+        Retorna a tupla (regra_id, categoria) da regra vencedora para a descrição,
+        ou None se nenhuma regra corresponder.
+        """
+        if not self._resultados or descricao is None:
+            return None
+
+        melhor = self._melhor[0]
+        if melhor == 0:
+            return self._resultados[0]
+
+        no = 0
+        transicoes, falha, melhores = self._transicoes, self._falha, self._melhor
+        for caractere in descricao.lower():
+            while no and caractere not in transicoes[no]:
+                no = falha[no]
+            no = transicoes[no].get(caractere, 0)
+            candidato = melhores[no]
+            if candidato is not None and (melhor is None or candidato < melhor):
+                melhor = candidato
+                if melhor == 0:
+                    # Nenhuma regra pode ter prioridade maior que a primeira.
+                    break
+
+        return self._resultados[melhor] if melhor is not None else None
+
+
+def obter_automato_regras(usuario) -> AutomatoRegras:
+    """
+    Retorna o automato compilado com as regras do usuário, reaproveitando a
+    versão em memória enquanto as regras não forem alteradas.
+    """
+    usuario_id = getattr(usuario, 'pk', usuario)
+    # As regras podem apontar para categorias do sistema, que são compartilhadas
+    # por todos os usuários; por isso a versão combina as duas chaves.
+    # Uma única leitura do cache traz as duas.
+    versao = obter_versoes(CACHE_NAMESPACE_REGRAS, [usuario_id, 'sistema'])
+
+    with _automatos_lock:
+        em_cache = _automatos_por_usuario.get(usuario_id)
+        if em_cache and em_cache[0] == versao:
+            _automatos_por_usuario.move_to_end(usuario_id)
+            return em_cache[1]
+
+    regras = RegraCategoria.objects.filter(
+        usuario_id=usuario_id
+    ).select_related('categoria').order_by('ordem', 'pk')
+    automato = AutomatoRegras(list(regras))
+    with _automatos_lock:
+        _automatos_por_usuario[usuario_id] = (versao, automato)
+        _automatos_por_usuario.move_to_end(usuario_id)
+        while len(_automatos_por_usuario) > MAX_AUTOMATOS_EM_MEMORIA:
+            _automatos_por_usuario.popitem(last=False)
+    return automato
+
+
+def invalidar_regras_usuario(usuario_id):
+    """
+    Descarta o automato compilado do usuário. Deve ser chamado sempre que suas
+    regras forem criadas, editadas, reordenadas ou excluídas.
+    """
+    def _invalidar():
+        incrementar_versao(CACHE_NAMESPACE_REGRAS, usuario_id)
+        with _automatos_lock:
+            _automatos_por_usuario.pop(usuario_id, None)
+
+    _invalidar()
+    if transaction.get_connection().in_atomic_block:
+        # Outro processo pode recompilar as regras antigas antes do commit;
+        # invalidamos de novo quando a alteração ficar visível para todos.
+        transaction.on_commit(_invalidar)
+
+
+def invalidar_regras_todos_usuarios():
+    """Usado quando uma categoria do sistema (compartilhada por todos) é alterada."""
+    def _invalidar():
+        incrementar_versao(CACHE_NAMESPACE_REGRAS, 'sistema')
+        with _automatos_lock:
+            _automatos_por_usuario.clear()
+
+    _invalidar()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(_invalidar)
+
+
+def aplicar_regras_para_lancamento(lancamento: Lancamento, automato: AutomatoRegras = None):
     """
     Aplica a primeira regra correspondente a um lançamento.
     A busca não diferencia maiúsculas/minúsculas.
     A verificação ocorre apenas se a categoria for a padrão "Outros".
+
+    Quem processa muitos lançamentos do mesmo usuário (ex: importadores)
+    pode obter o automato uma única vez e passá-lo aqui.
     """
-    if not lancamento.usuario:
+    if not lancamento.usuario_id:
         return
 
-    # Busca todas as regras do usuário, ordenadas por prioridade
-    regras = RegraCategoria.objects.filter(usuario=lancamento.usuario).order_by('ordem')
-    
-    descricao_lower = lancamento.descricao.lower()
+    if automato is None:
+        automato = obter_automato_regras(lancamento.usuario_id)
 
-    for regra in regras:
-        if regra.texto_regra.lower() in descricao_lower:
-            lancamento.categoria = regra.categoria
-            # Encontrou a primeira regra, aplicou e parou.
-            return
+    resultado = automato.encontrar(lancamento.descricao)
+    if resultado:
+        _, categoria = resultado
+        lancamento.categoria = categoria
 
 def aplicar_regra_em_massa(regra: RegraCategoria):
     """
     Aplica uma regra específica a todos os lançamentos existentes do usuário
     que correspondem ao texto da regra.
+    Respeita a prioridade das regras: lançamentos em que uma regra de menor
+    `ordem` também corresponde continuam com a categoria daquela regra.
     Retorna o número de lançamentos atualizados.
     """
-    lancamentos_para_atualizar = Lancamento.objects.filter(
-        usuario=regra.usuario,
-        descricao__icontains=regra.texto_regra
+    candidatos = filtrar_por_descricao(
+        Lancamento.objects.filter(usuario=regra.usuario), regra.texto_regra
     ).exclude(
         categoria=regra.categoria
-    )
-    
-    count = lancamentos_para_atualizar.count()
-    if count > 0:
-        lancamentos_para_atualizar.update(categoria=regra.categoria)
-    
-    return count
\ No newline at end of file
+    ).values_list('id', 'descricao', 'data_caixa', 'data_competencia')
+
+    automato = obter_automato_regras(regra.usuario_id)
+    ids_para_atualizar = []
+    meses = set()
+    for lancamento_id, descricao, data_caixa, data_competencia in candidatos.iterator():
+        resultado = automato.encontrar(descricao)
+        if resultado and resultado[0] == regra.pk:
+            ids_para_atualizar.append(lancamento_id)
+            meses.update([(regra.usuario_id, data_caixa), (regra.usuario_id, data_competencia)])
+
+    count = 0
+    with transaction.atomic():
+        for inicio in range(0, len(ids_para_atualizar), 500):
+            lote = ids_para_atualizar[inicio:inicio + 500]
+            count += Lancamento.objects.filter(pk__in=lote).update(categoria=regra.categoria)
+
+    if count:
+        registrar_recalculos(meses=meses)
+    return count
@@ -1,10 +1,14 @@
 from decimal import Decimal
 from django.db.models import Sum, Q
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save, post_migrate
 from django.core.exceptions import ValidationError
 from django.dispatch import receiver
-from .models import Lancamento, ContaBancaria, Fatura, get_default_other_category_pk
-from .services import recalcular_saldo_conta, aplicar_regras_para_lancamento, get_or_create_fatura_aberta, recalcular_valor_fatura
+from .models import Lancamento, ContaBancaria, CartaoCredito, Fatura, Categoria, RegraCategoria, RegraRecorrencia, get_default_other_category_pk, esquecer_categorias_sistema, invalidar_categorias_sistema
+from .services import (
+    recalcular_saldo_conta, aplicar_variacao_saldo, aplicar_regras_para_lancamento, get_or_create_fatura_aberta, recalcular_valor_fatura,
+    invalidar_regras_usuario, invalidar_regras_todos_usuarios, atualizar_resumos_mensais, invalidar_resumos_mensais,
+    recalculos_adiados, registrar_recalculos, invalidar_dashboard_usuario, invalidar_dashboard_todos_usuarios
+)
 
 @receiver(pre_save, sender=Lancamento)
 def categorizar_lancamento_automaticamente(sender, instance, **kwargs):
@@ -28,21 +32,59 @@ def categorizar_lancamento_automaticamente(sender, instance, **kwargs):
             instance.fatura = fatura
 
 @receiver([post_save, post_delete], sender=Lancamento)
-def atualizar_saldo_conta(sender, instance, **kwargs):
+def atualizar_saldo_conta(sender, instance, signal, created=False, **kwargs):
     """
     Este sinal é acionado sempre que um Lançamento é salvo ou deletado.
-    Ele recalcula e atualiza o campo 'saldo_calculado' da ContaBancaria associada.
+    Ele ajusta o campo 'saldo_calculado' da ContaBancaria associada e os
+    resumos mensais apenas pela diferença entre o estado anterior e o novo do lançamento.
+    Dentro de adiar_recalculos(), apenas anota o que deve ser recalculado ao final.
     """
-    
-    # Tenta obter a conta bancária do lançamento.
-    # Em uma exclusão em cascata, a conta pode não existir mais.
-    try:
-        conta = instance.conta_bancaria
-    except ContaBancaria.DoesNotExist:
-        conta = None
+    estado_original = getattr(instance, '_estado_saldo_original', None)
+    estado_atual = instance.estado_saldo()
+
+    if recalculos_adiados():
+        resumo_original = getattr(instance, '_estado_resumo_original', None)
+        resumo_atual = instance.estado_resumo()
+        estados = [resumo_atual] if created else [resumo_original, resumo_atual]
+        if None in estados:
+            # Sem o estado anterior não se sabe quais meses o lançamento ocupava: remonta todos.
+            registrar_recalculos(usuarios=[instance.usuario_id])
+        else:
+            registrar_recalculos(meses=[
+                (estado[0], data) for estado in estados for data in estado[-2:]
+            ])
+        registrar_recalculos(
+            contas=[estado_original[0] if estado_original else None, instance.conta_bancaria_id],
+            faturas=[instance.fatura_id],
+        )
+        instance._estado_saldo_original = estado_atual
+        instance._estado_resumo_original = resumo_atual
+        return
+
+    if signal is post_delete:
+        # O que saiu do banco foi o estado lido dele, mesmo que a instância tenha sido alterada depois.
+        aplicar_variacao_saldo(estado_original or estado_atual, None)
+    elif created or estado_original is not None:
+        aplicar_variacao_saldo(None if created else estado_original, estado_atual)
+        instance._estado_saldo_original = estado_atual
+    elif instance.conta_bancaria_id:
+        # Instância sem o estado anterior (ex: montada à mão com uma pk existente): recálculo completo.
+        conta = ContaBancaria.objects.filter(pk=instance.conta_bancaria_id).first()
+        if conta:
+            recalcular_saldo_conta(conta)
 
-    if conta:
-        recalcular_saldo_conta(conta)
+    # Os resumos mensais dos relatórios seguem a mesma lógica de variação.
+    resumo_original = getattr(instance, '_estado_resumo_original', None)
+    resumo_atual = instance.estado_resumo()
+    if signal is post_delete:
+        atualizar_resumos_mensais(resumo_original or resumo_atual, None)
+    elif created or resumo_original is not None:
+        atualizar_resumos_mensais(None if created else resumo_original, resumo_atual)
+        instance._estado_resumo_original = resumo_atual
+    else:
+        invalidar_resumos_mensais(instance.usuario_id)
+
+    invalidar_dashboard_usuario(instance.usuario_id)
     
     # Se o lançamento pertence a uma fatura, recalcula o total da fatura.
     # Precisamos ser defensivos aqui, pois a fatura pode ter sido deletada
@@ -55,11 +97,51 @@ def atualizar_saldo_conta(sender, instance, **kwargs):
         # A fatura foi deletada em cascata. Não há o que fazer.
         pass
 
+@receiver([post_save, post_delete], sender=RegraCategoria)
+def invalidar_cache_regras(sender, instance, **kwargs):
+    """
+    Qualquer criação, edição ou exclusão de regra descarta o automato
+    compilado do usuário, que será reconstruído na próxima categorização.
+    """
+    invalidar_regras_usuario(instance.usuario_id)
+
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_cache_regras_por_categoria(sender, instance, **kwargs):
+    """O automato e o cache do painel guardam as categorias, então renomeá-las também os invalida."""
+    if instance.usuario_id is None:
+        invalidar_regras_todos_usuarios()
+        invalidar_dashboard_todos_usuarios()
+        # Se era uma categoria de sistema memorizada (renomeada ou apagada), ela será resolvida
+        # de novo no próximo uso, em todos os processos.
+        invalidar_categorias_sistema()
+    else:
+        invalidar_regras_usuario(instance.usuario_id)
+        invalidar_dashboard_usuario(instance.usuario_id)
+
+@receiver([post_save, post_delete], sender=Fatura)
+@receiver([post_save, post_delete], sender=CartaoCredito)
+@receiver([post_save, post_delete], sender=RegraRecorrencia)
+@receiver(post_delete, sender=ContaBancaria)
+def invalidar_dashboard_por_alteracao(sender, instance, **kwargs):
+    """
+    Faturas (projeção de pagamento), cartões, contas e séries recorrentes (ocorrências
+    ainda não gravadas) alimentam os gráficos e o menu das páginas.
+    """
+    invalidar_dashboard_usuario(instance.usuario_id)
+
 @receiver(post_save, sender=ContaBancaria)
 def atualizar_saldo_conta_por_alteracao_conta(sender, instance, **kwargs):
     """
     Acionado sempre que uma ContaBancaria é salva.
     Isso lida com a mudança do saldo_inicial ou da data_saldo_inicial.
     """
-    # A lógica é simples: apenas chama nossa função de serviço centralizada.
-    recalcular_saldo_conta(instance)
\ No newline at end of file
+    # A lógica é simples: apenas marca a conta para o recálculo centralizado
+    # (feito na hora, ou uma única vez ao final de um bloco adiar_recalculos()).
+    registrar_recalculos(contas=[instance.pk])
+    invalidar_dashboard_usuario(instance.usuario_id)
+
+@receiver(post_migrate)
+def esquecer_categorias_sistema_apos_migracao(sender, **kwargs):
+    """Um migrate ou flush pode recriar as categorias de sistema: as PKs memorizadas deixam de valer."""
+    esquecer_categorias_sistema()
+
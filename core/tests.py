@@ -1,10 +1,34 @@
+import io
+import json
+import tempfile
+from types import SimpleNamespace
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.management import call_command
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth.models import User
-from .models import ContaBancaria, Lancamento, Categoria
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from .utils import gerar_hash_lancamento
+from .models import (
+    ContaBancaria, CartaoCredito, Fatura, Lancamento, Categoria, RegraCategoria, TarefaImportacao, SaldoMensal, ResumoMensal, CoberturaResumoMensal,
+    RegraRecorrencia, get_default_other_category, get_default_other_category_pk
+)
+from . import models, services
 from .services import recalcular_saldo_conta, gerar_dados_grafico_saldo, gerar_dados_grafico_categorias
+from .services import obter_automato_regras, aplicar_regra_em_massa
+from .services import processar_arquivo_csv, processar_arquivo_ofx
+from .views.lancamento_views import LancamentoListView
+from .forms import LancamentoForm
+from .checks import verificar_cache_compartilhado
 
 class ContaBancariaServiceTest(TestCase):
 
@@ -132,6 +156,903 @@ class ContaBancariaServiceTest(TestCase):
         # Saldo com novo saldo inicial = 2000 - 300 = 1700
         self.assertEqual(self.conta.saldo_calculado, Decimal('1700.00'))
 
+    def test_edicao_ajusta_saldo_pela_diferenca(self):
+        """
+        Editar um lançamento aplica apenas a variação, inclusive ao trocar de conta
+        ou mover a data de caixa para o futuro.
+        """
+        outra_conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Outro Banco', numero_conta='999',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        lancamento = Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao='Compra', valor=Decimal('100.00'),
+            tipo='D', data_competencia=date(2023, 2, 1), data_caixa=date(2023, 2, 1)
+        )
+        lancamento = Lancamento.objects.get(pk=lancamento.pk)
+
+        lancamento.conta_bancaria = outra_conta
+        lancamento.valor = Decimal('150.00')
+        lancamento.save()
+        self.conta.refresh_from_db()
+        outra_conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_calculado, Decimal('1000.00'))
+        self.assertEqual(outra_conta.saldo_calculado, Decimal('-150.00'))
+
+        lancamento.data_caixa = date.today() + timedelta(days=10)
+        lancamento.save()
+        outra_conta.refresh_from_db()
+        self.assertEqual(outra_conta.saldo_calculado, Decimal('0.00'))
+
+    def test_verificar_saldos_corrige_divergencia(self):
+        Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao='Crédito', valor=Decimal('50.00'),
+            tipo='C', data_competencia=date(2023, 2, 1), data_caixa=date(2023, 2, 1)
+        )
+        ContaBancaria.objects.filter(pk=self.conta.pk).update(saldo_calculado=Decimal('1.00'))
+        outro = User.objects.create_user(username='saldointacto')
+        CoberturaResumoMensal.objects.create(usuario=self.user, mes=date(2023, 2, 1))
+        CoberturaResumoMensal.objects.create(usuario=outro, mes=date(2023, 2, 1))
+
+        saida = io.StringIO()
+        call_command('verificar_saldos', '--corrigir', stdout=saida)
+
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_calculado, Decimal('1050.00'))
+        self.assertIn('1 conta(s) corrigida(s)', saida.getvalue())
+        # Só a cobertura do dono da conta corrigida é descartada.
+        self.assertEqual(list(CoberturaResumoMensal.objects.values_list('usuario_id', flat=True)), [outro.pk])
+
+class SaldoMensalServiceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='saldouser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Saldo', numero_conta='777',
+            saldo_inicial=Decimal('100.00'), data_saldo_inicial=date(2023, 1, 10)
+        )
+        for dia, valor, tipo in [(date(2023, 1, 5), '999.00', 'C'), (date(2023, 1, 15), '50.00', 'C'),
+                                 (date(2023, 2, 3), '30.00', 'D'), (date(2023, 3, 20), '20.00', 'C')]:
+            Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao='Movimento', valor=Decimal(valor),
+                tipo=tipo, data_competencia=dia, data_caixa=dia
+            )
+
+    def test_saldo_em_usa_checkpoints_mantidos_pelas_alteracoes(self):
+        """Lançamentos anteriores à data do saldo inicial não contam; o checkpoint acompanha as edições."""
+        self.assertEqual(services.saldo_em([self.conta.pk], date(2023, 3, 1)), {self.conta.pk: Decimal('120.00')})
+        self.assertEqual(services.saldo_em([self.conta.pk], date(2023, 3, 25)), {self.conta.pk: Decimal('140.00')})
+        self.assertTrue(SaldoMensal.objects.filter(conta_bancaria=self.conta, mes=date(2023, 3, 1)).exists())
+
+        lancamento = Lancamento.objects.get(data_caixa=date(2023, 2, 3))
+        lancamento.valor = Decimal('80.00')
+        lancamento.save()
+
+        checkpoint = SaldoMensal.objects.get(conta_bancaria=self.conta, mes=date(2023, 3, 1))
+        self.assertEqual(checkpoint.saldo_abertura, Decimal('70.00'))
+        self.assertEqual(services.saldo_em([self.conta.pk], date(2023, 4, 1)), {self.conta.pk: Decimal('90.00')})
+
+    def test_grafico_de_saldo_nao_faz_consultas_por_conta(self):
+        """A série diária soma todas as contas com o mesmo número de consultas, qualquer que seja a quantidade."""
+        def consultas_do_grafico():
+            gerar_dados_grafico_saldo(self.user, 2023, 3)  # cria os checkpoints do mês
+            with CaptureQueriesContext(connection) as consultas:
+                labels, dados = gerar_dados_grafico_saldo(self.user, 2023, 3)
+            return len(consultas), labels, dados
+
+        uma_conta, labels, dados = consultas_do_grafico()
+        self.assertEqual(len(labels), 31)
+        self.assertEqual((dados[0], dados[19], dados[-1]), (120.0, 140.0, 140.0))
+
+        for numero in ('778', '779'):
+            conta = ContaBancaria.objects.create(
+                usuario=self.user, nome_banco='Banco Extra', numero_conta=numero,
+                saldo_inicial=Decimal('10.00'), data_saldo_inicial=date(2023, 1, 1)
+            )
+            Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=conta, descricao='Extra', valor=Decimal('5.00'),
+                tipo='D', data_competencia=date(2023, 3, 2), data_caixa=date(2023, 3, 2)
+            )
+
+        tres_contas, _, dados = consultas_do_grafico()
+        self.assertEqual(tres_contas, uma_conta)
+        self.assertEqual((dados[0], dados[-1]), (140.0, 150.0))
+
+
+class ResumoMensalServiceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='resumouser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Resumo', numero_conta='888',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.categoria = Categoria.objects.create(nome='Mercado', usuario=self.user)
+        self.lancamento = Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, categoria=self.categoria, descricao='Compra',
+            valor=Decimal('40.00'), tipo='D', data_competencia=date(2023, 1, 28), data_caixa=date(2023, 2, 2)
+        )
+        Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, categoria=self.categoria, descricao='Estorno',
+            valor=Decimal('15.00'), tipo='C', data_competencia=date(2023, 2, 5), data_caixa=date(2023, 2, 5)
+        )
+
+    def _fluxo(self, regime='caixa'):
+        dados = services.gerar_dados_fluxo_caixa(self.user, 2023, regime=regime)['dados_tabela']
+        return {item['mes'].month: (item['total_creditos'], item['total_debitos']) for item in dados}
+
+    def test_relatorios_leem_resumos_por_regime(self):
+        """Cada regime agrupa pelo mês da sua data; a primeira leitura monta e cobre os meses do ano."""
+        self.assertEqual(self._fluxo(), {2: (Decimal('15.00'), Decimal('40.00'))})
+        self.assertEqual(self._fluxo('competencia'), {1: (Decimal('0'), Decimal('40.00')), 2: (Decimal('15.00'), Decimal('0'))})
+        self.assertEqual(CoberturaResumoMensal.objects.filter(usuario=self.user).count(), 12)
+
+        categorias = services.gerar_dados_grafico_categorias(self.user, 2023, 2)
+        self.assertEqual(categorias['completo']['labels'], ['Mercado'])
+        self.assertEqual(categorias['completo']['data'], [40.0])
+
+    def test_resumos_acompanham_alteracoes_e_exclusoes(self):
+        self._fluxo()
+        self.lancamento.valor = Decimal('60.00')
+        self.lancamento.data_caixa = date(2023, 3, 1)
+        self.lancamento.save()
+        self.assertEqual(self._fluxo(), {2: (Decimal('15.00'), Decimal('0')), 3: (Decimal('0'), Decimal('60.00'))})
+
+        self.lancamento.delete()
+        self.assertEqual(self._fluxo(), {2: (Decimal('15.00'), Decimal('0'))})
+        self.assertFalse(ResumoMensal.objects.filter(usuario=self.user).exclude(total_caixa=0, total_competencia=0).filter(tipo='D').exists())
+
+
+class DashboardCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cacheuser', password='password123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conta = ContaBancaria.objects.create(
+                usuario=self.user, nome_banco='Banco Cache', numero_conta='321',
+                saldo_inicial=Decimal('100.00'), data_saldo_inicial=date(2023, 1, 1)
+            )
+
+    def test_dados_do_painel_vem_do_cache_ate_uma_escrita(self):
+        dados = services.obter_dados_dashboard(self.user, 2023, 5, [self.conta.pk])
+        self.assertEqual(dados['chart_data'][-1], 100.0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(services.obter_dados_dashboard(self.user, 2023, 5, [str(self.conta.pk)]), dados)
+
+        # A versão do painel só muda no commit, uma vez por transação.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for dia in (10, 11):
+                Lancamento.objects.create(
+                    usuario=self.user, conta_bancaria=self.conta, descricao='Salário', valor=Decimal('25.00'),
+                    tipo='C', data_competencia=date(2023, 5, dia), data_caixa=date(2023, 5, dia)
+                )
+            self.assertEqual(services.obter_dados_dashboard(self.user, 2023, 5, [self.conta.pk]), dados)
+        self.assertEqual(len(callbacks), 1)
+        dados = services.obter_dados_dashboard(self.user, 2023, 5, [self.conta.pk])
+        self.assertEqual(dados['chart_data'][-1], 150.0)
+
+    def test_dashboard_data_responde_304_com_etag_valido(self):
+        self.client.force_login(self.user)
+        url = reverse('core:dashboard_data') + f'?ano=2023&mes=5&contas={self.conta.pk}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with patch('core.services.obter_dados_dashboard') as obter_dados:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        obter_dados.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.conta.nome_banco = 'Banco Renomeado'
+            self.conta.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class DashboardParaleloTest(TransactionTestCase):
+    """Fora de uma transação os gráficos são calculados em threads, cada uma com sua conexão."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='paralelouser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Paralelo', numero_conta='654',
+            saldo_inicial=Decimal('100.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao='Mercado', valor=Decimal('30.00'),
+            tipo='D', data_competencia=date(2023, 5, 10), data_caixa=date(2023, 5, 10)
+        )
+
+    def test_calculo_paralelo_igual_ao_sequencial(self):
+        esperado = services.obter_dados_dashboard(self.user, 2023, 5, [self.conta.pk])
+        # Checkpoints e resumos já existem; sem o cache, as threads só fazem leituras.
+        cache.clear()
+
+        with patch('core.services.dashboard_service.sync_to_async', wraps=services.dashboard_service.sync_to_async) as em_sequencia:
+            dados = async_to_sync(services.obter_dados_dashboard_async)(self.user, 2023, 5, [self.conta.pk])
+
+        self.assertEqual(dados, esperado)
+        self.assertEqual(dados['chart_data'][-1], 70.0)
+        # Só a chave e a checagem de transação passam pelo sync_to_async: os cálculos foram para o pool.
+        self.assertEqual(em_sequencia.call_count, 2)
+
+
+class CacheCompartilhadoCheckTest(TestCase):
+
+    def test_cache_local_e_um_erro_de_deploy(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([erro.id for erro in verificar_cache_compartilhado(None)], ['core.E001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}}):
+            self.assertEqual(verificar_cache_compartilhado(None), [])
+
+
+class ContextoFinanceiroTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='contextouser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Contexto', numero_conta='147',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.categoria = Categoria.objects.create(nome='Feira', usuario=self.user)
+        self.client.force_login(self.user)
+
+    def test_dados_de_referencia_carregados_uma_vez_por_requisicao(self):
+        """Menu, formulário do lançamento e formulário de regra compartilham as mesmas listas."""
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('core:lancamento_create_generic'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Feira')
+
+        for tabela in ('core_contabancaria', 'core_cartaocredito', 'core_categoria'):
+            # A busca pontual da categoria padrão "Outros" não é uma listagem de referência.
+            leituras = [q for q in consultas.captured_queries if f'FROM "{tabela}"' in q['sql'] and "'Outros'" not in q['sql']]
+            self.assertEqual(len(leituras), 1, tabela)
+
+    def test_campo_valida_com_os_objetos_carregados(self):
+        financeiro = SimpleNamespace(categorias=[self.categoria], contas=[self.conta], cartoes=[])
+        campo = LancamentoForm(user=self.user, financeiro=financeiro).fields['categoria']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(campo.clean(str(self.categoria.pk)), self.categoria)
+            with self.assertRaises(ValidationError):
+                campo.clean('0')
+
+
+class CategoriasSistemaTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sistemauser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Sistema', numero_conta='258',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+
+    def test_lancamento_nao_consulta_a_categoria_padrao_a_cada_gravacao(self):
+        outros_pk = get_default_other_category_pk()
+        with CaptureQueriesContext(connection) as consultas:
+            for descricao in ('Primeiro', 'Segundo'):
+                lancamento = Lancamento.objects.create(
+                    usuario=self.user, conta_bancaria=self.conta, descricao=descricao, valor=Decimal('5.00'),
+                    tipo='D', data_competencia=date(2023, 1, 5), data_caixa=date(2023, 1, 5)
+                )
+                self.assertEqual(lancamento.categoria_id, outros_pk)
+        self.assertFalse([q for q in consultas.captured_queries if 'FROM "core_categoria"' in q['sql']])
+
+    def test_categoria_de_sistema_apagada_e_resolvida_de_novo(self):
+        antiga_pk = get_default_other_category_pk()
+        Categoria.objects.filter(pk=antiga_pk).get().delete()
+
+        nova_pk = get_default_other_category_pk()
+        self.assertNotEqual(nova_pk, antiga_pk)
+        self.assertTrue(Categoria.objects.filter(pk=nova_pk, nome='Outros', usuario__isnull=True).exists())
+
+    def test_categoria_de_sistema_apagada_por_outro_processo(self):
+        """Outro processo ainda guarda a PK antiga, mas a versão compartilhada mudou no commit."""
+        antiga_pk = get_default_other_category_pk()
+        memorizadas_em_outro_processo = dict(models._categorias_sistema)
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.filter(pk=antiga_pk).get().delete()
+
+        with patch.dict(models._categorias_sistema, memorizadas_em_outro_processo):
+            nova_pk = get_default_other_category_pk()
+        self.assertNotEqual(nova_pk, antiga_pk)
+        self.assertTrue(Categoria.objects.filter(pk=nova_pk).exists())
+
+
+class CicloFaturaTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='faturauser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Fatura', numero_conta='369',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+
+    def _cartao(self, nome):
+        return CartaoCredito.objects.create(
+            usuario=self.user, nome_cartao=nome, limite=Decimal('1000.00'),
+            dia_fechamento=30, dia_vencimento=10, conta_pagamento=self.conta
+        )
+
+    def test_mapear_faturas_equivale_a_busca_individual(self):
+        datas = [date(2023, 1, 15), date(2023, 1, 31), date(2023, 2, 28), date(2024, 3, 5), date(2023, 12, 31)]
+        individual, em_lote = self._cartao('Individual'), self._cartao('Lote')
+
+        esperado = {}
+        for data in datas:
+            fatura = services.get_or_create_fatura_aberta(Lancamento(usuario=self.user, cartao_credito=individual, data_competencia=data))
+            esperado[data] = (fatura.ano_mes_referencia, fatura.data_fechamento, fatura.data_vencimento)
+
+        with CaptureQueriesContext(connection) as consultas:
+            faturas = services.mapear_faturas(em_lote, datas)
+        self.assertEqual(len([q for q in consultas.captured_queries if '"core_fatura"' in q['sql']]), 3)
+
+        self.assertEqual(
+            {data: (f.ano_mes_referencia, f.data_fechamento, f.data_vencimento) for data, f in faturas.items()}, esperado
+        )
+        # Fecha no dia 30 do mês anterior ao vencimento; em fevereiro, no último dia do mês.
+        self.assertEqual(esperado[date(2024, 3, 5)], (date(2024, 3, 1), date(2024, 2, 29), date(2024, 3, 10)))
+        # Uma segunda chamada só lê as faturas já existentes.
+        with self.assertNumQueries(1):
+            self.assertEqual(services.mapear_faturas(em_lote, datas), faturas)
+
+
+class LancamentosRecorrentesTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='recorrenteuser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Recorrente', numero_conta='741',
+            saldo_inicial=Decimal('1000.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.cartao = CartaoCredito.objects.create(
+            usuario=self.user, nome_cartao='Cartão Recorrente', limite=Decimal('5000.00'),
+            dia_fechamento=20, dia_vencimento=28, conta_pagamento=self.conta
+        )
+        self.moradia = Categoria.objects.create(nome='Moradia Teste', usuario=self.user)
+        RegraCategoria.objects.create(usuario=self.user, texto_regra='aluguel', categoria=self.moradia)
+
+    def test_serie_gravada_em_um_insert_e_recalculada_uma_vez(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            base = Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao='Aluguel', valor=Decimal('100.00'),
+                tipo='D', data_competencia=date(2023, 1, 31), data_caixa=date(2023, 1, 31)
+            )
+            with CaptureQueriesContext(connection) as consultas:
+                services.criar_lancamentos_recorrentes(base, 'MENSAL', 6)
+
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "core_lancamento"')]
+        self.assertEqual(len(inserts), 1)
+
+        serie = Lancamento.objects.filter(recorrencia_id=base.recorrencia_id).order_by('data_competencia')
+        self.assertEqual(serie.count(), 6)
+        self.assertEqual(set(serie.values_list('categoria_id', flat=True)), {self.moradia.pk})
+        self.assertEqual(serie[1].data_competencia, date(2023, 2, 28))
+
+        self.conta.refresh_from_db()
+        esperado = Decimal('1000.00') - sum(l.valor for l in serie if l.data_caixa <= date.today())
+        self.assertEqual(self.conta.saldo_calculado, esperado)
+
+    def test_serie_de_cartao_associa_e_totaliza_faturas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            base = Lancamento.objects.create(
+                usuario=self.user, cartao_credito=self.cartao, descricao='Streaming', valor=Decimal('30.00'),
+                tipo='D', data_competencia=date(2023, 3, 10)
+            )
+            services.criar_lancamentos_recorrentes(base, 'MENSAL', 4)
+
+        serie = Lancamento.objects.filter(recorrencia_id=base.recorrencia_id)
+        self.assertFalse(serie.filter(fatura__isnull=True).exists())
+        faturas = {l.fatura for l in serie.select_related('fatura')}
+        self.assertEqual(sorted(f.ano_mes_referencia for f in faturas), [date(2023, m, 1) for m in (3, 4, 5, 6)])
+        for fatura in faturas:
+            fatura.refresh_from_db()
+            self.assertEqual(fatura.valor_total, Decimal('30.00'))
+
+
+    def test_ocorrencias_futuras_so_existem_na_regra_e_aparecem_nas_leituras(self):
+        hoje = date.today()
+        inicio = hoje.replace(day=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            base = Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao='Academia', valor=Decimal('80.00'),
+                tipo='D', data_competencia=inicio, data_caixa=inicio
+            )
+            regra = services.criar_lancamentos_recorrentes(base, 'MENSAL', None)
+
+        # Só a base foi gravada; as seguintes vêm da regra.
+        serie = Lancamento.objects.filter(recorrencia_id=base.recorrencia_id)
+        self.assertEqual(serie.count(), 1)
+        self.assertEqual(regra.proxima_competencia, inicio + relativedelta(months=1))
+
+        # Ler um mês distante mostra a ocorrência, com o saldo projetado, sem gravar nada.
+        distante = inicio + relativedelta(years=15)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('core:lancamento_list', kwargs={
+                'conta_pk': self.conta.pk, 'ano': distante.year, 'mes': distante.month
+            }))
+            dados = services.obter_dados_dashboard(self.user, distante.year, distante.month, [self.conta.pk])
+            fluxo = services.gerar_dados_fluxo_caixa(self.user, distante.year, contas_ids=[self.conta.pk])
+        escritas = [q['sql'] for q in consultas.captured_queries
+                    if q['sql'].startswith(('INSERT INTO "core_lancamento"', 'UPDATE "core_regrarecorrencia"'))]
+        self.assertEqual(escritas, [])
+        self.assertEqual(serie.count(), 1)
+
+        self.assertContains(response, 'Academia')
+        self.assertContains(response, 'Prevista')
+        meses = 15 * 12 + 1
+        self.assertEqual(response.context['saldo_inicial_periodo'], Decimal('1000.00') - Decimal('80.00') * (meses - 1))
+        self.assertEqual(response.context['lancamentos'][0].saldo_final_linha, Decimal('1000.00') - Decimal('80.00') * meses)
+        self.assertEqual(dados['chart_data'][-1], float(Decimal('1000.00') - Decimal('80.00') * meses))
+        self.assertEqual(dados['despesas']['completo'], {'labels': [regra.categoria.nome], 'data': [80.0]})
+        self.assertEqual(fluxo['dados_grafico']['data_debitos'], [80.0] * 12)
+
+    def test_conciliar_ou_editar_grava_a_ocorrencia(self):
+        hoje = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            base = Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao='Aluguel', valor=Decimal('900.00'),
+                tipo='D', data_competencia=hoje, data_caixa=hoje
+            )
+            regra = services.criar_lancamentos_recorrentes(base, 'MENSAL', None)
+
+        terceira = hoje + relativedelta(months=2)
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('core:ocorrencia_recorrente_gravar', kwargs={'recorrencia_id': regra.pk}),
+                {'data_competencia': terceira.isoformat(), 'acao': 'editar'}
+            )
+        gravada = Lancamento.objects.get(recorrencia_id=regra.pk, data_competencia=terceira)
+        self.assertRedirects(response, reverse('core:lancamento_update', kwargs={'pk': gravada.pk}), fetch_redirect_response=False)
+        # A série continua contígua: a ocorrência anterior também foi gravada, e a regra segue dali.
+        self.assertEqual(Lancamento.objects.filter(recorrencia_id=regra.pk).count(), 3)
+        regra.refresh_from_db()
+        self.assertEqual(regra.proxima_competencia, hoje + relativedelta(months=3))
+
+        # Gravar de novo a mesma ocorrência só a devolve.
+        self.assertEqual(services.gravar_ocorrencia_recorrente(self.user.pk, regra.pk, terceira), gravada)
+        self.assertEqual(Lancamento.objects.filter(recorrencia_id=regra.pk).count(), 3)
+
+        # Editar a série toda altera a regra e só as ocorrências gravadas depois da editada.
+        with self.captureOnCommitCallbacks(execute=True):
+            alterados = services.atualizar_recorrencia(self.user.pk, regra.pk, depois_de=hoje, valor=Decimal('950.00'))
+        self.assertEqual(alterados, 2)
+        regra.refresh_from_db()
+        self.assertEqual(regra.valor, Decimal('950.00'))
+        self.assertEqual(services.ocorrencias_virtuais(self.user.pk, hoje + relativedelta(months=3))[0].valor, Decimal('950.00'))
+
+    def test_comando_grava_so_as_ocorrencias_que_chegaram(self):
+        hoje = date.today()
+        inicio = hoje - relativedelta(days=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            base = Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao='Padaria', valor=Decimal('10.00'),
+                tipo='D', data_competencia=inicio, data_caixa=inicio
+            )
+            regra = services.criar_lancamentos_recorrentes(base, 'DIARIA', None)
+        # A série começou no passado: as ocorrências até hoje foram gravadas na criação.
+        self.assertEqual(Lancamento.objects.filter(recorrencia_id=regra.pk).count(), 4)
+
+        saida = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('materializar_recorrencias', '--ate', (hoje + timedelta(days=2)).isoformat(), stdout=saida)
+        self.assertIn('2 ocorrência(s)', saida.getvalue())
+        self.assertEqual(Lancamento.objects.filter(recorrencia_id=regra.pk).count(), 6)
+        self.assertEqual(services.materializar_recorrencias(self.user.pk, hoje + timedelta(days=2)), 0)
+
+    def test_pagina_do_extrato_intercala_ocorrencias_virtuais(self):
+        dia = date(2023, 3, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            gravados = [
+                Lancamento.objects.create(
+                    usuario=self.user, conta_bancaria=self.conta, descricao=f'G{n}', valor=Decimal('1.00'),
+                    tipo='D', data_competencia=data, data_caixa=data
+                ) for n, data in enumerate([dia - timedelta(days=1), dia, dia])
+            ]
+        virtuais = [
+            Lancamento(
+                usuario=self.user, conta_bancaria=self.conta, descricao=f'V{n}', valor=Decimal('10.00'), tipo='D',
+                data_competencia=data, data_caixa=data, recorrencia_id=f'00000000-0000-0000-0000-00000000000{n}'
+            ) for n, data in enumerate([dia, dia, dia + timedelta(days=1)])
+        ]
+        for ocorrencia in virtuais:
+            ocorrencia.valor_com_sinal = -ocorrencia.valor
+
+        linhas, cursor = [], None
+        saldo = Decimal('0.00')
+        while True:
+            pagina, cursor = services.pagina_extrato(
+                Lancamento.objects.filter(conta_bancaria=self.conta), saldo, cursor, tamanho=2, virtuais=virtuais
+            )
+            linhas += pagina
+            if cursor is None:
+                break
+        self.assertEqual([l.descricao for l in linhas], ['V2', 'V1', 'V0', 'G2', 'G1', 'G0'])
+        # O saldo de cada linha volta, do topo para trás, o valor das linhas acima dela.
+        self.assertEqual(linhas[-1].saldo_final_linha, Decimal('32.00'))
+        self.assertEqual([l.pk for l in linhas[3:]], [g.pk for g in reversed(gravados)])
+
+    def test_editar_e_excluir_a_serie_altera_a_regra(self):
+        hoje = date.today()
+        with self.captureOnCommitCallbacks(execute=True):
+            base = Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao='Escola', valor=Decimal('500.00'),
+                tipo='D', data_competencia=hoje, data_caixa=hoje
+            )
+            services.criar_lancamentos_recorrentes(base, 'MENSAL', None)
+
+        services.atualizar_recorrencia(self.user.pk, base.recorrencia_id, valor=Decimal('550.00'))
+        regra = RegraRecorrencia.objects.get(pk=base.recorrencia_id)
+        self.assertEqual(regra.valor, Decimal('550.00'))
+
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('core:lancamento_delete', kwargs={'pk': base.pk}), {'delete_option': 'all'})
+        self.assertFalse(Lancamento.objects.filter(recorrencia_id=base.recorrencia_id).exists())
+        regra.refresh_from_db()
+        self.assertIsNone(regra.proxima_competencia)
+        self.assertEqual(services.materializar_recorrencias(self.user.pk, hoje + relativedelta(years=5)), 0)
+
+
+class ConciliacaoEmMassaTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='conciliauser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Concilia', numero_conta='852',
+            saldo_inicial=Decimal('500.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.lancamentos = [
+            Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao=descricao, valor=Decimal('50.00'),
+                tipo='D', data_competencia=data, data_caixa=data
+            )
+            for descricao, data in [
+                ('Luz', date(2023, 3, 10)), ('Água', date(2023, 3, 12)), ('Futuro', date.today() + timedelta(days=10))
+            ]
+        ]
+        self.client.force_login(self.user)
+
+    def test_concilia_em_lote_com_ajustes_e_um_recalculo(self):
+        luz, agua, futuro = self.lancamentos
+        payload = {'itens': [
+            {'id': luz.pk},
+            {'id': agua.pk, 'data_caixa': '2023-03-15', 'valor': '62.30'},
+            {'id': futuro.pk},
+        ]}
+        with patch('core.services.recalcular_saldo_conta', wraps=services.recalcular_saldo_conta) as recalcular:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('core:lancamento_bulk_conciliar'), json.dumps(payload), content_type='application/json'
+                )
+        self.assertEqual(response.json(), {'status': 'success', 'conciliados': 2, 'ignorados': 1})
+        recalcular.assert_called_once()
+
+        agua.refresh_from_db()
+        self.assertEqual((agua.conciliado, agua.data_caixa, agua.valor), (True, date(2023, 3, 15), Decimal('62.30')))
+        self.assertTrue(Lancamento.objects.get(pk=luz.pk).conciliado)
+        self.assertFalse(Lancamento.objects.get(pk=futuro.pk).conciliado)
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_calculado, Decimal('387.70'))
+
+    def test_payload_invalido(self):
+        response = self.client.post(
+            reverse('core:lancamento_bulk_conciliar'), json.dumps({'itens': [{'id': 1, 'valor': 'abc'}]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class EdicaoEmMassaTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='edicaouser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Edição', numero_conta='963',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.cartao = CartaoCredito.objects.create(
+            usuario=self.user, nome_cartao='Cartão Edição', limite=Decimal('1000.00'),
+            dia_fechamento=20, dia_vencimento=28, conta_pagamento=self.conta
+        )
+        self.lazer = Categoria.objects.create(nome='Lazer Teste', usuario=self.user)
+        self.client.force_login(self.user)
+
+    def _editar(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('core:lancamento_bulk_editar'), json.dumps(payload), content_type='application/json')
+
+    def test_filtro_do_extrato_recebe_a_categoria_em_um_update(self):
+        for descricao, data in [('Cinema', date(2023, 4, 5)), ('Teatro', date(2023, 4, 9)), ('Show', date(2023, 5, 2))]:
+            Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao=descricao, valor=Decimal('40.00'),
+                tipo='D', data_competencia=data, data_caixa=data
+            )
+        with CaptureQueriesContext(connection) as consultas:
+            response = self._editar({
+                'filtro': {'conta': self.conta.pk, 'ano': 2023, 'mes': 4},
+                'alteracoes': {'categoria': self.lazer.pk},
+            })
+        self.assertEqual(response.json(), {'status': 'success', 'atualizados': 2})
+        self.assertEqual(len([q for q in consultas.captured_queries if q['sql'].startswith('UPDATE "core_lancamento"')]), 1)
+        self.assertEqual(
+            set(Lancamento.objects.filter(categoria=self.lazer).values_list('descricao', flat=True)), {'Cinema', 'Teatro'}
+        )
+
+        outra = Categoria.objects.create(nome='Alheia', usuario=User.objects.create_user(username='alheio'))
+        response = self._editar({'ids': [1], 'alteracoes': {'categoria': outra.pk}})
+        self.assertEqual(response.status_code, 400)
+
+    def test_nova_data_redistribui_as_faturas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            compras = [
+                Lancamento.objects.create(
+                    usuario=self.user, cartao_credito=self.cartao, descricao=descricao, valor=Decimal('25.00'),
+                    tipo='D', data_competencia=date(2023, 6, 10)
+                )
+                for descricao in ('Livro', 'Disco')
+            ]
+        fatura_junho = compras[0].fatura
+
+        response = self._editar({'ids': [c.pk for c in compras], 'alteracoes': {'data_competencia': '2023-06-25'}})
+        self.assertEqual(response.json()['atualizados'], 2)
+
+        livro = Lancamento.objects.select_related('fatura').get(pk=compras[0].pk)
+        self.assertEqual(livro.fatura.ano_mes_referencia, date(2023, 7, 1))
+        self.assertEqual(livro.data_caixa, livro.fatura.data_vencimento)
+        livro.fatura.refresh_from_db()
+        fatura_junho.refresh_from_db()
+        self.assertEqual((livro.fatura.valor_total, fatura_junho.valor_total), (Decimal('50.00'), Decimal('0.00')))
+
+        livro.fatura.status = Fatura.StatusFatura.FECHADA
+        livro.fatura.save()
+        response = self._editar({'ids': [compras[0].pk], 'alteracoes': {'data_competencia': '2023-07-01'}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Lancamento.objects.get(pk=compras[0].pk).data_competencia, date(2023, 6, 25))
+
+
+class ExclusaoEmMassaTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exclusaouser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Exclusão', numero_conta='852',
+            saldo_inicial=Decimal('500.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.client.force_login(self.user)
+
+    def _serie(self, descricao, valor):
+        with self.captureOnCommitCallbacks(execute=True):
+            base = Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao=descricao, valor=Decimal(valor),
+                tipo='D', data_competencia=date(2023, 1, 10), data_caixa=date(2023, 1, 10)
+            )
+            services.criar_lancamentos_recorrentes(base, 'MENSAL', 4)
+        return list(Lancamento.objects.filter(recorrencia_id=base.recorrencia_id).order_by('data_caixa'))
+
+    def test_exclui_futuros_das_series_e_recalcula_a_conta_uma_vez(self):
+        aluguel, academia = self._serie('Aluguel', '100.00'), self._serie('Academia', '10.00')
+        with patch('core.services.recalcular_saldo_conta', wraps=services.recalcular_saldo_conta) as recalcular:
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as consultas:
+                    response = self.client.post(
+                        reverse('core:lancamento_bulk_delete'),
+                        json.dumps({'ids': [aluguel[1].pk, aluguel[2].pk, academia[2].pk], 'delete_option': 'all'}),
+                        content_type='application/json'
+                    )
+        self.assertEqual(response.json(), {'status': 'success', 'deleted_count': 5})
+        self.assertEqual(recalcular.call_count, 1)
+        self.assertEqual(len([q for q in consultas.captured_queries if q['sql'].startswith('DELETE FROM "core_lancamento"')]), 1)
+        self.assertEqual(
+            list(Lancamento.objects.filter(conta_bancaria=self.conta).values_list('pk', flat=True).order_by('pk')),
+            sorted([aluguel[0].pk, academia[0].pk, academia[1].pk])
+        )
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_calculado, Decimal('380.00'))
+
+    def test_desvincula_o_pagamento_da_fatura_excluido(self):
+        cartao = CartaoCredito.objects.create(
+            usuario=self.user, nome_cartao='Cartão Exclusão', limite=Decimal('1000.00'),
+            dia_fechamento=20, dia_vencimento=28, conta_pagamento=self.conta
+        )
+        pagamento = Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao='Pagamento fatura', valor=Decimal('50.00'),
+            tipo='D', data_competencia=date(2023, 2, 28), data_caixa=date(2023, 2, 28)
+        )
+        fatura = Fatura.objects.create(
+            cartao=cartao, usuario=self.user, ano_mes_referencia=date(2023, 2, 1), data_fechamento=date(2023, 2, 20),
+            data_vencimento=date(2023, 2, 28), status=Fatura.StatusFatura.PAGA, lancamento_pagamento=pagamento
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(services.excluir_lancamentos_em_lote(self.user, [pagamento.pk]), 1)
+        fatura.refresh_from_db()
+        self.assertIsNone(fatura.lancamento_pagamento)
+
+
+class ExtratoPorCursorTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cursoruser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Cursor', numero_conta='741',
+            saldo_inicial=Decimal('1000.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for dia, tipo, valor in [(3, 'C', '200.00'), (5, 'D', '50.00'), (5, 'D', '30.00'), (12, 'D', '70.00'), (20, 'C', '10.00')]:
+                for mes in (1, 2):
+                    Lancamento.objects.create(
+                        usuario=self.user, conta_bancaria=self.conta, descricao=f'L{mes}-{dia}', valor=Decimal(valor),
+                        tipo=tipo, data_competencia=date(2023, mes, dia), data_caixa=date(2023, mes, dia)
+                    )
+        self.client.force_login(self.user)
+
+    def _paginas(self, url):
+        linhas, paginas, cursor = [], 0, None
+        while True:
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            self.assertFalse([q for q in consultas.captured_queries if 'COUNT(' in q['sql'] or 'OVER' in q['sql']])
+            linhas += [(l.descricao, l.saldo_final_linha) for l in response.context['lancamentos']]
+            paginas += 1
+            cursor = response.context['proximo_cursor']
+            if not cursor:
+                return linhas, paginas, response
+
+    def test_mes_paginado_por_cursor_mantem_o_saldo_de_cada_linha(self):
+        with patch.object(LancamentoListView, 'tamanho_pagina', 2):
+            linhas, paginas, ultima = self._paginas(reverse('core:lancamento_list', kwargs={
+                'conta_pk': self.conta.pk, 'ano': 2023, 'mes': 2
+            }))
+        self.assertEqual(paginas, 3)
+        # Fevereiro abre com 1060,00 (janeiro: +200 -50 -30 -70 +10).
+        self.assertEqual([saldo for _, saldo in linhas], [
+            Decimal('1120.00'), Decimal('1110.00'), Decimal('1180.00'), Decimal('1210.00'), Decimal('1260.00')
+        ])
+        self.assertEqual(ultima.context['saldo_inicial_periodo'], Decimal('1060.00'))
+
+        response = self.client.get(reverse('core:lancamento_list_atual', kwargs={'conta_pk': self.conta.pk}), {'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_historico_percorre_todos_os_meses(self):
+        with patch.object(LancamentoListView, 'tamanho_pagina', 3):
+            linhas, paginas, ultima = self._paginas(reverse('core:lancamento_historico', kwargs={'conta_pk': self.conta.pk}))
+        self.assertEqual(paginas, 4)
+        self.assertEqual(len(linhas), 10)
+        self.assertEqual(linhas[0], ('L2-20', Decimal('1120.00')))
+        self.assertEqual(linhas[-1], ('L1-3', Decimal('1200.00')))
+        self.assertEqual(ultima.context['saldo_inicial_periodo'], Decimal('1000.00'))
+
+
+class BuscaDescricaoTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buscauser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Busca', numero_conta='357',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.cartao = CartaoCredito.objects.create(
+            usuario=self.user, nome_cartao='Cartão Busca', limite=Decimal('1000.00'),
+            dia_fechamento=20, dia_vencimento=28, conta_pagamento=self.conta
+        )
+
+    def _lancamento(self, descricao, usuario=None, **kwargs):
+        kwargs.setdefault('conta_bancaria', self.conta)
+        kwargs.setdefault('data_caixa', date(2023, 3, 10))
+        return Lancamento.objects.create(
+            usuario=usuario or self.user, descricao=descricao, valor=Decimal('10.00'), tipo='D',
+            data_competencia=date(2023, 3, 10), **kwargs
+        )
+
+    def test_indice_acompanha_as_escritas_em_lote(self):
+        conta_luz = self._lancamento('Conta de LUZ Enel')
+        agua = self._lancamento('Pagamento Água Sabesp')
+        self._lancamento('Padaria')
+        lancamentos = Lancamento.objects.filter(usuario=self.user)
+
+        def buscar(texto):
+            return set(services.filtrar_por_descricao(lancamentos, texto).values_list('descricao', flat=True))
+
+        self.assertIn('core_lancamento_busca', str(services.filtrar_por_descricao(lancamentos, 'luz').query))
+        self.assertEqual(buscar('luz en'), {'Conta de LUZ Enel'})
+        self.assertEqual(buscar('ÁGUA'), {'Pagamento Água Sabesp'})
+        self.assertEqual(buscar('pa'), {'Pagamento Água Sabesp', 'Padaria'})
+
+        # UPDATE e DELETE em lote não disparam signals, mas o índice continua em dia.
+        Lancamento.objects.filter(pk=conta_luz.pk).update(descricao='Energia elétrica')
+        services.excluir_lancamentos_em_lote(self.user, [agua.pk])
+        self.assertEqual(buscar('luz'), set())
+        self.assertEqual(buscar('elétri'), {'Energia elétrica'})
+        self.assertEqual(buscar('sabesp'), set())
+
+    def test_busca_global_em_contas_e_cartoes(self):
+        self._lancamento('Uber viagem aeroporto')
+        self._lancamento('Uber Eats jantar', conta_bancaria=None, cartao_credito=self.cartao, data_caixa=None)
+        self._lancamento('Uber viagem', usuario=User.objects.create_user(username='outrabusca'))
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('core:busca'), {'q': 'uber'})
+        self.assertEqual(
+            {l.descricao for l in response.context['lancamentos']}, {'Uber viagem aeroporto', 'Uber Eats jantar'}
+        )
+        response = self.client.get(reverse('core:busca'), {'q': 'viagem UBER'})
+        self.assertEqual([l.descricao for l in response.context['lancamentos']], ['Uber viagem aeroporto'])
+        self.assertContains(response, 'Banco Busca')
+
+
+class AdiarRecalculosTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='adiaruser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Adiado', numero_conta='999',
+            saldo_inicial=Decimal('100.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+
+    def test_recalcula_cada_conta_uma_vez_apos_o_commit(self):
+        with patch('core.services.recalcular_saldo_conta', wraps=services.recalcular_saldo_conta) as recalcular:
+            with self.captureOnCommitCallbacks() as callbacks:
+                with services.adiar_recalculos():
+                    for valor in ('10.00', '20.00', '30.00'):
+                        Lancamento.objects.create(
+                            usuario=self.user, conta_bancaria=self.conta, descricao='Lote', valor=Decimal(valor),
+                            tipo='D', data_competencia=date(2023, 1, 5), data_caixa=date(2023, 1, 5)
+                        )
+                    with services.adiar_recalculos():
+                        Lancamento.objects.filter(valor=Decimal('10.00')).get().delete()
+
+                # Nada é recalculado antes do commit.
+                recalcular.assert_not_called()
+                self.conta.refresh_from_db()
+                self.assertEqual(self.conta.saldo_calculado, Decimal('100.00'))
+
+            self.assertEqual(len(callbacks), 1)
+            callbacks[0]()
+
+        recalcular.assert_called_once()
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_calculado, Decimal('50.00'))
+
+    def test_remonta_apenas_os_meses_alterados(self):
+        for mes in (1, 2):
+            Lancamento.objects.create(
+                usuario=self.user, conta_bancaria=self.conta, descricao='Mensal', valor=Decimal('10.00'),
+                tipo='D', data_competencia=date(2023, mes, 5), data_caixa=date(2023, mes, 5)
+            )
+        services.garantir_resumos_mensais(self.user.pk, [date(2023, 1, 1), date(2023, 2, 1), date(2023, 3, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with services.adiar_recalculos():
+                lancamento = Lancamento.objects.get(data_caixa=date(2023, 1, 5))
+                lancamento.data_competencia = lancamento.data_caixa = date(2023, 3, 5)
+                lancamento.save()
+
+        cobertos = CoberturaResumoMensal.objects.filter(usuario=self.user).values_list('mes', flat=True)
+        self.assertEqual(list(cobertos), [date(2023, 2, 1)])
+
+    def test_rollback_descarta_os_recalculos(self):
+        with patch('core.services.recalcular_saldo_conta') as recalcular:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with self.assertRaises(ValueError), services.adiar_recalculos():
+                    Lancamento.objects.create(
+                        usuario=self.user, conta_bancaria=self.conta, descricao='Desfeito', valor=Decimal('10.00'),
+                        tipo='D', data_competencia=date(2023, 1, 5), data_caixa=date(2023, 1, 5)
+                    )
+                    raise ValueError
+
+        self.assertEqual(callbacks, [])
+        recalcular.assert_not_called()
+        self.assertFalse(Lancamento.objects.filter(descricao='Desfeito').exists())
+
+
 class DashboardServiceTest(TestCase):
 
     @classmethod
@@ -281,3 +1202,415 @@ class DashboardServiceTest(TestCase):
         }
         self.assertEqual(dados['completo'], esperado)
         self.assertEqual(dados['condensado'], esperado)
+
+
+class RegraCategoriaServiceTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='regrasuser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco R', numero_conta='999',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.cat_transporte = Categoria.objects.create(nome='Transporte', usuario=self.user)
+        self.cat_alimentacao = Categoria.objects.create(nome='Alimentação', usuario=self.user)
+
+    def _novo_lancamento(self, descricao):
+        return Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao=descricao,
+            valor=Decimal('10.00'), tipo='D',
+            data_competencia=date(2023, 1, 5), data_caixa=date(2023, 1, 5)
+        )
+
+    def test_automato_respeita_prioridade_das_regras(self):
+        """
+        Quando mais de uma regra corresponde, vence a de menor 'ordem',
+        independente da posição do texto na descrição.
+        """
+        RegraCategoria.objects.create(usuario=self.user, texto_regra='uber eats', categoria=self.cat_alimentacao)
+        RegraCategoria.objects.create(usuario=self.user, texto_regra='UBER', categoria=self.cat_transporte)
+
+        automato = obter_automato_regras(self.user)
+        self.assertEqual(automato.encontrar('Pagamento UBER EATS *Pedido')[1], self.cat_alimentacao)
+        self.assertEqual(automato.encontrar('uber trip')[1], self.cat_transporte)
+        self.assertIsNone(automato.encontrar('Padaria'))
+
+    def test_cache_invalidado_ao_criar_e_reordenar_regras(self):
+        """
+        O automato compilado é reaproveitado e descartado quando as regras mudam.
+        """
+        regra_uber = RegraCategoria.objects.create(usuario=self.user, texto_regra='uber', categoria=self.cat_transporte)
+        self.assertEqual(self._novo_lancamento('UBER EATS').categoria, self.cat_transporte)
+
+        with self.assertNumQueries(0):
+            obter_automato_regras(self.user)
+
+        regra_eats = RegraCategoria.objects.create(usuario=self.user, texto_regra='eats', categoria=self.cat_alimentacao)
+        self.assertEqual(self._novo_lancamento('UBER EATS').categoria, self.cat_transporte)
+
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('core:regras_reordenar'),
+            data=json.dumps({'order': [regra_eats.pk, regra_uber.pk]}),
+            content_type='application/json'
+        )
+        self.assertEqual(self._novo_lancamento('UBER EATS').categoria, self.cat_alimentacao)
+
+    def test_versoes_das_regras_lidas_de_uma_vez(self):
+        obter_automato_regras(self.user)
+        with patch('core.services.cache_service.cache', wraps=cache) as cache_regras:
+            obter_automato_regras(self.user)
+        cache_regras.get_many.assert_called_once()
+        cache_regras.get.assert_not_called()
+
+    def test_automatos_em_memoria_tem_limite(self):
+        outros = [User.objects.create_user(username=f'regras{i}', password='password123') for i in range(2)]
+        with patch('core.services.rule_service.MAX_AUTOMATOS_EM_MEMORIA', 2):
+            for usuario in [self.user, *outros]:
+                obter_automato_regras(usuario)
+            self.assertEqual(list(services.rule_service._automatos_por_usuario), [usuario.pk for usuario in outros])
+
+    def test_aplicar_regra_em_massa_respeita_prioridade(self):
+        """
+        A aplicação retroativa não sobrescreve lançamentos em que uma regra
+        de maior prioridade também corresponde.
+        """
+        l_eats = self._novo_lancamento('UBER EATS')
+        l_trip = self._novo_lancamento('UBER TRIP')
+        RegraCategoria.objects.create(usuario=self.user, texto_regra='eats', categoria=self.cat_alimentacao)
+        regra_uber = RegraCategoria.objects.create(usuario=self.user, texto_regra='uber', categoria=self.cat_transporte)
+
+        count = aplicar_regra_em_massa(regra_uber)
+
+        self.assertEqual(count, 1)
+        l_trip.refresh_from_db()
+        self.assertEqual(l_trip.categoria, self.cat_transporte)
+        l_eats.refresh_from_db()
+        self.assertNotEqual(l_eats.categoria, self.cat_transporte)
+
+
+class ImportacaoEmLoteServiceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='importuser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco I', numero_conta='777',
+            saldo_inicial=Decimal('100.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.categoria = Categoria.objects.create(nome='Mercado', usuario=self.user)
+
+    def _linha(self, import_hash, valor='10.00', tipo='Débito'):
+        return {
+            'descricao': f'Compra {import_hash}', 'valor': valor, 'tipo': tipo,
+            'data_competencia': '2023-02-01', 'data_caixa': '2023-02-01',
+            'categoria_id': self.categoria.pk, 'import_hash': import_hash.ljust(32, '0'),
+        }
+
+    def _tarefa(self, *linhas):
+        tarefa = TarefaImportacao.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, tipo_arquivo='csv', nome_arquivo='x.csv',
+            status=TarefaImportacao.StatusTarefa.CONCLUIDA
+        )
+        services.preparar_itens_importacao(tarefa, list(linhas))
+        return tarefa
+
+    def test_importa_em_lote_ignorando_duplicados(self):
+        """
+        Lançamentos com hash já gravado ou repetido no arquivo são ignorados
+        e o saldo da conta é recalculado uma única vez no final.
+        """
+        services.promover_itens_importacao(self._tarefa(self._linha('a')))
+
+        tarefa = self._tarefa(self._linha('a'), self._linha('b', valor='50.00', tipo='Crédito'), self._linha('b', valor='50.00', tipo='Crédito'))
+        with patch('core.services.recalcular_saldo_conta', wraps=services.recalcular_saldo_conta) as recalcular:
+            with self.captureOnCommitCallbacks(execute=True):
+                resultado = services.promover_itens_importacao(tarefa)
+
+        self.assertEqual(resultado['inseridos'], 1)
+        self.assertEqual(resultado['ignorados'], 2)
+        self.assertEqual(recalcular.call_count, 1)
+        self.assertEqual(Lancamento.objects.filter(conta_bancaria=self.conta).count(), 2)
+        self.conta.refresh_from_db()
+        # 100 - 10 + 50
+        self.assertEqual(self.conta.saldo_calculado, Decimal('140.00'))
+
+    def test_confirmacao_conta_so_o_que_foi_gravado(self):
+        """
+        Um hash gravado por outra importação depois da pré-conciliação é ignorado
+        pelo INSERT, e a contagem informada na confirmação segue o que o banco gravou.
+        """
+        tarefa = self._tarefa(self._linha('e'), self._linha('f'))
+        Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao='Concorrente', valor=Decimal('10.00'),
+            tipo='D', data_competencia=date(2023, 2, 1), data_caixa=date(2023, 2, 1), categoria=self.categoria,
+            import_hash='e'.ljust(32, '0')
+        )
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse('core:confirmar_importacao', args=[tarefa.pk]), follow=True)
+
+        mensagens = [str(m) for m in response.context['messages']]
+        self.assertEqual(mensagens, ["1 lançamentos foram importados com sucesso! 1 já existiam e foram ignorados."])
+        self.assertEqual(Lancamento.objects.filter(conta_bancaria=self.conta).count(), 2)
+
+    def test_edicao_invalida_nao_altera_o_item(self):
+        """
+        Uma edição inválida na pré-conciliação é recusada sem gravar nada no item em staging.
+        """
+        tarefa = self._tarefa(self._linha('d'))
+        item = tarefa.itens.get()
+        dados = {'descricao': 'Outra', 'valor': '20.00', 'tipo': 'Débito', 'dataCompetencia': '2023-02-01',
+                 'dataCaixa': '2023-02-01', 'categoriaId': '999999'}
+
+        self.assertTrue(services.atualizar_item_importacao(item, dados))
+
+        item.refresh_from_db()
+        self.assertEqual((item.descricao, item.categoria_id), ('Compra d', self.categoria.pk))
+        self.assertFalse(Lancamento.objects.filter(conta_bancaria=self.conta).exists())
+
+
+class ImportacaoCsvServiceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='csvuser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco CSV', numero_conta='321',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+
+    def test_processa_csv_em_blocos_latin1(self):
+        """
+        O CSV é lido em blocos pequenos, com a codificação detectada no primeiro
+        bloco, sem perder linhas, acentos ou campos com quebra de linha.
+        """
+        conteudo = (
+            'Data,Tipo,Descrição,Competência,Documento,Valor\r\n'
+            '05/02/2023,PIX,"Padaria São João\nfilial 2",,1001,-12.50\r\n'
+            '06/02/2023,TED,Salário,,1002,3000.00\r\n'
+            '10/12/2022,TED,Antigo,,1003,5.00\r\n'
+        ).encode('latin-1')
+        arquivo = SimpleUploadedFile('extrato.csv', conteudo)
+
+        with patch('core.services.csv_import_service.TAMANHO_BLOCO', 16):
+            lancamentos, warnings, antigos = processar_arquivo_csv(arquivo, self.conta)
+
+        self.assertEqual(warnings, [])
+        self.assertEqual([l['descricao'] for l in lancamentos], ['Padaria São João\nfilial 2', 'Salário'])
+        self.assertEqual([l['tipo'] for l in lancamentos], ['Débito', 'Crédito'])
+        self.assertEqual(len(antigos), 1)
+
+    def test_duplicados_detectados_apenas_pelos_hashes_do_arquivo(self):
+        """Só os hashes gerados do arquivo são consultados; o histórico da conta não é carregado."""
+        Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao='Já importado', valor=Decimal('7.00'),
+            tipo='C', data_competencia=date(2023, 3, 1), data_caixa=date(2023, 3, 1),
+            import_hash=gerar_hash_lancamento(self.conta.id, date(2023, 3, 1), '2001', Decimal('7.00'))
+        )
+        conteudo = (
+            'Data,Tipo,Descricao,Competencia,Documento,Valor\n'
+            '01/03/2023,PIX,Repetido,,2001,7.00\n'
+            '02/03/2023,PIX,Novo,,2002,8.00\n'
+        ).encode('utf-8')
+
+        with patch('core.services.import_service.TAMANHO_LOTE', 1), \
+                patch('core.services.import_service.Lancamento.objects.filter', wraps=Lancamento.objects.filter) as filtro:
+            lancamentos, _, _ = processar_arquivo_csv(SimpleUploadedFile('extrato.csv', conteudo), self.conta)
+
+        self.assertEqual([l['ja_importado'] for l in lancamentos], [True, False])
+        self.assertEqual([c.kwargs for c in filtro.call_args_list], [
+            {'import_hash__in': [lancamentos[0]['import_hash']]},
+            {'import_hash__in': [lancamentos[1]['import_hash']]},
+        ])
+
+
+
+class ImportacaoOfxServiceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ofxuser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Principal', numero_conta='111',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.poupanca = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Poupança', numero_conta='00222-0',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+
+    def test_sgml_com_varios_extratos_direciona_por_conta(self):
+        """Cada BANKACCTFROM é direcionado à conta do usuário com o mesmo número."""
+        conteudo = (
+            'OFXHEADER:100\nDATA:OFXSGML\nENCODING:USASCII\nCHARSET:1252\n\n<OFX>'
+            '<STMTRS><BANKACCTFROM><BANKID>1<ACCTID>999</BANKACCTFROM><BANKTRANLIST>'
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20230205120000[-3:BRT]<TRNAMT>-10,50<FITID>A1'
+            '<MEMO>Padaria P&amp;B</STMTTRN>'
+            '</BANKTRANLIST></STMTRS>'
+            '<STMTRS><BANKACCTFROM><BANKID>1<ACCTID>2220</BANKACCTFROM><BANKTRANLIST>'
+            '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20230206<TRNAMT>100.00<FITID>B1<NAME>Rendimento</STMTTRN>'
+            '</BANKTRANLIST></STMTRS></OFX>'
+        ).encode('cp1252')
+
+        with patch('core.services.csv_import_service.TAMANHO_BLOCO', 16):
+            lancamentos, warnings, _ = processar_arquivo_ofx(SimpleUploadedFile('extrato.ofx', conteudo), self.conta)
+
+        self.assertEqual([l['descricao'] for l in lancamentos], ['Padaria P&B', 'Rendimento'])
+        self.assertEqual([l['valor'] for l in lancamentos], ['10.50', '100.00'])
+        self.assertEqual([l['conta_id'] for l in lancamentos], [self.conta.pk, self.poupanca.pk])
+        self.assertEqual(lancamentos[0]['numero_documento'], 'A1')
+        self.assertEqual(len(warnings), 1)
+
+    def test_mesmo_numero_em_bancos_diferentes(self):
+        """O BANKID separa contas de mesmo número; sem como decidir, nada é direcionado e o usuário é avisado."""
+        itau = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Itaú', codigo_banco='341', agencia='1', numero_conta='333',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Bradesco', codigo_banco='237', agencia='2', numero_conta='333',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Inter', agencia='3', numero_conta='444',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Nubank', agencia='4', numero_conta='444',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        transacao = '<BANKTRANLIST><STMTTRN><DTPOSTED>20230301<TRNAMT>-1.00<FITID>{}</STMTTRN></BANKTRANLIST>'
+        conteudo = (
+            '<OFX>'
+            f'<STMTRS><BANKACCTFROM><BANKID>0341<ACCTID>333</BANKACCTFROM>{transacao.format("I1")}</STMTRS>'
+            f'<STMTRS><BANKACCTFROM><BANKID>77<ACCTID>444</BANKACCTFROM>{transacao.format("N1")}</STMTRS>'
+            f'<CCSTMTRS><CCACCTFROM><ACCTID>111</CCACCTFROM>{transacao.format("C1")}</CCSTMTRS>'
+            '</OFX>'
+        ).encode('utf-8')
+
+        lancamentos, warnings, _ = processar_arquivo_ofx(SimpleUploadedFile('extrato.ofx', conteudo), self.conta)
+
+        self.assertEqual([l['conta_id'] for l in lancamentos], [itau.pk, self.conta.pk, self.conta.pk])
+        self.assertEqual(len(warnings), 3)
+        self.assertIn('mais de uma conta', warnings[1])
+        self.assertIn('cartão', warnings[2])
+
+    def test_data_com_fuso_segue_o_ofxparse(self):
+        """O fuso é descontado como no ofxparse: o hash de um arquivo já importado não muda."""
+        conteudo = (
+            '<OFX><BANKACCTFROM><ACCTID>111</BANKACCTFROM><BANKTRANLIST>'
+            '<STMTTRN><DTPOSTED>20230205220000.000[-3:BRT]<TRNAMT>-7.00<FITID>N1<MEMO>Pizza</STMTTRN>'
+            '</BANKTRANLIST></OFX>'
+        ).encode('utf-8')
+
+        lancamentos, _, _ = processar_arquivo_ofx(SimpleUploadedFile('extrato.ofx', conteudo), self.conta)
+
+        self.assertEqual(lancamentos[0]['data_caixa'], '2023-02-06')
+        self.assertEqual(lancamentos[0]['import_hash'], gerar_hash_lancamento(
+            conta_id=self.conta.pk, data_caixa=date(2023, 2, 6), numero_documento='N1', valor=Decimal('-7.00')
+        ))
+
+    def test_xml_ofx_2(self):
+        conteudo = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<?OFX OFXHEADER="200" VERSION="200"?>\n<OFX>'
+            '<BANKACCTFROM><ACCTID>111</ACCTID></BANKACCTFROM><BANKTRANLIST>\n'
+            '  <STMTTRN>\n    <DTPOSTED>20230301</DTPOSTED>\n    <TRNAMT>-5.00</TRNAMT>\n'
+            '    <FITID>X9</FITID>\n    <CHECKNUM>77</CHECKNUM>\n    <MEMO>Café</MEMO>\n  </STMTTRN>\n'
+            '</BANKTRANLIST></OFX>'
+        ).encode('utf-8')
+
+        lancamentos, warnings, _ = processar_arquivo_ofx(SimpleUploadedFile('extrato.ofx', conteudo), self.conta)
+
+        self.assertEqual(warnings, [])
+        self.assertEqual(len(lancamentos), 1)
+        self.assertEqual(
+            (lancamentos[0]['descricao'], lancamentos[0]['tipo'], lancamentos[0]['data_caixa'], lancamentos[0]['numero_documento']),
+            ('Café', 'Débito', '2023-03-01', '77')
+        )
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TarefaImportacaoTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tarefauser', password='password123')
+        self.conta = ContaBancaria.objects.create(
+            usuario=self.user, nome_banco='Banco Fila', numero_conta='555',
+            saldo_inicial=Decimal('0.00'), data_saldo_inicial=date(2023, 1, 1)
+        )
+        self.client.login(username='tarefauser', password='password123')
+
+    def test_upload_enfileira_e_worker_processa(self):
+        """O upload só enfileira o arquivo; o worker processa e a página da tarefa abre a pré-conciliação."""
+        conteudo = b'Data,Tipo,Descricao,Competencia,Documento,Valor\n05/02/2023,PIX,Mercado,,2001,-40.00\n'
+        response = self.client.post(reverse('core:importar_unificado'), {
+            'import_type': 'csv',
+            'conta_bancaria': self.conta.pk,
+            'import_file': SimpleUploadedFile('extrato.csv', conteudo),
+        })
+
+        tarefa = TarefaImportacao.objects.get(usuario=self.user)
+        self.assertRedirects(response, reverse('core:importacao_tarefa', kwargs={'pk': tarefa.pk}))
+        self.assertEqual(tarefa.status, TarefaImportacao.StatusTarefa.PENDENTE)
+
+        status_url = reverse('core:importacao_tarefa_status', kwargs={'pk': tarefa.pk})
+        self.assertFalse(self.client.get(status_url).json()['finalizada'])
+
+        call_command('processar_importacoes', '--uma-vez', stdout=io.StringIO())
+
+        dados = self.client.get(status_url).json()
+        self.assertTrue(dados['finalizada'])
+        self.assertEqual(dados['status'], TarefaImportacao.StatusTarefa.CONCLUIDA)
+
+        response = self.client.get(reverse('core:importacao_tarefa', kwargs={'pk': tarefa.pk}))
+        self.assertTemplateUsed(response, 'core/pre_conciliacao.html')
+        self.assertEqual([l.descricao for l in response.context['lancamentos']], ['Mercado'])
+
+    def test_pre_conciliacao_edita_staging_e_promove(self):
+        """As edições ficam no item em staging e a confirmação move só os aprovados para Lancamento."""
+        tarefa = TarefaImportacao.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, tipo_arquivo='csv', nome_arquivo='x.csv',
+            status=TarefaImportacao.StatusTarefa.CONCLUIDA
+        )
+        Lancamento.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, descricao='Antigo', valor=Decimal('1.00'),
+            tipo='D', data_competencia=date(2023, 2, 1), data_caixa=date(2023, 2, 1), import_hash='h-existente'
+        )
+        linhas = [
+            {'descricao': desc, 'valor': '10.00', 'tipo': 'Débito', 'data_competencia': '2023-02-05',
+             'data_caixa': '2023-02-05', 'categoria_id': get_default_other_category().pk,
+             'import_hash': import_hash, 'numero_documento': '1'}
+            for desc, import_hash in [('Mercado', 'h-1'), ('Farmácia', 'h-2'), ('Repetido', 'h-existente')]
+        ]
+        services.preparar_itens_importacao(tarefa, linhas)
+        mercado, farmacia, _ = tarefa.itens.all()
+
+        dados = {'descricao': 'Mercado Central', 'valor': '12.50', 'tipo': 'Débito', 'dataCompetencia': '2023-02-05',
+                 'dataCaixa': '2023-02-05', 'categoriaId': mercado.categoria_id}
+        response = self.client.post(reverse('core:importacao_item_atualizar', kwargs={'pk': mercado.pk}),
+                                    json.dumps(dados), content_type='application/json')
+        self.assertEqual(response.json()['status'], 'success')
+        self.client.post(reverse('core:importacao_item_atualizar', kwargs={'pk': farmacia.pk}),
+                         json.dumps({'excluido': True}), content_type='application/json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('core:confirmar_importacao', kwargs={'pk': tarefa.pk}))
+        self.assertRedirects(response, reverse('core:lancamento_list_atual', kwargs={'conta_pk': self.conta.pk}))
+
+        importado = Lancamento.objects.get(import_hash='h-1')
+        self.assertEqual((importado.descricao, importado.valor), ('Mercado Central', Decimal('12.50')))
+        self.assertTrue(importado.conciliado)
+        self.assertFalse(Lancamento.objects.filter(import_hash='h-2').exists())
+        self.assertEqual(Lancamento.objects.filter(conta_bancaria=self.conta).count(), 2)
+        self.conta.refresh_from_db()
+        self.assertEqual(self.conta.saldo_calculado, Decimal('-13.50'))
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaImportacao.StatusTarefa.IMPORTADA)
+        self.assertFalse(tarefa.itens.exists())
+
+    def test_tarefa_de_outro_usuario_nao_e_acessivel(self):
+        outro = User.objects.create_user(username='intruso', password='password123')
+        tarefa = TarefaImportacao.objects.create(
+            usuario=self.user, conta_bancaria=self.conta, tipo_arquivo='csv', nome_arquivo='x.csv'
+        )
+        self.client.force_login(outro)
+        response = self.client.get(reverse('core:importacao_tarefa_status', kwargs={'pk': tarefa.pk}))
+        self.assertEqual(response.status_code, 404)
@@ -24,10 +24,16 @@ from .views import (
     LancamentoDeleteView,
     confirmar_importacao_view,
     conciliar_lancamento_view,
+    gravar_ocorrencia_recorrente_view,
     excluir_lancamentos_em_massa,
-    iniciar_fila_conciliacao_view,
+    conciliar_lancamentos_em_massa,
     iniciar_fila_edicao_view,
+    editar_lancamentos_em_massa,
+    busca_lancamentos_view,
     importar_unificado_view,
+    importacao_tarefa_view,
+    importacao_tarefa_status_view,
+    importacao_item_atualizar_view,
     RegraCategoriaListView,
     RegraCategoriaCreateView,
     RegraCategoriaUpdateView,
@@ -95,16 +101,27 @@ urlpatterns += [
     path('lancamentos/bulk-delete/', excluir_lancamentos_em_massa, name='lancamento_bulk_delete'),
     # Rota para a importação unificada
     path('importar/unificado/', importar_unificado_view, name='importar_unificado'),
+    # Rotas para acompanhar a importação processada em segundo plano
+    path('importar/tarefas/<int:pk>/', importacao_tarefa_view, name='importacao_tarefa'),
+    path('importar/tarefas/<int:pk>/status/', importacao_tarefa_status_view, name='importacao_tarefa_status'),
+    path('importar/itens/<int:pk>/atualizar/', importacao_item_atualizar_view, name='importacao_item_atualizar'),
     # Rota para confirmar a importação
-    path('importar/confirmar/', confirmar_importacao_view, name='confirmar_importacao'),
+    path('importar/tarefas/<int:pk>/confirmar/', confirmar_importacao_view, name='confirmar_importacao'),
     # Rota para conciliar um lançamento
     path('lancamentos/<int:pk>/conciliar/', conciliar_lancamento_view, name='lancamento_conciliar'),
-    # Rota para iniciar a fila de conciliação
-    path('lancamentos/iniciar-conciliacao/', iniciar_fila_conciliacao_view, name='lancamento_iniciar_conciliacao'),
+    # Rota para gravar uma ocorrência prevista de série recorrente e conciliá-la ou editá-la
+    path('lancamentos/recorrencia/<uuid:recorrencia_id>/gravar/', gravar_ocorrencia_recorrente_view, name='ocorrencia_recorrente_gravar'),
+    # Rota para conciliar vários lançamentos de uma vez
+    path('lancamentos/bulk-conciliar/', conciliar_lancamentos_em_massa, name='lancamento_bulk_conciliar'),
     path('lancamentos/iniciar-edicao/', iniciar_fila_edicao_view, name='lancamento_iniciar_edicao'),
+    # Rota para editar vários lançamentos de uma vez
+    path('lancamentos/bulk-editar/', editar_lancamentos_em_massa, name='lancamento_bulk_editar'),
     # Rota Extratos
     path('conta/<int:conta_pk>/extrato/', LancamentoListView.as_view(), name='lancamento_list_atual'),
+    path('conta/<int:conta_pk>/extrato/historico/', LancamentoListView.as_view(historico=True), name='lancamento_historico'),
     path('conta/<int:conta_pk>/extrato/<int:ano>/<int:mes>/', LancamentoListView.as_view(), name='lancamento_list'),
+    # Busca global de lançamentos pela descrição
+    path('busca/', busca_lancamentos_view, name='busca'),
     
     # Rotas para Faturas de Cartão de Crédito (agora "Cartões")
     path('cartoes/<int:cartao_pk>/faturas/', FaturaListView.as_view(), name='fatura_list_atual'),
@@ -7,10 +7,13 @@ from dateutil.relativedelta import relativedelta
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_http_methods
 from django.utils.safestring import mark_safe
 
-from ..models import ContaBancaria, CartaoCredito
+from ..models import ContaBancaria
 from .. import services
 from ..templatetags.formatacao import brl
 
@@ -30,15 +33,16 @@ def home(request, ano=None, mes=None):
     mes_anterior = data_selecionada - relativedelta(months=1)
     mes_seguinte = data_selecionada + relativedelta(months=1)
 
-    contas_bancarias = ContaBancaria.objects.filter(usuario=request.user)
-    contas_selecionadas_ids = list(contas_bancarias.values_list('id', flat=True))
+    contas_bancarias = request.financeiro.contas
+    contas_selecionadas_ids = [conta.pk for conta in contas_bancarias]
 
-    cartoes_de_credito = CartaoCredito.objects.filter(usuario=request.user)
+    cartoes_de_credito = request.financeiro.cartoes
     total_contas = sum(conta.saldo_calculado for conta in contas_bancarias)
 
-    chart_labels, chart_data = services.gerar_dados_grafico_saldo(request.user, ano=ano, mes=mes, contas_ids=contas_selecionadas_ids)
-    dados_grafico_despesas = services.gerar_dados_grafico_categorias(request.user, ano=ano, mes=mes, contas_ids=contas_selecionadas_ids)
-    dados_fluxo_caixa_completo = services.gerar_dados_fluxo_caixa(request.user, ano, contas_ids=contas_selecionadas_ids)
+    dados_dashboard = services.obter_dados_dashboard(request.user, ano, mes, contas_selecionadas_ids)
+    chart_labels, chart_data = dados_dashboard['chart_labels'], dados_dashboard['chart_data']
+    dados_grafico_despesas = dados_dashboard['despesas']
+    dados_fluxo_caixa_completo = dados_dashboard['fluxo_caixa']
 
     # Encontra o índice de "hoje" nos labels do gráfico para dividir a linha em real vs. projetado
     chart_today_index = -1  # Padrão: -1 (mês passado, sem projeção)
@@ -69,24 +73,52 @@ def home(request, ano=None, mes=None):
     
     return render(request, 'core/index.html', context)
 
-@require_POST
-@login_required
-def dashboard_data_view(request):
-    hoje = date.today()
+def _parametros_dashboard(request):
+    """
+    Lê ano, mês e contas da query string (GET: ?ano=&mes=&contas=1&contas=2)
+    ou do corpo JSON (POST). Levanta ValueError se forem inválidos.
+    """
     try:
-        data = json.loads(request.body)
+        if request.method == 'GET':
+            data = {'ano': request.GET.get('ano'), 'mes': request.GET.get('mes'), 'contas_ids': request.GET.getlist('contas')}
+        else:
+            data = json.loads(request.body)
         ano = int(data.get('ano'))
         mes = int(data.get('mes'))
-        contas_ids = data.get('contas_ids', [])
-    except (json.JSONDecodeError, TypeError, ValueError):
+        contas_ids = sorted({int(pk) for pk in data.get('contas_ids', [])})
+    except (json.JSONDecodeError, TypeError, ValueError, AttributeError) as e:
+        raise ValueError("Dados inválidos.") from e
+    return ano, mes, contas_ids
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+async def dashboard_data_view(request):
+    """
+    View assíncrona: os gráficos são calculados em paralelo (ver obter_dados_dashboard_async).
+    Em GET, um If-None-Match igual ao ETag atual responde 304 antes de qualquer agregação.
+    """
+    hoje = date.today()
+    usuario = await request.auser()
+    try:
+        ano, mes, contas_ids = _parametros_dashboard(request)
+    except ValueError:
         return JsonResponse({'status': 'error', 'message': 'Dados inválidos.'}, status=400)
 
-    contas_selecionadas = ContaBancaria.objects.filter(usuario=request.user, pk__in=contas_ids)
-    total_contas = sum(c.saldo_calculado for c in contas_selecionadas)
+    etag = None
+    if request.method == 'GET':
+        etag = quote_etag(await sync_to_async(services.etag_dados_usuario)(usuario.pk, 'dashboard-data', ano, mes, *contas_ids))
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+    contas_selecionadas = ContaBancaria.objects.filter(usuario=usuario, pk__in=contas_ids)
+    total_contas = sum([c.saldo_calculado async for c in contas_selecionadas])
 
-    chart_labels, chart_data = services.gerar_dados_grafico_saldo(request.user, ano=ano, mes=mes, contas_ids=contas_ids)
-    dados_grafico_despesas = services.gerar_dados_grafico_categorias(request.user, ano=ano, mes=mes, contas_ids=contas_ids)
-    dados_fluxo_caixa_completo = services.gerar_dados_fluxo_caixa(request.user, ano, contas_ids=contas_ids)
+    dados_dashboard = await services.obter_dados_dashboard_async(usuario, ano, mes, contas_ids)
+    chart_labels, chart_data = dados_dashboard['chart_labels'], dados_dashboard['chart_data']
+    dados_grafico_despesas = dados_dashboard['despesas']
+    dados_fluxo_caixa_completo = dados_dashboard['fluxo_caixa']
 
     # Lógica de projeção para o gráfico de saldo
     chart_today_index = -1  # Padrão: -1 (mês passado, sem projeção)
@@ -112,4 +144,9 @@ def dashboard_data_view(request):
         'despesas_chart': dados_grafico_despesas,
         'fluxo_caixa_tabela': dados_fluxo_caixa_formatado,
     }
-    return JsonResponse(response_data)
\ No newline at end of file
+    response = JsonResponse(response_data)
+    if etag:
+        response.headers['ETag'] = etag
+    # O navegador guarda a resposta, mas sempre revalida com o ETag antes de usá-la.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
\ No newline at end of file
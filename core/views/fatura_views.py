@@ -51,7 +51,7 @@ class FaturaListView(LoginRequiredMixin, ListView):
         data_selecionada = date(ano, mes, 1)
 
         context['cartao_selecionado'] = self.cartao
-        context['todos_os_cartoes'] = CartaoCredito.objects.filter(usuario=self.request.user).order_by('nome_cartao')
+        context['todos_os_cartoes'] = self.request.financeiro.cartoes
         context['data_selecionada'] = data_selecionada
         context['mes_anterior'] = data_selecionada - relativedelta(months=1)
         context['mes_seguinte'] = data_selecionada + relativedelta(months=1)
@@ -1,16 +1,14 @@
 # core/views/import_views.py
 
 import json
-from decimal import Decimal
-from datetime import date, datetime
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models.signals import post_save
+from django.urls import reverse
 
-from ..models import Lancamento, ContaBancaria
+from ..models import TarefaImportacao, LancamentoImportacao
 from ..forms import UnifiedImportForm, LancamentoForm, RegraCategoriaModalForm
-from ..signals import atualizar_saldo_conta
 from .. import services
 
 
@@ -18,126 +16,130 @@ from .. import services
 def importar_unificado_view(request):
     template_name = 'core/importar_unificado.html'
     if request.method == 'POST':
-        form = UnifiedImportForm(request.POST, request.FILES, user=request.user)
+        form = UnifiedImportForm(request.POST, request.FILES, user=request.user, financeiro=request.financeiro)
         if form.is_valid():
             import_type = form.cleaned_data['import_type']
             conta_selecionada = form.cleaned_data['conta_bancaria']
             import_file = form.cleaned_data['import_file']
 
-            if import_type == 'csv':
-                lancamentos_a_revisar, warnings, lancamentos_antigos = services.processar_arquivo_csv(
-                    csv_file=import_file, conta_selecionada=conta_selecionada
-                )
-            elif import_type == 'ofx':
-                lancamentos_a_revisar, warnings, lancamentos_antigos = services.processar_arquivo_ofx(
-                    ofx_file=import_file, conta_selecionada=conta_selecionada
-                )
-            else:
+            if import_type not in TarefaImportacao.TipoArquivo.values:
                 messages.error(request, "Tipo de importação inválido.")
                 return redirect('core:importar_unificado')
-            
-            request.session['lancamentos_para_importar'] = lancamentos_a_revisar
-            request.session['conta_pk_para_importar'] = conta_selecionada.pk
-            request.session['import_type_para_confirmar'] = import_type
-            
-            # Adiciona um formulário de lançamento ao contexto para ser usado como template no editor
-            form_lancamento = LancamentoForm(user=request.user)
-            form_regra_modal = RegraCategoriaModalForm(user=request.user)
-
-            context = {
-                'lancamentos': lancamentos_a_revisar, 
-                'conta': conta_selecionada, 
-                'warnings': warnings, 
-                'lancamentos_antigos': lancamentos_antigos,
-                'form_lancamento': form_lancamento,
-                'form_regra_modal': form_regra_modal,
-            }
-            return render(request, 'core/pre_conciliacao.html', context)
+
+            # O arquivo é apenas enfileirado; o worker `processar_importacoes` faz a leitura
+            # e a categorização fora da requisição, evitando o timeout em arquivos grandes.
+            tarefa = services.criar_tarefa_importacao(
+                usuario=request.user, conta=conta_selecionada,
+                tipo_arquivo=import_type, arquivo=import_file
+            )
+            return redirect('core:importacao_tarefa', pk=tarefa.pk)
         else:
             messages.error(request, "Houve um erro na validação do formulário. Por favor, corrija os erros abaixo.")
     else: # GET request
-        form = UnifiedImportForm(user=request.user)
+        form = UnifiedImportForm(user=request.user, financeiro=request.financeiro)
     
     return render(request, template_name, {'form': form})
 
 @login_required
-def confirmar_importacao_view(request):
+def importacao_tarefa_view(request, pk):
     """
-    Processa e salva os lançamentos pré-aprovados pelo usuário.
+    Página de acompanhamento de uma importação. Enquanto a tarefa está na fila
+    exibe o progresso; quando concluída, abre a pré-conciliação com o resultado.
+    """
+    tarefa = get_object_or_404(
+        TarefaImportacao.objects.select_related('conta_bancaria'), pk=pk, usuario=request.user
+    )
+
+    if tarefa.status == TarefaImportacao.StatusTarefa.ERRO:
+        messages.error(request, tarefa.mensagem_erro or "Não foi possível processar o arquivo.")
+        return redirect('core:importar_unificado')
+
+    if tarefa.status == TarefaImportacao.StatusTarefa.IMPORTADA:
+        messages.info(request, "Esta importação já foi confirmada.")
+        return redirect('core:lancamento_list_atual', conta_pk=tarefa.conta_bancaria_id)
+
+    if tarefa.status != TarefaImportacao.StatusTarefa.CONCLUIDA:
+        return render(request, 'core/importacao_processando.html', {'tarefa': tarefa})
+
+    resultado = tarefa.resultado or {}
+
+    # Adiciona um formulário de lançamento ao contexto para ser usado como template no editor
+    form_lancamento = LancamentoForm(user=request.user, financeiro=request.financeiro)
+    form_regra_modal = RegraCategoriaModalForm(user=request.user, financeiro=request.financeiro)
+
+    context = {
+        'tarefa': tarefa,
+        'lancamentos': tarefa.itens.select_related('categoria', 'conta_bancaria'),
+        'conta': tarefa.conta_bancaria,
+        'warnings': resultado.get('warnings', []),
+        'lancamentos_antigos': resultado.get('lancamentos_antigos', []),
+        'form_lancamento': form_lancamento,
+        'form_regra_modal': form_regra_modal,
+    }
+    return render(request, 'core/pre_conciliacao.html', context)
+
+@login_required
+def importacao_item_atualizar_view(request, pk):
+    """
+    Grava a edição de uma linha da pré-conciliação (via AJAX).
+    Cada alteração é persistida no item em staging, então a confirmação não recebe dados do navegador.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido.'}, status=405)
+
+    item = get_object_or_404(
+        LancamentoImportacao.objects.select_related('tarefa'),
+        pk=pk, tarefa__usuario=request.user, tarefa__status=TarefaImportacao.StatusTarefa.CONCLUIDA
+    )
+    try:
+        dados = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Dados inválidos.'}, status=400)
+
+    erro = services.atualizar_item_importacao(item, dados)
+    if erro:
+        return JsonResponse({'status': 'error', 'message': f"Não foi possível salvar: {erro}"}, status=400)
+    return JsonResponse({'status': 'success'})
+
+@login_required
+def importacao_tarefa_status_view(request, pk):
+    """Retorna em JSON o andamento de uma tarefa de importação, consultado pela página de progresso."""
+    tarefa = get_object_or_404(TarefaImportacao, pk=pk, usuario=request.user)
+    return JsonResponse({
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'itens_processados': tarefa.itens_processados,
+        'finalizada': tarefa.finalizada,
+        'mensagem_erro': tarefa.mensagem_erro,
+        'redirect_url': reverse('core:importacao_tarefa', kwargs={'pk': tarefa.pk}),
+    })
+
+@login_required
+def confirmar_importacao_view(request, pk):
+    """
+    Importa os lançamentos pré-aprovados pelo usuário, já gravados em staging.
     """
     if request.method == 'POST':
-        try:
-            lancamentos_json = request.POST.get('lancamentos_json')
-            lancamentos_data = json.loads(lancamentos_json)
-        except (json.JSONDecodeError, TypeError):
-            messages.error(request, "Ocorreu um erro ao processar os dados. Tente novamente.")
-            return redirect('core:importar_unificado')
+        tarefa = get_object_or_404(
+            TarefaImportacao.objects.select_related('conta_bancaria'),
+            pk=pk, usuario=request.user
+        )
 
-        conta_pk = request.session.pop('conta_pk_para_importar', None)
-        # Limpa outros dados da sessão para segurança
-        request.session.pop('lancamentos_para_importar', None)
-        request.session.pop('import_type_para_confirmar', None)
+        # Os itens aprovados são movidos para Lancamento direto no banco.
+        resultado = services.promover_itens_importacao(tarefa)
 
-        if not lancamentos_data or not conta_pk:
-            messages.error(request, "Nenhum dado para importar encontrado ou a sessão expirou. Por favor, tente novamente.")
+        if resultado['erros']:
+            messages.error(request, "Nenhum lançamento foi importado. " + " ".join(resultado['erros'][:5]))
             return redirect('core:importar_unificado')
 
-        conta = get_object_or_404(ContaBancaria, pk=conta_pk, usuario=request.user)
-        
-        # Desconecta o sinal para evitar recálculos de saldo a cada `save()`
-        post_save.disconnect(atualizar_saldo_conta, sender=Lancamento)
-        
-        try:
-            total_criados = 0
-            for data in lancamentos_data:
-                # Validação básica dos dados recebidos (chaves em camelCase vindas do dataset JS)
-                if not all(k in data for k in ['descricao', 'valor', 'tipo', 'dataCompetencia', 'dataCaixa', 'categoriaId', 'importHash']):
-                    continue
-    
-                data_caixa_str = data['dataCaixa']
-                data_caixa_obj = datetime.fromisoformat(data_caixa_str).date()
-    
-                data_competencia_str = data['dataCompetencia']
-                data_competencia_obj = datetime.fromisoformat(data_competencia_str).date()
-    
-                lancamento_base = Lancamento(
-                    usuario=request.user,
-                    conta_bancaria=conta,
-                    data_competencia=data_competencia_obj,
-                    data_caixa=data_caixa_obj,
-                    descricao=data['descricao'],
-                    valor=Decimal(data['valor']),
-                    tipo='C' if data['tipo'] == 'Crédito' else 'D',
-                    categoria_id=int(data['categoriaId']),
-                    import_hash=data['importHash'],
-                    numero_documento=data.get('numeroDocumento')
-                )
-                # Regra de conciliação: Lançamentos importados só são conciliados se a data não for futura.
-                lancamento_base.conciliado = data_caixa_obj <= date.today()
-    
-                lancamento_base.save()
-                total_criados += 1
-    
-                if data.get('repeticao') == 'RECORRENTE':
-                    try:
-                        quantidade = int(data.get('quantidadeRepeticoes'))
-                        periodicidade = data.get('periodicidade')
-                        if quantidade > 1 and periodicidade:
-                            services.criar_lancamentos_recorrentes(lancamento_base, periodicidade, quantidade)
-                            total_criados += (quantidade - 1)
-                    except (ValueError, TypeError, KeyError):
-                        continue
-        finally:
-            # Reconecta o sinal, garantindo que ele seja reativado mesmo se ocorrer um erro.
-            post_save.connect(atualizar_saldo_conta, sender=Lancamento)
-
-        if total_criados > 0:
-            # Agora, recalcula o saldo da conta uma única vez.
-            services.recalcular_saldo_conta(conta)
-            messages.success(request, f"{total_criados} lançamentos foram importados com sucesso!")
+        if resultado['inseridos'] > 0:
+            mensagem = f"{resultado['inseridos']} lançamentos foram importados com sucesso!"
+            if resultado['ignorados']:
+                mensagem += f" {resultado['ignorados']} já existiam e foram ignorados."
+            messages.success(request, mensagem)
         else:
             messages.warning(request, "Nenhum lançamento foi importado.")
 
-        return redirect('core:lancamento_list_atual', conta_pk=conta.pk)
+        return redirect('core:lancamento_list_atual', conta_pk=tarefa.conta_bancaria_id)
 
-    return redirect('core:importar_unificado')
\ No newline at end of file
+    return redirect('core:importar_unificado')
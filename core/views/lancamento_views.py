@@ -2,12 +2,12 @@
 
 import json
 from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
 from dateutil.relativedelta import relativedelta
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, Q
 from django.http import JsonResponse, Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
@@ -17,7 +17,7 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
 from core import services
 
-from ..models import Lancamento, ContaBancaria, CartaoCredito, Categoria, Fatura
+from ..models import Lancamento, ContaBancaria, CartaoCredito, Fatura
 from ..forms import LancamentoForm, ConciliacaoForm, RegraCategoriaModalForm
 
 
@@ -29,6 +29,7 @@ class LancamentoCreateView(LoginRequiredMixin, CreateView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['user'] = self.request.user
+        kwargs['financeiro'] = self.request.financeiro
         kwargs['initial'] = kwargs.get('initial', {}) # Garante que initial exista
         
         # Passa a conta ou cartão para o formulário, se presente na URL
@@ -56,11 +57,9 @@ class LancamentoCreateView(LoginRequiredMixin, CreateView):
 
         # Dados dos cartões para a lógica JS (ainda útil para o form genérico)
         if context['form_context'] != 'conta':
-            cartoes = CartaoCredito.objects.filter(usuario=self.request.user)
-            cartoes_data = {c.id: {'fechamento': c.dia_fechamento, 'vencimento': c.dia_vencimento} for c in cartoes}
-            context['cartoes_data_json'] = mark_safe(json.dumps(cartoes_data))
+            context['cartoes_data_json'] = mark_safe(json.dumps(self.request.financeiro.dados_cartoes()))
 
-        context['form_regra_modal'] = RegraCategoriaModalForm(user=self.request.user)
+        context['form_regra_modal'] = RegraCategoriaModalForm(user=self.request.user, financeiro=self.request.financeiro)
         return context
 
     def get_success_url(self):
@@ -97,19 +96,27 @@ class LancamentoCreateView(LoginRequiredMixin, CreateView):
         if repeticao == 'RECORRENTE':
             periodicidade = form.cleaned_data.get('periodicidade')
             quantidade = form.cleaned_data.get('quantidade_repeticoes')
-            if periodicidade and quantidade:
+            if periodicidade:
                 services.criar_lancamentos_recorrentes(self.object, periodicidade, quantidade)
-                messages.success(self.request, f"{quantidade} lançamentos recorrentes foram criados com sucesso!")
+                if quantidade:
+                    messages.success(self.request, f"{quantidade} lançamentos recorrentes foram criados com sucesso!")
+                else:
+                    messages.success(self.request, "Lançamento recorrente criado com sucesso! As próximas ocorrências são geradas automaticamente.")
         else:
             messages.success(self.request, "Lançamento criado com sucesso!")
 
         return redirect(self.get_success_url())
 
 class LancamentoListView(LoginRequiredMixin, ListView):
+    """
+    Extrato da conta, de um mês ou (com `historico`) de todos os meses, paginado por
+    cursor: o parâmetro `cursor` leva a chave e o saldo do último lançamento exibido.
+    """
     model = Lancamento
     template_name = 'core/lancamento_list.html'
     context_object_name = 'lancamentos'
-    paginate_by = 50
+    historico = False
+    tamanho_pagina = 50
 
     def get_queryset(self):
         pk = self.kwargs['conta_pk']
@@ -120,72 +127,92 @@ class LancamentoListView(LoginRequiredMixin, ListView):
         if ano is None or mes is None:
             ano = self.hoje.year
             mes = self.hoje.month
+        self.data_selecionada = date(ano, mes, 1)
 
         self.conta = get_object_or_404(ContaBancaria, pk=pk, usuario=self.request.user)
         
-        # Queryset base
-        queryset = Lancamento.objects.filter(
-            conta_bancaria=self.conta,
-            data_caixa__year=ano,
-            data_caixa__month=mes
-        )
-
         # Captura os parâmetros de filtro do GET request
         self.tipo_filtro = self.request.GET.get('tipo', '')
         self.categoria_filtro = self.request.GET.get('categoria', '')
         self.q_filtro = self.request.GET.get('q', '')
+        self.cursor = self.request.GET.get('cursor', '')
 
-        # Aplica os filtros ao queryset
-        if self.tipo_filtro:
-            queryset = queryset.filter(tipo=self.tipo_filtro)
-        
-        if self.categoria_filtro:
-            queryset = queryset.filter(categoria_id=self.categoria_filtro)
+        # Ocorrências de séries recorrentes ainda não gravadas, montadas a partir das regras.
+        # O histórico as mostra até o fim do mês corrente; o extrato de um mês, até o fim dele.
+        fim_periodo = (self.hoje.replace(day=1) if self.historico else self.data_selecionada) + relativedelta(months=1, days=-1)
+        virtuais = services.ocorrencias_do_extrato(
+            self.conta, fim_periodo, tipo=self.tipo_filtro, categoria=self.categoria_filtro, q=self.q_filtro
+        )
 
-        if self.q_filtro:
-            queryset = queryset.filter(descricao__icontains=self.q_filtro)
+        lancamentos = Lancamento.objects.filter(conta_bancaria=self.conta).select_related('categoria')
+        if self.historico:
+            # O histórico começa no saldo inicial da conta.
+            lancamentos = lancamentos.filter(data_caixa__gte=self.conta.data_saldo_inicial)
+            queryset = services.filtrar_extrato(lancamentos, tipo=self.tipo_filtro, categoria=self.categoria_filtro, q=self.q_filtro)
+        else:
+            # Saldo na abertura do mês, lido do checkpoint mensal da conta, mais as ocorrências
+            # virtuais anteriores ao mês (filtradas só para o extrato, não para o saldo).
+            anteriores = services.ocorrencias_do_extrato(self.conta, self.data_selecionada - relativedelta(days=1))
+            self.saldo_anterior = services.saldo_em([self.conta.pk], self.data_selecionada)[self.conta.pk] + sum(
+                (ocorrencia.valor_com_sinal for ocorrencia in anteriores), Decimal('0.00')
+            )
+            virtuais = [ocorrencia for ocorrencia in virtuais if ocorrencia.data_caixa >= self.data_selecionada]
+            queryset = services.filtrar_extrato(
+                lancamentos, ano, mes, tipo=self.tipo_filtro, categoria=self.categoria_filtro, q=self.q_filtro
+            )
 
-        return queryset.com_saldo_parcial().order_by('-data_caixa', '-id')
+        try:
+            pagina, self.proximo_cursor = services.pagina_extrato(
+                queryset, None if self.cursor else self._saldo_topo(queryset, virtuais), self.cursor,
+                self.tamanho_pagina, virtuais=virtuais
+            )
+        except ValueError:
+            raise Http404("Cursor inválido.")
+        return pagina
+
+    def _saldo_topo(self, queryset, virtuais):
+        """Saldo após o lançamento mais recente do extrato, ponto de partida da primeira página."""
+        total_virtuais = sum((ocorrencia.valor_com_sinal for ocorrencia in virtuais), Decimal('0.00'))
+        if not self.historico:
+            return services.saldo_final_extrato(queryset, self.saldo_anterior) + total_virtuais
+        if self.tipo_filtro or self.categoria_filtro or self.q_filtro:
+            return services.saldo_final_extrato(queryset, self.conta.saldo_inicial) + total_virtuais
+        # Sem filtros, o saldo após o último lançamento sai do checkpoint mensal, sem somar o histórico.
+        ultima_data = queryset.values_list('data_caixa', flat=True).first()
+        if ultima_data is None:
+            return self.conta.saldo_inicial + total_virtuais
+        return services.saldo_em([self.conta.pk], ultima_data + relativedelta(days=1))[self.conta.pk] + total_virtuais
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        ano = self.kwargs.get('ano')
-        mes = self.kwargs.get('mes')
+        data_selecionada = self.data_selecionada
+
+        if self.historico:
+            context['data_saldo_periodo'] = self.conta.data_saldo_inicial
+            context['saldo_inicial_periodo'] = self.conta.saldo_inicial
+        else:
+            context['data_saldo_periodo'] = data_selecionada
+            context['saldo_inicial_periodo'] = self.saldo_anterior
 
-        if ano is None or mes is None:
-            hoje = date.today()
-            ano = hoje.year
-            mes = hoje.month
-
-        data_selecionada = date(ano, mes, 1)
-
-        saldo_anterior = self.conta.saldo_inicial
-        lancamentos_passados = Lancamento.objects.filter(
-            conta_bancaria=self.conta,
-            data_caixa__lt=data_selecionada,
-        ).aggregate(
-            creditos=Sum('valor', filter=Q(tipo='C')),
-            debitos=Sum('valor', filter=Q(tipo='D'))
-        )
-        saldo_anterior += (lancamentos_passados['creditos'] or 0)
-        saldo_anterior -= (lancamentos_passados['debitos'] or 0)
-        
-        for lancamento in context['lancamentos']:
-            lancamento.saldo_final_linha = saldo_anterior + lancamento.saldo_parcial
-        
         context['conta'] = self.conta
-        context['todas_as_contas'] = ContaBancaria.objects.filter(usuario=self.request.user)
+        context['todas_as_contas'] = self.request.financeiro.contas
+        context['historico'] = self.historico
         context['data_selecionada'] = data_selecionada
         context['mes_anterior'] = data_selecionada - relativedelta(months=1)
         context['mes_seguinte'] = data_selecionada + relativedelta(months=1)
-        context['saldo_inicial_periodo'] = saldo_anterior
+        context['cursor_atual'] = self.cursor
+        context['proximo_cursor'] = self.proximo_cursor
         context['hoje'] = self.hoje
         
         # Adiciona os novos dados de contexto para os filtros
-        context['categorias_conta'] = Categoria.objects.filter(
-            Q(lancamento__conta_bancaria=self.conta) | Q(usuario__isnull=True)
-        ).distinct().order_by('nome')
+        # Categorias usadas na conta mais as do sistema, a partir da lista já carregada na requisição.
+        categorias_usadas = set(
+            Lancamento.objects.filter(conta_bancaria=self.conta).order_by().values_list('categoria_id', flat=True).distinct()
+        )
+        context['categorias_conta'] = [
+            categoria for categoria in self.request.financeiro.categorias
+            if categoria.pk in categorias_usadas or categoria.usuario_id is None
+        ]
         context['filtro_tipo_atual'] = self.tipo_filtro
         context['filtro_q_atual'] = self.q_filtro
         
@@ -215,6 +242,7 @@ class LancamentoUpdateView(LoginRequiredMixin, UpdateView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['user'] = self.request.user
+        kwargs['financeiro'] = self.request.financeiro
         return kwargs
     
     def get_initial(self):
@@ -225,23 +253,15 @@ class LancamentoUpdateView(LoginRequiredMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        cartoes = CartaoCredito.objects.filter(usuario=self.request.user)
-        cartoes_data = {
-            c.id: {'fechamento': c.dia_fechamento, 'vencimento': c.dia_vencimento}
-            for c in cartoes
-        }
-        context['cartoes_data_json'] = mark_safe(json.dumps(cartoes_data))
-        context['form_regra_modal'] = RegraCategoriaModalForm(user=self.request.user, initial={'categoria': self.object.categoria})
+        context['cartoes_data_json'] = mark_safe(json.dumps(self.request.financeiro.dados_cartoes()))
+        context['form_regra_modal'] = RegraCategoriaModalForm(
+            user=self.request.user, financeiro=self.request.financeiro, initial={'categoria': self.object.categoria}
+        )
         context['is_recorrente'] = False
 
         if self.object.recorrencia_id:
             context['is_recorrente'] = True
-            # Verifica se existem lançamentos futuros não conciliados na série
-            context['future_recurrences_exist'] = Lancamento.objects.filter(
-                recorrencia_id=self.object.recorrencia_id,
-                data_caixa__gt=self.object.data_caixa,
-                conciliado=False
-            ).exists()
+            context['future_recurrences_exist'] = services.serie_tem_ocorrencias_futuras(self.object)
         return context
 
     def form_valid(self, form):
@@ -262,16 +282,13 @@ class LancamentoUpdateView(LoginRequiredMixin, UpdateView):
         if original_object.recorrencia_id and update_option == 'all':
             # Define quais campos devem ser propagados para os lançamentos futuros.
             fields_to_propagate = ['descricao', 'valor', 'tipo', 'categoria', 'conta_bancaria', 'cartao_credito']
-            
-            # Busca os lançamentos futuros usando a data original como referência para evitar erros.
-            future_lancamentos = Lancamento.objects.filter(
-                usuario=self.request.user, recorrencia_id=original_object.recorrencia_id,
-                data_caixa__gt=original_object.data_caixa, conciliado=False
-            )
-            # Prepara os dados para a atualização em massa com os novos valores.
             update_kwargs = {field: getattr(self.object, field) for field in fields_to_propagate}
-            updated_count = future_lancamentos.update(**update_kwargs)
-            messages.success(self.request, f"Lançamento atualizado. As alterações foram aplicadas a mais {updated_count} lançamento(s) futuro(s).")
+            # As ocorrências ainda não gravadas nascem da regra da série: basta alterá-la. Das gravadas,
+            # só as posteriores à data original e não conciliadas mudam.
+            updated_count = services.atualizar_recorrencia(
+                self.request.user.pk, original_object.recorrencia_id, depois_de=original_object.data_caixa, **update_kwargs
+            )
+            messages.success(self.request, f"Lançamento atualizado. As alterações foram aplicadas a mais {updated_count} lançamento(s) futuro(s) e às próximas ocorrências da série.")
         else:
             messages.success(self.request, "Lançamento atualizado com sucesso.")
 
@@ -306,12 +323,7 @@ class LancamentoDeleteView(LoginRequiredMixin, DeleteView):
         lancamento = self.get_object()
         context['future_recurrences_exist'] = False
         if lancamento.recorrencia_id:
-            # Verifica se existem lançamentos futuros não conciliados na série
-            context['future_recurrences_exist'] = Lancamento.objects.filter(
-                recorrencia_id=lancamento.recorrencia_id,
-                data_caixa__gt=lancamento.data_caixa,
-                conciliado=False
-            ).exists()
+            context['future_recurrences_exist'] = services.serie_tem_ocorrencias_futuras(lancamento)
         return context
 
     def post(self, request, *args, **kwargs):
@@ -327,7 +339,9 @@ class LancamentoDeleteView(LoginRequiredMixin, DeleteView):
                 data_caixa__gte=self.object.data_caixa, conciliado=False
             )
             count = lancamentos_a_excluir.count()
-            lancamentos_a_excluir.delete()
+            with services.adiar_recalculos():
+                lancamentos_a_excluir.delete()
+            services.encerrar_recorrencias(request.user.pk, [self.object.recorrencia_id])
             messages.success(request, f"{count} lançamento(s) recorrente(s) foram excluídos.")
         else:
             self.object.delete()
@@ -352,54 +366,97 @@ def excluir_lancamentos_em_massa(request):
         if not ids_selecionados:
             return JsonResponse({'status': 'error', 'message': 'Nenhum ID fornecido.'}, status=400)
 
-        # Converte para um set para manipulação eficiente e evitar duplicatas
         ids_para_excluir = set(int(id_str) for id_str in ids_selecionados)
-
-        if delete_option == 'all':
-            # Busca os lançamentos selecionados que são recorrentes
-            lancamentos_recorrentes_selecionados = Lancamento.objects.filter(
-                usuario=request.user, 
-                pk__in=ids_para_excluir, 
-                recorrencia_id__isnull=False
-            )
-            
-            # Para cada um, encontra os futuros e adiciona ao set de exclusão
-            for lancamento in lancamentos_recorrentes_selecionados:
-                lancamentos_futuros = Lancamento.objects.filter(
-                    usuario=request.user,
-                    recorrencia_id=lancamento.recorrencia_id,
-                    data_caixa__gt=lancamento.data_caixa,
-                    conciliado=False
-                ).values_list('id', flat=True)
-                
-                ids_para_excluir.update(lancamentos_futuros)
-
-        # Executa a exclusão em massa de todos os IDs coletados
-        lancamentos_a_excluir = Lancamento.objects.filter(usuario=request.user, id__in=list(ids_para_excluir))
-        count = lancamentos_a_excluir.count()
-        lancamentos_a_excluir.delete()
+        # Irmãs futuras das séries recorrentes (se pedidas) e recálculos são resolvidos em lote.
+        count = services.excluir_lancamentos_em_lote(request.user, ids_para_excluir, incluir_futuros=delete_option == 'all')
         return JsonResponse({'status': 'success', 'deleted_count': count})
     except (json.JSONDecodeError, TypeError, ValueError):
         return JsonResponse({'status': 'error', 'message': 'Requisição inválida.'}, status=400)
 
 @require_POST
 @login_required
-def iniciar_fila_conciliacao_view(request):
+def conciliar_lancamentos_em_massa(request):
+    """
+    Concilia vários lançamentos em uma única requisição. Aceita {"ids": [...]} para
+    conciliar como estão ou {"itens": [{"id", "data_caixa", "valor"}]} com a data
+    (AAAA-MM-DD) e o valor efetivos opcionais de cada um.
+    """
     try:
         data = json.loads(request.body)
-        ids = [int(id_str) for id_str in data.get('ids', [])]
-        lancamentos_validos = Lancamento.objects.filter(usuario=request.user, id__in=ids, conciliado=False).order_by('data_caixa', 'id')
-        ids_validos = list(lancamentos_validos.values_list('id', flat=True))
+        itens = {int(id_str): None for id_str in data.get('ids', [])}
+        for item in data.get('itens', []):
+            ajuste = {}
+            if item.get('data_caixa'):
+                ajuste['data_caixa'] = datetime.strptime(item['data_caixa'], '%Y-%m-%d').date()
+            if item.get('valor') not in (None, ''):
+                ajuste['valor'] = Decimal(str(item['valor']))
+            itens[int(item['id'])] = ajuste
+
+        if not itens:
+            return JsonResponse({'status': 'error', 'message': 'Nenhum ID fornecido.'}, status=400)
 
-        if not ids_validos:
-            return JsonResponse({'status': 'info', 'message': 'Todos os lançamentos selecionados já estão conciliados.'}, status=200)
+        resultado = services.conciliar_lancamentos_em_lote(request.user, itens)
+        if not resultado['conciliados']:
+            return JsonResponse({'status': 'info', 'message': 'Nenhum lançamento pendente de conciliação entre os selecionados.'})
+        return JsonResponse({'status': 'success', 'conciliados': resultado['conciliados'], 'ignorados': resultado['ignorados']})
+    except (json.JSONDecodeError, TypeError, ValueError, KeyError, InvalidOperation):
+        return JsonResponse({'status': 'error', 'message': 'Requisição inválida.'}, status=400)
 
-        request.session['conciliation_queue'] = ids_validos
-        redirect_url = reverse('core:lancamento_conciliar', kwargs={'pk': ids_validos[0]})
-        return JsonResponse({'status': 'success', 'redirect_url': redirect_url})
-    except (json.JSONDecodeError, TypeError, ValueError):
+def _interpretar_alteracoes_em_massa(financeiro, dados):
+    """
+    Converte o patch recebido pela edição em massa (IDs e datas AAAA-MM-DD) nos valores
+    aceitos por services.editar_lancamentos_em_lote, validando que categoria, conta e
+    cartão pertencem ao usuário. Levanta ValueError para valores inválidos.
+    """
+    opcoes = {
+        'categoria': financeiro.categorias,
+        'conta_bancaria': financeiro.contas,
+        'cartao_credito': financeiro.cartoes,
+    }
+    alteracoes = {}
+    for campo, objetos in opcoes.items():
+        if dados.get(campo):
+            por_pk = {objeto.pk: objeto for objeto in objetos}
+            objeto = por_pk.get(int(dados[campo]))
+            if objeto is None:
+                raise ValueError(f"{campo} inválido.")
+            alteracoes[campo] = objeto
+    for campo in ('data_competencia', 'data_caixa'):
+        if dados.get(campo):
+            alteracoes[campo] = datetime.strptime(dados[campo], '%Y-%m-%d').date()
+    return alteracoes
+
+@require_POST
+@login_required
+def editar_lancamentos_em_massa(request):
+    """
+    Aplica as mesmas alterações (categoria, conta, cartão, datas) a vários lançamentos.
+    O conjunto vem de {"ids": [...]} ou de um filtro do extrato,
+    {"filtro": {"conta", "ano", "mes", "tipo", "categoria", "q"}}; as alterações em "alteracoes".
+    """
+    try:
+        data = json.loads(request.body)
+        alteracoes = _interpretar_alteracoes_em_massa(request.financeiro, data.get('alteracoes') or {})
+
+        lancamentos = Lancamento.objects.filter(usuario=request.user)
+        if data.get('ids'):
+            lancamentos = lancamentos.filter(pk__in=[int(id_str) for id_str in data['ids']])
+        elif data.get('filtro'):
+            filtro = data['filtro']
+            lancamentos = services.filtrar_extrato(
+                lancamentos.filter(conta_bancaria_id=int(filtro['conta'])), int(filtro['ano']), int(filtro['mes']),
+                tipo=filtro.get('tipo', ''), categoria=filtro.get('categoria', ''), q=filtro.get('q', '')
+            )
+        else:
+            return JsonResponse({'status': 'error', 'message': 'Nenhum lançamento selecionado.'}, status=400)
+    except (json.JSONDecodeError, TypeError, ValueError, KeyError):
         return JsonResponse({'status': 'error', 'message': 'Requisição inválida.'}, status=400)
 
+    resultado = services.editar_lancamentos_em_lote(request.user, lancamentos, alteracoes)
+    if resultado['erros']:
+        return JsonResponse({'status': 'error', 'message': ' '.join(resultado['erros'])}, status=400)
+    return JsonResponse({'status': 'success', 'atualizados': resultado['atualizados']})
+
 @require_POST
 @login_required
 def iniciar_fila_edicao_view(request):
@@ -430,24 +487,31 @@ def conciliar_lancamento_view(request, pk):
             lancamento.conciliado = True
             lancamento.save()
             messages.success(request, "Lançamento conciliado com sucesso!")
-            queue = request.session.get('conciliation_queue', [])
-
-            if pk in queue:
-                queue.remove(pk)
-                
-            if queue:
-                next_id = queue[0]
-                request.session['conciliation_queue'] = queue
-                return redirect('core:lancamento_conciliar', pk=next_id)
-            else:
-                request.session.pop('conciliation_queue', None)
-                return redirect('core:lancamento_list_atual', conta_pk=lancamento.conta_bancaria.pk)
+            return redirect('core:lancamento_list_atual', conta_pk=lancamento.conta_bancaria.pk)
     else:
         form = ConciliacaoForm(initial={'data_caixa': lancamento.data_caixa.strftime('%Y-%m-%d'), 'valor': lancamento.valor})
 
     context = {'form': form, 'lancamento': lancamento}
     return render(request, 'core/conciliar_lancamento.html', context)
 
+@require_POST
+@login_required
+def gravar_ocorrencia_recorrente_view(request, recorrencia_id):
+    """
+    Grava a ocorrência prevista de uma série recorrente (exibida no extrato a partir da
+    regra) e leva à conciliação ou à edição do lançamento criado, conforme `acao`.
+    """
+    try:
+        data_competencia = date.fromisoformat(request.POST.get('data_competencia', ''))
+    except ValueError:
+        raise Http404("Ocorrência inválida.")
+    lancamento = services.gravar_ocorrencia_recorrente(request.user.pk, recorrencia_id, data_competencia)
+    if lancamento is None:
+        raise Http404("Ocorrência não encontrada.")
+    if request.POST.get('acao') == 'conciliar':
+        return redirect('core:lancamento_conciliar', pk=lancamento.pk)
+    return redirect('core:lancamento_update', pk=lancamento.pk)
+
 @login_required
 def get_faturas_options_view(request):
     cartao_pk = request.GET.get('cartao_pk')
@@ -486,4 +550,16 @@ def get_faturas_options_view(request):
     return JsonResponse({
         'default_fatura_pk': default_fatura.pk if default_fatura else None,
         'faturas': faturas_data
-    })
\ No newline at end of file
+    })
+
+
+@login_required
+def busca_lancamentos_view(request):
+    """Busca global pela descrição, em todas as contas e cartões do usuário."""
+    q = request.GET.get('q', '').strip()
+    lancamentos, ha_mais = services.buscar_lancamentos(request.user, q)
+    return render(request, 'core/busca.html', {
+        'q': q,
+        'lancamentos': lancamentos,
+        'ha_mais': ha_mais,
+    })
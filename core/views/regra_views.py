@@ -32,6 +32,7 @@ class RegraCategoriaCreateView(LoginRequiredMixin, CreateView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['user'] = self.request.user
+        kwargs['financeiro'] = self.request.financeiro
         return kwargs
 
     def form_valid(self, form):
@@ -52,6 +53,7 @@ class RegraCategoriaUpdateView(LoginRequiredMixin, UpdateView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['user'] = self.request.user
+        kwargs['financeiro'] = self.request.financeiro
         return kwargs
 
 
@@ -83,6 +85,8 @@ def reordenar_regras_view(request):
         with transaction.atomic():
             for index, rule_id in enumerate(rule_ids):
                 RegraCategoria.objects.filter(usuario=request.user, pk=int(rule_id)).update(ordem=index + 1)
+        # update() não dispara sinais, então o automato compilado é invalidado aqui.
+        services.invalidar_regras_usuario(request.user.pk)
         return JsonResponse({'status': 'success'})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -91,7 +95,7 @@ def reordenar_regras_view(request):
 @require_POST
 @login_required
 def criar_regra_lancamento_view(request):
-    form = RegraCategoriaModalForm(request.POST, user=request.user)
+    form = RegraCategoriaModalForm(request.POST, user=request.user, financeiro=request.financeiro)
     if form.is_valid():
         regra = form.save(commit=False)
         regra.usuario = request.user
@@ -3,10 +3,20 @@ import json
 from datetime import date
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
 from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
 from .. import services
 
+
+def _etag_fluxo_caixa(request, ano=None):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    return services.etag_dados_usuario(request.user.pk, 'fluxo-caixa', ano or date.today().year)
+
+
 @login_required
+@condition(etag_func=_etag_fluxo_caixa)
 def fluxo_caixa_view(request, ano=None):
     """
     Renderiza o relatório de Fluxo de Caixa anual.
@@ -34,4 +44,6 @@ def fluxo_caixa_view(request, ano=None):
         'dados_grafico_json': mark_safe(json.dumps(dados_grafico)),
     }
     
-    return render(request, 'core/relatorio_fluxo_caixa.html', context)
\ No newline at end of file
+    response = render(request, 'core/relatorio_fluxo_caixa.html', context)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
\ No newline at end of file
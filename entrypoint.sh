@@ -3,14 +3,23 @@
 # O shell irá encerrar o script imediatamente se um comando falhar
 set -e
 
+# Interrompe o deploy se a configuração de produção tiver erros (ex: cache não compartilhado)
+python manage.py check --deploy --fail-level ERROR
+
 # Executa as migrações do banco de dados do Django
 echo "Executando migrações do banco de dados..."
 python manage.py migrate --no-input
 
+# Cria a tabela usada pelo cache compartilhado (não faz nada se ela já existir)
+python manage.py createcachetable
+
 # (NOVO) Coleta todos os arquivos estáticos para a pasta STATIC_ROOT
 echo "Coletando arquivos estáticos..."
 python manage.py collectstatic --no-input --clear
 
+# As importações enfileiradas e a conferência diária dos saldos rodam como jobs agendados
+# (`meudindin-importacoes` e `meudindin-verificar-saldos`, ver cloudbuild.yaml), não neste container.
+
 # Inicia o servidor Gunicorn
 echo "Iniciando o servidor Gunicorn..."
 exec gunicorn --bind 0.0.0.0:8080 --workers 2 gestor_financeiro.wsgi:application
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestor_financeiro.settings')
 
 application = get_asgi_application()
+
+# Resolve as categorias de sistema na subida do processo, e não na primeira requisição.
+from core.models import aquecer_categorias_sistema  # noqa: E402
+
+aquecer_categorias_sistema()
@@ -77,6 +77,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ContextoFinanceiroMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -113,6 +114,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Cache compartilhado entre as instâncias (versões das regras e dados do painel).
+# A tabela é criada pelo `createcachetable` no entrypoint.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -161,6 +175,24 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Arquivos enviados pelos usuários
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Extratos aguardando importação: ficam em um bucket do Cloud Storage, e não no disco
+# do container, porque quem os processa é o job `processar_importacoes`, que roda em
+# outra instância (e o disco de uma instância do Cloud Run some quando ela é reciclada).
+GS_BUCKET_IMPORTACOES = os.environ.get('GS_BUCKET_IMPORTACOES', f'{PROJECT_ID}-importacoes')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'importacoes': {
+        'BACKEND': 'storages.backends.gcloud.GoogleCloudStorage',
+        'OPTIONS': {'bucket_name': GS_BUCKET_IMPORTACOES},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestor_financeiro.settings')
 
 application = get_wsgi_application()
+
+# Resolve as categorias de sistema na subida do processo, e não na primeira requisição.
+from core.models import aquecer_categorias_sistema  # noqa: E402
+
+aquecer_categorias_sistema()
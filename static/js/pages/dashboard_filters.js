@@ -6,7 +6,6 @@ document.addEventListener('DOMContentLoaded', () => {
     const gridContainer = document.querySelector('.grid[data-ano]');
     const totalContasEl = document.getElementById('total-contas-valor');
     const fluxoCaixaBodyEl = document.getElementById('fluxo-caixa-body');
-    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
 
     async function updateDashboard() {
         const checkboxes = filterList.querySelectorAll('input[type="checkbox"]');
@@ -17,18 +16,13 @@ document.addEventListener('DOMContentLoaded', () => {
         const ano = gridContainer.dataset.ano;
         const mes = gridContainer.dataset.mes;
 
+        // GET permite que o navegador revalide a resposta com o ETag (304 quando nada mudou).
+        const params = new URLSearchParams({ ano: ano, mes: mes });
+        selectedIds.forEach(id => params.append('contas', id));
+
         try {
-            const response = await fetch('/dashboard-data/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': csrfToken
-                },
-                body: JSON.stringify({
-                    ano: ano,
-                    mes: mes,
-                    contas_ids: selectedIds
-                })
+            const response = await fetch(`/dashboard-data/?${params.toString()}`, {
+                headers: { 'Accept': 'application/json' }
             });
 
             if (!response.ok) throw new Error('A resposta do servidor não foi bem-sucedida.');
@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const btnEditar = document.getElementById('btn-editar');
     const btnExcluir = document.getElementById('btn-excluir');
     const btnConciliar = document.getElementById('btn-conciliar');
+    const selectCategoria = document.getElementById('bulk-categoria');
 
     // --- Elementos do Modal de Confirmação Genérico ---
     const modal = document.getElementById('confirmation-modal');
@@ -92,6 +93,34 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Altera a categoria de todos os selecionados de uma vez, sem passar pela fila de edição
+    selectCategoria.addEventListener('change', () => {
+        const categoriaId = selectCategoria.value;
+        if (!categoriaId || selectedItems.size === 0) return;
+        const nomeCategoria = selectCategoria.options[selectCategoria.selectedIndex].text;
+        if (!confirm(`Mover ${selectedItems.size} lançamento(s) para a categoria "${nomeCategoria}"?`)) {
+            selectCategoria.value = '';
+            return;
+        }
+        fetch('/lancamentos/bulk-editar/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': document.querySelector('#form-excluir-massa [name=csrfmiddlewaretoken]').value
+            },
+            body: JSON.stringify({ ids: Array.from(selectedItems), alteracoes: { categoria: categoriaId } })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'success') {
+                window.location.reload();
+            } else {
+                alert(data.message || 'Ocorreu um erro ao alterar os lançamentos.');
+                selectCategoria.value = '';
+            }
+        });
+    });
+
     btnExcluir.addEventListener('click', () => {
         if (selectedItems.size === 0) return;
 
@@ -154,7 +183,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
     btnConciliar.addEventListener('click', () => {
         if (selectedItems.size > 0) {
-            fetch('/lancamentos/iniciar-conciliacao/', { // <-- URL da nova view de preparação
+            if (!confirm(`Conciliar ${selectedItems.size} lançamento(s) com a data e o valor atuais?`)) return;
+            fetch('/lancamentos/bulk-conciliar/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -164,11 +194,11 @@ document.addEventListener('DOMContentLoaded', () => {
             })
             .then(response => response.json()) // Converte a resposta para JSON
             .then(data => {
-                if (data.status === 'success' && data.redirect_url) {
-                    // Redireciona para o primeiro item da fila, conforme instruído pelo backend
-                    window.location.href = data.redirect_url;
+                if (data.status === 'success') {
+                    // Todos os selecionados foram conciliados de uma vez no backend
+                    window.location.reload();
                 } else {
-                    alert(data.message || 'Ocorreu um erro ao iniciar a conciliação.');
+                    alert(data.message || 'Ocorreu um erro ao conciliar os lançamentos.');
                 }
             })
             .catch(error => {
@@ -0,0 +1,32 @@
+// static/js/pages/importacao_progresso.js
+document.addEventListener('DOMContentLoaded', function () {
+    const container = document.getElementById('importacao-progresso');
+    if (!container) return;
+
+    const statusUrl = container.dataset.statusUrl;
+    const statusEl = document.getElementById('importacao-status');
+    const itensEl = document.getElementById('importacao-itens');
+    const INTERVALO_MS = 2000;
+
+    function consultarStatus() {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.json())
+            .then(data => {
+                statusEl.textContent = data.status_display;
+                itensEl.textContent = data.itens_processados;
+
+                if (data.finalizada) {
+                    // A própria página da tarefa exibe a pré-conciliação ou a mensagem de erro.
+                    window.location.href = data.redirect_url;
+                    return;
+                }
+                setTimeout(consultarStatus, INTERVALO_MS);
+            })
+            .catch(error => {
+                console.error('Erro ao consultar o andamento da importação:', error);
+                setTimeout(consultarStatus, INTERVALO_MS * 2);
+            });
+    }
+
+    setTimeout(consultarStatus, INTERVALO_MS);
+});
@@ -6,7 +6,6 @@ document.addEventListener('DOMContentLoaded', function() {
     const editorForm = document.getElementById('lancamento-editor-form');
     const editorPlaceholder = document.getElementById('editor-placeholder');
     const confirmationForm = document.getElementById('form-confirmacao');
-    const lancamentosJsonInput = document.getElementById('lancamentos_json');
 
     if (!tableBody || !editorContainer || !confirmationForm) return;
 
@@ -106,6 +105,9 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }
 
+        // Persiste a alteração no item em staging do servidor
+        salvarLinha(selectedRow);
+
         // Atualiza a célula correspondente na tabela para feedback visual imediato
         const cell = selectedRow.querySelector(mapping.cellClass);
         if (cell) {
@@ -132,21 +134,10 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // 4. Event listener para o envio do formulário de confirmação final
+    // As edições já estão gravadas no servidor; só aguarda os salvamentos em andamento.
     confirmationForm.addEventListener('submit', (e) => {
         e.preventDefault();
-        
-        const lancamentosParaEnviar = [];
-        const rows = tableBody.querySelectorAll('tr');
-
-        rows.forEach(row => {
-            // Inclui apenas linhas que não foram marcadas para exclusão e não foram previamente importadas
-            if (!row.classList.contains('line-through') && !row.classList.contains('pointer-events-none')) {
-                lancamentosParaEnviar.push(row.dataset);
-            }
-        });
-
-        lancamentosJsonInput.value = JSON.stringify(lancamentosParaEnviar);
-        confirmationForm.submit();
+        salvamentosPendentes.finally(() => confirmationForm.submit());
     });
 
     // --- Lógica para controlar a visibilidade dos campos de recorrência ---
@@ -162,6 +153,33 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Encadeia os salvamentos para que sejam aplicados na ordem e a confirmação possa aguardá-los.
+let salvamentosPendentes = Promise.resolve();
+
+// Envia o estado atual de uma linha para o seu item em staging no servidor.
+function salvarLinha(linha) {
+    const csrfToken = document.querySelector('input[name="csrfmiddlewaretoken"]').value;
+    const dados = { ...linha.dataset, excluido: linha.classList.contains('line-through') };
+
+    salvamentosPendentes = salvamentosPendentes.then(() =>
+        fetch(linha.dataset.updateUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            },
+            body: JSON.stringify(dados)
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.status !== 'success') {
+                showToast(data.message || 'Não foi possível salvar a alteração.', 'error');
+            }
+        })
+        .catch(error => showToast('Ocorreu um erro de comunicação com o servidor.', 'error'))
+    );
+}
+
 // Função global para o botão de excluir linha (reutilizada)
 function excluirLinha(botao) {
     const linha = botao.closest('tr');
@@ -172,4 +190,5 @@ function excluirLinha(botao) {
     linha.classList.toggle('text-gray-400');
     linha.classList.toggle('bg-red-50');
     botao.title = linha.classList.contains('line-through') ? "Reincluir este lançamento" : "Não importar este lançamento";
+    salvarLinha(linha);
 }
\ No newline at end of file